@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+asnReport.py - Bulk validation and normalization of AS numbers in ntp-sources.yml
+
+This script parses the AS field of every server entry once into integer tuples and:
+- Flags malformed AS strings and reserved/private AS numbers
+- Normalizes all entries in one sweep to the "AS123, AS456" sorted format
+- Reports AS concentration (servers per AS) for diversity planning
+
+Usage: python3 asnReport.py [--normalize] [--top N] <ntp-sources.yml>
+"""
+
+import sys
+import yaml
+import logging
+import argparse
+from collections import Counter
+from pathlib import Path
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Reserved and private-use ranges (RFC 1930, RFC 5398, RFC 6793, RFC 6996, RFC 7300)
+RESERVED_ASN_RANGES = (
+    (0, 0, "reserved"),
+    (23456, 23456, "AS_TRANS"),
+    (64496, 64511, "documentation"),
+    (64512, 65534, "private"),
+    (65535, 65535, "reserved"),
+    (65536, 65551, "documentation"),
+    (65552, 131071, "reserved"),
+    (4200000000, 4294967294, "private"),
+    (4294967295, 4294967295, "reserved"),
+)
+
+MAX_ASN = 4294967295
+
+
+def classify_asn(asn):
+    """
+    Return the reserved range label for an AS number, or None if it is public
+    """
+    for low, high, label in RESERVED_ASN_RANGES:
+        if low <= asn <= high:
+            return label
+    return None
+
+
+def parse_as_field(as_string):
+    """
+    Parse an AS field into a sorted tuple of unique integers
+    Returns (asns, malformed_tokens); "Unknown" and empty values yield ((), [])
+    """
+    if as_string is None or as_string == "" or as_string == "Unknown":
+        return (), []
+
+    asns = set()
+    malformed = []
+    for token in str(as_string).split(','):
+        token = token.strip()
+        if not token:
+            continue
+        digits = token[2:] if token[:2].upper() == 'AS' else None
+        if digits and digits.isdigit() and int(digits) <= MAX_ASN:
+            asns.add(int(digits))
+        else:
+            malformed.append(token)
+
+    return tuple(sorted(asns)), malformed
+
+
+def format_as_numbers(asns):
+    """
+    Format integer AS numbers into the canonical "AS123, AS456" string
+    """
+    return ", ".join(f"AS{asn}" for asn in asns)
+
+
+def parse_all_as_fields(servers):
+    """
+    Parse the AS field of every server entry in one pass
+    Returns a list of (hostname, raw_value, asns, malformed_tokens) rows
+    """
+    rows = []
+    for server in servers:
+        if 'hostname' not in server:
+            continue
+        raw = server.get('AS')
+        asns, malformed = parse_as_field(raw)
+        rows.append((server['hostname'], raw, asns, malformed))
+    return rows
+
+
+def validate_as_fields(rows):
+    """
+    Collect malformed tokens and reserved/private AS numbers
+    Returns a list of (hostname, message) problems
+    """
+    problems = []
+    for hostname, _, asns, malformed in rows:
+        for token in malformed:
+            problems.append((hostname, f"malformed AS token '{token}'"))
+        for asn in asns:
+            label = classify_asn(asn)
+            if label:
+                problems.append((hostname, f"AS{asn} is {label}"))
+    return problems
+
+
+def normalize_all(servers, rows):
+    """
+    Rewrite every parsable AS field into canonical form
+    Returns a list of (hostname, old, new) changes; entries with malformed tokens are left alone
+    """
+    changes = []
+    # rows follow the servers that have a hostname, in order, so duplicates stay distinct
+    entries = [server for server in servers if 'hostname' in server]
+    for server, (hostname, raw, asns, malformed) in zip(entries, rows, strict=True):
+        if not asns or malformed:
+            continue
+        normalized = format_as_numbers(asns)
+        if normalized != raw:
+            server['AS'] = normalized
+            changes.append((hostname, raw, normalized))
+    return changes
+
+
+def asn_concentration(rows):
+    """
+    Count how many servers announce each AS number
+    Returns a Counter keyed by integer AS number
+    """
+    counts = Counter()
+    for _, _, asns, _ in rows:
+        counts.update(asns)
+    return counts
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(
+        description="Validate, normalize and report on AS numbers in ntp-sources.yml",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python3 asnReport.py ntp-sources.yml
+  python3 asnReport.py --top 20 ntp-sources.yml
+  python3 asnReport.py --normalize ntp-sources.yml
+        """
+    )
+
+    parser.add_argument('yaml_file',
+                       help='Path to the ntp-sources.yml file')
+
+    parser.add_argument('--normalize',
+                       action='store_true',
+                       help='Rewrite AS fields into canonical sorted format')
+
+    parser.add_argument('--top',
+                       type=int, default=10,
+                       help='Number of most concentrated AS numbers to report (default: 10)')
+
+    args = parser.parse_args()
+
+    if not Path(args.yaml_file).exists():
+        logger.error(f"File not found: {args.yaml_file}")
+        sys.exit(1)
+
+    with open(args.yaml_file, 'r') as f:
+        data = yaml.safe_load(f)
+
+    if not data or 'servers' not in data:
+        logger.error("Invalid YAML structure. Expected 'servers' key.")
+        sys.exit(1)
+
+    servers = data['servers']
+    rows = parse_all_as_fields(servers)
+
+    problems = validate_as_fields(rows)
+    unknown = sum(1 for _, _, asns, malformed in rows if not asns and not malformed)
+    logger.info(f"Parsed AS fields for {len(rows)} servers ({unknown} unknown)")
+    for hostname, message in problems:
+        logger.warning(f"  {hostname}: {message}")
+
+    counts = asn_concentration(rows)
+    logger.info(f"{len(counts)} distinct AS numbers, top {args.top} by server count:")
+    for asn, count in counts.most_common(args.top):
+        logger.info(f"  AS{asn}: {count} servers ({count / len(rows):.1%})")
+
+    if args.normalize:
+        changes = normalize_all(servers, rows)
+        for hostname, old, new in changes:
+            logger.info(f"  Normalizing AS format for {hostname}: {old} -> {new}")
+        if changes:
+            # Imported here because ntpUpdateSources imports this module
+            from ntpUpdateSources import write_yaml_with_formatting
+            write_yaml_with_formatting(data, args.yaml_file)
+            logger.info(f"Updated {args.yaml_file} ({len(changes)} entries normalized)")
+        else:
+            logger.info("No normalization needed")
+
+    if any('malformed' in message for _, message in problems):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
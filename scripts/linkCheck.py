@@ -5,21 +5,55 @@ YAML Hostname to Markdown Converter
 Processes YAML files to convert plaintext hostnames to markdown links
 when the hostname has an active HTTPS website. Also verifies existing
 markdown links and converts back to plaintext if unreachable.
+With --nts, NTS-KE support is probed in the same event loop and recorded
+as nts/nts_ke_ms on each entry. --stream handles lists of any size with flat
+memory by reading entries incrementally and writing NDJSON results instead.
+--record/--replay save the probe outcomes of a run and rerun the same
+decisions against them offline (see probeReplay.py).
 
 Requires Python 3.13+ for modern async features and type hints.
 """
 
+from __future__ import annotations
+
 import argparse
 import asyncio
+import json
 import sys
 import re
+import socket
+import ssl
+import time
+from contextvars import ContextVar
 from pathlib import Path
-from typing import NamedTuple, Optional, TypedDict
+from typing import TYPE_CHECKING, NamedTuple, Optional, TypedDict
 from collections.abc import Sequence
 
-import aiohttp
 import yaml
 
+import ntsProbe
+from ntpStream import iter_servers, run_bounded
+from probeHistory import CLOSED, HALF_OPEN, OPEN, FailureHistory
+from probeReplay import ProbeArchive
+
+if TYPE_CHECKING:
+    # aiohttp is imported on first use so --help and argument errors stay fast
+    import aiohttp
+
+# Timeout for the single probe a half-open circuit is allowed
+FAST_PROBE_TIMEOUT = 2.0
+
+# Certificates expiring within this many days are flagged
+CERT_WARN_DAYS = 21
+
+# Trace dict of the HTTPS request whose connection is being set up; asyncio runs
+# the TLS handshake in the context of the task that opened the connection
+_request_trace: ContextVar[Optional[dict]] = ContextVar('request_trace', default=None)
+
+# Recorded NTS-KE latency is only rewritten when it moves by more than this fraction,
+# so routine jitter does not rewrite ntp-sources.yml on every run
+NTS_KE_TOLERANCE = 0.5
+
 
 class HostnameInfo(NamedTuple):
     """Information about a hostname entry."""
@@ -40,6 +74,34 @@ class ProcessingResult(TypedDict):
     url: Optional[str]
 
 
+class NtsChange(TypedDict):
+    """NTS fields to set on one server entry."""
+    index: int
+    hostname: str
+    nts: bool
+    nts_ke_ms: Optional[int]
+    reason: str
+
+
+class HttpsMetadata(TypedDict):
+    """TLS and timing details captured from one HTTPS probe."""
+    hostname: str
+    url: str
+    status: Optional[int]
+    error: Optional[str]
+    tls_version: Optional[str]
+    cipher: Optional[str]
+    issuer: Optional[str]
+    subject: Optional[str]
+    not_after: Optional[str]
+    days_left: Optional[int]
+    dns_time: Optional[float]
+    connect_time: Optional[float]
+    tls_time: Optional[float]
+    ttfb: Optional[float]
+    reused: bool
+
+
 def is_markdown_link(hostname: str) -> bool:
     """Check if hostname is already in markdown format."""
     return bool(re.match(r'^\[.*\]\(.*\)$', hostname.strip()))
@@ -77,10 +139,163 @@ def should_skip_hostname(hostname: str) -> bool:
     return hostname.lower().endswith('.pool.ntp.org')
 
 
+def _name_attribute(name: tuple, attribute: str) -> Optional[str]:
+    """Pick one attribute (e.g. commonName) out of a getpeercert() issuer/subject."""
+    for rdn in name:
+        for key, value in rdn:
+            if key == attribute:
+                return value
+    return None
+
+
+def certificate_details(ssl_object) -> dict:
+    """
+    Extract expiry, issuer and protocol from a verified TLS connection.
+    
+    Hostname verification is part of the handshake, so a certificate that does
+    not name the host never gets here; it is reported as a certificate error.
+    """
+    cert = ssl_object.getpeercert() or {}
+    details = {
+        'tls_version': ssl_object.version(),
+        'cipher': (ssl_object.cipher() or (None,))[0],
+        'issuer': None, 'subject': None, 'not_after': None, 'days_left': None,
+    }
+    if not cert:
+        return details
+
+    issuer = cert.get('issuer', ())
+    details['issuer'] = _name_attribute(issuer, 'organizationName') or _name_attribute(issuer, 'commonName')
+    details['subject'] = _name_attribute(cert.get('subject', ()), 'commonName')
+    if 'notAfter' in cert:
+        expires = ssl.cert_time_to_seconds(cert['notAfter'])
+        details['not_after'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(expires))
+        details['days_left'] = int((expires - time.time()) // 86400)
+    return details
+
+
+class TlsCollector:
+    """
+    Collects certificate and timing details from the HTTPS probes of one session.
+    
+    The session's SSL context stores every TLS object in the trace dict
+    (trace_request_ctx) of the request that opened its connection once the
+    handshake completes, so certificate details can still be read after
+    aiohttp has returned the connection to its pool. Trace hooks add DNS,
+    connect and time-to-first-byte timings to the same dict.
+    """
+    
+    def __init__(self) -> None:
+        self.metadata: dict[str, HttpsMetadata] = {}
+        
+        class RecordingSSLObject(ssl.SSLObject):
+            def do_handshake(self) -> None:
+                # Called repeatedly by asyncio until the handshake completes
+                started = self.__dict__.setdefault('handshake_started', time.perf_counter())
+                super().do_handshake()
+                trace = _request_trace.get()
+                if trace is not None:
+                    trace['handshake'] = (self, time.perf_counter() - started)
+        
+        self.context = ssl.create_default_context()
+        self.context.sslobject_class = RecordingSSLObject
+    
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """Trace hooks stamping request phases into the per-request trace dict."""
+        import aiohttp
+        
+        def stamp(key: str):
+            async def hook(session, context, params) -> None:
+                if isinstance(context.trace_request_ctx, dict):
+                    context.trace_request_ctx[key] = time.perf_counter()
+            return hook
+        
+        async def on_request_start(session, context, params) -> None:
+            if isinstance(context.trace_request_ctx, dict):
+                context.trace_request_ctx['request_start'] = time.perf_counter()
+                # Hooks run in the request's task, so the handshake below sees this
+                _request_trace.set(context.trace_request_ctx)
+        
+        async def on_reuse(session, context, params) -> None:
+            if isinstance(context.trace_request_ctx, dict):
+                context.trace_request_ctx['reused'] = True
+        
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_dns_resolvehost_start.append(stamp('dns_start'))
+        trace_config.on_dns_resolvehost_end.append(stamp('dns_end'))
+        trace_config.on_connection_create_start.append(stamp('connect_start'))
+        trace_config.on_connection_create_end.append(stamp('connect_end'))
+        trace_config.on_connection_reuseconn.append(on_reuse)
+        trace_config.on_request_end.append(stamp('request_end'))
+        return trace_config
+    
+    def record(self, hostname: str, url: str, trace: dict,
+               status: Optional[int] = None, error: Optional[str] = None) -> HttpsMetadata:
+        """Combine trace timings and the recorded handshake into one HttpsMetadata entry."""
+        def elapsed(start: str, end: str) -> Optional[float]:
+            return trace[end] - trace[start] if start in trace and end in trace else None
+        
+        ssl_object, tls_time = trace.get('handshake', (None, None)) if status is not None else (None, None)
+        details = certificate_details(ssl_object) if ssl_object else {}
+        dns_time = elapsed('dns_start', 'dns_end')
+        connect_time = elapsed('connect_start', 'connect_end')
+        if connect_time is not None:
+            # Connection creation covers DNS, TCP and TLS; keep only the TCP part
+            connect_time -= (dns_time or 0) + (tls_time or 0)
+        ttfb = elapsed('request_start', 'request_end')
+        
+        entry = HttpsMetadata(
+            hostname=hostname,
+            url=url,
+            status=status,
+            error=error,
+            tls_version=details.get('tls_version'),
+            cipher=details.get('cipher'),
+            issuer=details.get('issuer'),
+            subject=details.get('subject'),
+            not_after=details.get('not_after'),
+            days_left=details.get('days_left'),
+            dns_time=None if dns_time is None else round(dns_time, 4),
+            connect_time=None if connect_time is None else round(max(connect_time, 0.0), 4),
+            tls_time=None if tls_time is None or trace.get('reused') else round(tls_time, 4),
+            ttfb=None if ttfb is None else round(ttfb, 4),
+            reused=trace.get('reused', False),
+        )
+        self.metadata[hostname] = entry
+        return entry
+
+
+def status_url(url: str, status: int) -> Optional[str]:
+    """Decide from the HTTP status whether url counts as a working HTTPS link."""
+    if 200 <= status < 300:
+        print(f"✓ Success: {url} returned {status}")
+        return url
+    elif 300 <= status < 400:
+        print(f"⚠ Skipping {url} - returns redirect ({status})")
+        return None
+    else:
+        print(f"✗ Failed: {url} returned {status}")
+        return None
+
+
+def replay_https(archive: ProbeArchive, clean: str, url: str, tls: Optional[TlsCollector] = None) -> Optional[str]:
+    """Answer an HTTPS probe from a recording instead of the network."""
+    recorded = archive.lookup('https', clean) or {'error': 'not in recording'}
+    if tls is not None and recorded.get('metadata'):
+        tls.metadata[clean] = recorded['metadata']
+    if recorded.get('status') is not None:
+        return status_url(url, recorded['status'])
+    print(f"✗ Replayed error for {url}: {recorded['error']}")
+    return None
+
+
 async def test_https_connectivity(
     session: aiohttp.ClientSession, 
     hostname: str, 
-    timeout: float = 5.0
+    timeout: float = 5.0,
+    tls: Optional[TlsCollector] = None,
+    archive: Optional[ProbeArchive] = None
 ) -> Optional[str]:
     """
     Test if hostname is reachable via HTTPS only.
@@ -89,12 +304,25 @@ async def test_https_connectivity(
         session: aiohttp ClientSession
         hostname: The hostname to test
         timeout: Connection timeout in seconds
+        tls: Optional collector for certificate and timing details
+        archive: Optional probe recording to write the outcome to, or to replay it from
     
     Returns:
         The working HTTPS URL or None if unreachable
     """
+    import aiohttp
+    
     clean = clean_hostname(hostname)
     url = f"https://{clean}"
+    trace: dict = {}
+    
+    if archive is not None and archive.replaying:
+        return replay_https(archive, clean, url, tls)
+    
+    def record(**kwargs) -> None:
+        metadata = tls.record(clean, url, trace, **kwargs) if tls is not None else None
+        if archive is not None:
+            archive.record('https', clean, {**kwargs, 'metadata': metadata})
     
     try:
         timeout_obj = aiohttp.ClientTimeout(total=timeout)
@@ -103,36 +331,41 @@ async def test_https_connectivity(
             url, 
             timeout=timeout_obj,
             allow_redirects=False,  # Don't follow redirects
-            ssl=True  # Enforce SSL verification
+            ssl=True,  # Enforce SSL verification
+            trace_request_ctx=trace
         ) as response:
-            if 200 <= response.status < 300:
-                print(f"✓ Success: {url} returned {response.status}")
-                return url
-            elif 300 <= response.status < 400:
-                print(f"⚠ Skipping {url} - returns redirect ({response.status})")
-                return None
-            else:
-                print(f"✗ Failed: {url} returned {response.status}")
-                return None
+            record(status=response.status)
+            return status_url(url, response.status)
                 
+    except aiohttp.ClientConnectorCertificateError as e:
+        print(f"✗ Certificate error for {url}: {e}")
+        record(error=f"certificate: {getattr(e.certificate_error, 'verify_message', e.certificate_error)}")
+        return None
     except aiohttp.ClientSSLError as e:
         print(f"✗ SSL error for {url}: {e}")
+        record(error=f"ssl: {e}")
         return None
     except aiohttp.ClientConnectorError as e:
         print(f"✗ Connection error for {url}: {e}")
+        record(error=f"connection: {e}")
         return None
     except asyncio.TimeoutError:
         print(f"✗ Timeout for {url}")
+        record(error="timeout")
         return None
     except Exception as e:
         print(f"✗ Unexpected error for {url}: {e}")
+        record(error=f"unexpected: {e}")
         return None
 
 
 async def process_hostname(
     session: aiohttp.ClientSession,
     hostname_info: HostnameInfo,
-    timeout: float
+    timeout: float,
+    history: Optional[FailureHistory] = None,
+    tls: Optional[TlsCollector] = None,
+    archive: Optional[ProbeArchive] = None
 ) -> Optional[ProcessingResult]:
     """
     Process a single hostname asynchronously.
@@ -141,6 +374,9 @@ async def process_hostname(
         session: aiohttp ClientSession
         hostname_info: Information about the hostname to process
         timeout: Connection timeout
+        history: Optional failure history; open circuits are skipped, half-open ones get a short probe
+        tls: Optional collector for certificate and timing details
+        archive: Optional probe recording to write to or replay from
     
     Returns:
         ProcessingResult if changes needed, None otherwise
@@ -149,9 +385,24 @@ async def process_hostname(
         print(f"⊘ Skipping {hostname_info.hostname} (NTP pool hostname)")
         return None
     
+    state = history.state(hostname_info.hostname, 'https') if history else CLOSED
+    if state == OPEN:
+        print(f"⊘ Skipping {hostname_info.hostname} (circuit open after repeated failures)")
+        return None
+    if state == HALF_OPEN:
+        timeout = min(timeout, FAST_PROBE_TIMEOUT)
+    replay_missing = (archive is not None and archive.replaying
+                      and archive.lookup('https', clean_hostname(hostname_info.hostname)) is None)
+    if replay_missing:
+        # Inconclusive rather than unreachable, so a partial recording never reverts links
+        print(f"⊘ Skipping {hostname_info.hostname} (not in recording)")
+        return None
+    
     print(f"🔍 Testing {'markdown link' if hostname_info.is_markdown else 'plaintext'}: {hostname_info.original_value}")
     
-    working_url = await test_https_connectivity(session, hostname_info.hostname, timeout)
+    working_url = await test_https_connectivity(session, hostname_info.hostname, timeout, tls, archive)
+    if history:
+        history.record(hostname_info.hostname, 'https', working_url is not None)
     
     if hostname_info.is_markdown:
         # Existing markdown link
@@ -194,39 +445,89 @@ def extract_hostname_info(content: dict) -> list[HostnameInfo]:
         return hostname_infos
     
     for i, server in enumerate(content['servers']):
-        if 'hostname' not in server:
-            continue
-            
-        hostname_field = server['hostname']
-        
-        if is_markdown_link(hostname_field):
-            # Existing markdown link
-            extracted_hostname, original_url, link_text = extract_hostname_from_markdown(hostname_field)
-            if extracted_hostname:
-                hostname_infos.append(HostnameInfo(
-                    index=i,
-                    original_value=hostname_field,
-                    hostname=extracted_hostname,
-                    is_markdown=True,
-                    original_url=original_url,
-                    link_text=link_text
-                ))
-        else:
-            # Plaintext hostname
-            hostname_infos.append(HostnameInfo(
-                index=i,
-                original_value=hostname_field.strip(),
-                hostname=hostname_field.strip(),
-                is_markdown=False
-            ))
+        if hostname_info := hostname_info_for(i, server):
+            hostname_infos.append(hostname_info)
     
     return hostname_infos
 
 
+def hostname_info_for(index: int, server: dict) -> Optional[HostnameInfo]:
+    """Build the HostnameInfo of one server entry, or None if it has no usable hostname."""
+    if 'hostname' not in server:
+        return None
+    
+    hostname_field = server['hostname']
+    
+    if is_markdown_link(hostname_field):
+        # Existing markdown link
+        extracted_hostname, original_url, link_text = extract_hostname_from_markdown(hostname_field)
+        if not extracted_hostname:
+            return None
+        return HostnameInfo(
+            index=index,
+            original_value=hostname_field,
+            hostname=extracted_hostname,
+            is_markdown=True,
+            original_url=original_url,
+            link_text=link_text
+        )
+    
+    # Plaintext hostname
+    return HostnameInfo(
+        index=index,
+        original_value=hostname_field.strip(),
+        hostname=hostname_field.strip(),
+        is_markdown=False
+    )
+
+
+def cached_resolver(addresses: dict[str, list[str]]) -> aiohttp.abc.AbstractResolver:
+    """aiohttp resolver answering from a hostname -> addresses cache, looking up misses itself."""
+    import aiohttp
+    
+    class CachedResolver(aiohttp.ThreadedResolver):
+        async def resolve(self, host: str, port: int = 0, family: socket.AddressFamily = socket.AF_INET) -> list:
+            hosts = [{'hostname': host, 'host': address, 'port': port,
+                      'family': socket.AF_INET6 if ':' in address else socket.AF_INET,
+                      'proto': 0, 'flags': socket.AI_NUMERICHOST}
+                     for address in addresses.get(host, ())]
+            hosts = [entry for entry in hosts if family in (socket.AF_UNSPEC, entry['family'])]
+            return hosts or await super().resolve(host, port, family)
+    
+    return CachedResolver()
+
+
+def create_session(timeout: float, max_concurrent: int, tls: Optional[TlsCollector] = None,
+                   addresses: Optional[dict[str, list[str]]] = None) -> aiohttp.ClientSession:
+    """Pooled HTTPS session shared by all probes of one run; addresses pre-seeds name resolution."""
+    import aiohttp
+    
+    connector = aiohttp.TCPConnector(
+        limit=max_concurrent,
+        limit_per_host=5,
+        ssl=tls.context if tls is not None else True,
+        enable_cleanup_closed=True,
+        resolver=cached_resolver(addresses) if addresses is not None else None
+    )
+    
+    timeout_obj = aiohttp.ClientTimeout(total=timeout * 2)  # Overall session timeout
+    
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout_obj,
+        headers={'User-Agent': 'Mozilla/5.0 (compatible; YAML-Processor/2.0)'},
+        trace_configs=[tls.trace_config()] if tls is not None else None
+    )
+
+
 async def process_all_hostnames(
     hostname_infos: Sequence[HostnameInfo],
     timeout: float,
-    max_concurrent: int = 20
+    max_concurrent: int = 20,
+    history: Optional[FailureHistory] = None,
+    tls: Optional[TlsCollector] = None,
+    archive: Optional[ProbeArchive] = None,
+    addresses: Optional[dict[str, list[str]]] = None
 ) -> list[ProcessingResult]:
     """
     Process all hostnames asynchronously with concurrency control.
@@ -235,31 +536,22 @@ async def process_all_hostnames(
         hostname_infos: List of hostname information
         timeout: Connection timeout
         max_concurrent: Maximum concurrent connections
+        history: Optional failure history used as a circuit breaker
+        tls: Optional collector for certificate and timing details
+        archive: Optional probe recording to write to or replay from
+        addresses: Optional hostname -> addresses cache used instead of resolving again
     
     Returns:
         List of processing results in original order
     """
-    connector = aiohttp.TCPConnector(
-        limit=max_concurrent,
-        limit_per_host=5,
-        ssl=True,
-        enable_cleanup_closed=True
-    )
-    
-    timeout_obj = aiohttp.ClientTimeout(total=timeout * 2)  # Overall session timeout
-    
-    async with aiohttp.ClientSession(
-        connector=connector,
-        timeout=timeout_obj,
-        headers={'User-Agent': 'Mozilla/5.0 (compatible; YAML-Processor/2.0)'}
-    ) as session:
+    async with create_session(timeout, max_concurrent, tls, addresses) as session:
         
         # Create semaphore to limit concurrent requests
         semaphore = asyncio.Semaphore(max_concurrent)
         
         async def process_with_semaphore(hostname_info: HostnameInfo) -> Optional[ProcessingResult]:
             async with semaphore:
-                return await process_hostname(session, hostname_info, timeout)
+                return await process_hostname(session, hostname_info, timeout, history, tls, archive)
         
         # Process all hostnames concurrently
         tasks = [process_with_semaphore(info) for info in hostname_infos]
@@ -276,6 +568,173 @@ async def process_all_hostnames(
         return processed_results
 
 
+def replay_nts(archive: ProbeArchive, hostname: str):
+    """Recorded ntsProbe.NtsResult for hostname; unrecorded hosts are inconclusive."""
+    recorded = archive.lookup('nts', hostname)
+    return ntsProbe.NtsResult(**recorded) if recorded else ntsProbe.NtsResult(hostname, None, error='not in recording')
+
+
+async def probe_nts(hostname: str, timeout: float, port: Optional[int], context,
+                    archive: Optional[ProbeArchive] = None):
+    """Single NTS-KE probe, recorded to or replayed from archive when given."""
+    if archive is not None and archive.replaying:
+        return replay_nts(archive, hostname)
+    result = await ntsProbe.probe(hostname, timeout, port or ntsProbe.NTS_KE_PORT, context)
+    if archive is not None:
+        archive.record('nts', hostname, result._asdict())
+    return result
+
+
+async def process_all_nts(
+    hostname_infos: Sequence[HostnameInfo],
+    timeout: float,
+    max_concurrent: int = 20,
+    port: Optional[int] = None,
+    archive: Optional[ProbeArchive] = None
+) -> dict:
+    """
+    Probe NTS-KE support for every distinct hostname.
+    
+    Args:
+        hostname_infos: List of hostname information
+        timeout: Per-server NTS-KE timeout
+        max_concurrent: Maximum concurrent NTS-KE connections
+        port: NTS-KE port override (default: 4460)
+        archive: Optional probe recording to write to or replay from
+    
+    Returns:
+        Dict of hostname to ntsProbe.NtsResult
+    """
+    hostnames = list(dict.fromkeys(clean_hostname(info.hostname) for info in hostname_infos
+                                   if not should_skip_hostname(info.hostname)))
+    print(f"🔐 Probing NTS-KE on {len(hostnames)} hostnames...")
+    if archive is not None and archive.replaying:
+        results = [replay_nts(archive, hostname) for hostname in hostnames]
+    else:
+        results = await ntsProbe.probe_all(hostnames, timeout, max_concurrent, port or ntsProbe.NTS_KE_PORT)
+        if archive is not None:
+            for result in results:
+                archive.record('nts', result.hostname, result._asdict())
+    for result in results:
+        if result.supported:
+            print(f"🔐 NTS supported: {result.hostname} (KE {result.ke_time * 1000:.0f} ms)")
+    return {result.hostname: result for result in results}
+
+
+async def stream_hostnames(
+    input_path: Path,
+    output_path: Path,
+    timeout: float,
+    max_concurrent: int = 20,
+    history: Optional[FailureHistory] = None,
+    nts_timeout: Optional[float] = None,
+    nts_port: Optional[int] = None,
+    archive: Optional[ProbeArchive] = None
+) -> int:
+    """
+    Check a server list of any size with flat memory use.
+    
+    Entries are parsed one at a time and fed through a bounded work queue;
+    each finished host is written to output_path as one NDJSON line holding
+    the proposed hostname change, HTTPS/TLS details and (with nts_timeout)
+    the NTS-KE result. The input file is never modified.
+    
+    Returns:
+        Number of entries processed
+    """
+    tls = TlsCollector()
+    nts_context = None
+    if nts_timeout is not None:
+        nts_context = ntsProbe.create_context()
+    
+    def hostname_infos():
+        for index, server in enumerate(iter_servers(input_path)):
+            if hostname_info := hostname_info_for(index, server):
+                yield hostname_info
+    
+    with open(output_path, 'w', encoding='utf-8') as output:
+        async with create_session(timeout, max_concurrent, tls) as session:
+            
+            async def work(hostname_info: HostnameInfo) -> dict:
+                clean = clean_hostname(hostname_info.hostname)
+                probes = [process_hostname(session, hostname_info, timeout, history, tls, archive)]
+                if nts_context is not None and not should_skip_hostname(clean):
+                    probes.append(probe_nts(clean, nts_timeout, nts_port, nts_context, archive))
+                change, *nts = await asyncio.gather(*probes)
+                return {
+                    'index': hostname_info.index,
+                    'hostname': hostname_info.original_value,
+                    'change': change,
+                    'https': tls.metadata.pop(clean, None),
+                    'nts': nts[0]._asdict() if nts else None,
+                }
+            
+            def write(hostname_info: HostnameInfo, record: dict) -> None:
+                output.write(json.dumps(record) + '\n')
+            
+            def failed(hostname_info: HostnameInfo, error: BaseException) -> None:
+                print(f"✗ Error processing hostname at index {hostname_info.index}: {error}")
+            
+            return await run_bounded(hostname_infos(), work, max_concurrent, write, failed)
+
+
+def nts_changes(content: dict, hostname_infos: Sequence[HostnameInfo], nts_results: dict) -> list[NtsChange]:
+    """
+    Compare NTS-KE results with the nts/nts_ke_ms fields of each entry.
+    
+    Supporting servers get nts: true and their KE latency in milliseconds; servers
+    previously marked as supporting NTS that now definitely refuse it are set to
+    false. Inconclusive probes (timeouts, network errors) never change an entry.
+    """
+    changes: list[NtsChange] = []
+    for info in hostname_infos:
+        result = nts_results.get(clean_hostname(info.hostname))
+        if result is None or result.supported is None:
+            continue
+        server = content['servers'][info.index]
+        if result.supported:
+            ke_ms = max(1, round(result.ke_time * 1000))
+            previous = server.get('nts_ke_ms')
+            latency_moved = (not isinstance(previous, int) or
+                             abs(ke_ms - previous) > NTS_KE_TOLERANCE * max(previous, 1))
+            if server.get('nts') is not True or latency_moved:
+                changes.append(NtsChange(index=info.index, hostname=info.hostname, nts=True, nts_ke_ms=ke_ms,
+                                         reason=f"NTS-KE answered in {ke_ms} ms"))
+        elif server.get('nts') is True:
+            changes.append(NtsChange(index=info.index, hostname=info.hostname, nts=False, nts_ke_ms=None,
+                                     reason=result.error or "NTS-KE failed"))
+    return changes
+
+
+def apply_nts_changes(content: dict, changes: Sequence[NtsChange]) -> dict:
+    """Apply NTS changes to YAML content; the fields are added after the existing ones."""
+    for change in changes:
+        server = content['servers'][change['index']]
+        server['nts'] = change['nts']
+        if change['nts_ke_ms'] is None:
+            server.pop('nts_ke_ms', None)
+        else:
+            server['nts_ke_ms'] = change['nts_ke_ms']
+    return content
+
+
+def report_certificates(metadata: dict[str, HttpsMetadata], warn_days: int = CERT_WARN_DAYS) -> list[HttpsMetadata]:
+    """Print certificates that expire within warn_days; returns them."""
+    flagged = []
+    for entry in sorted(metadata.values(), key=lambda m: (m['days_left'] is None, m['days_left'] or 0)):
+        if entry['days_left'] is not None and entry['days_left'] <= warn_days:
+            print(f"⚠ Certificate for {entry['hostname']} expires in {entry['days_left']} day(s) "
+                  f"({entry['not_after']}, issuer {entry['issuer']})")
+            flagged.append(entry)
+    return flagged
+
+
+def write_tls_report(metadata: dict[str, HttpsMetadata], output_path: Path) -> None:
+    """Write collected HTTPS metadata as a JSON list sorted by hostname."""
+    entries = [metadata[hostname] for hostname in sorted(metadata)]
+    output_path.write_text(json.dumps(entries, indent=2) + '\n', encoding='utf-8')
+
+
 def apply_changes_to_content(
     content: dict, 
     results: Sequence[ProcessingResult]
@@ -340,9 +799,31 @@ async def main() -> None:
                        help='Connection timeout in seconds (default: 5.0)')
     parser.add_argument('--max-concurrent', type=int, default=20,
                        help='Maximum concurrent connections (default: 20)')
+    parser.add_argument('--history', metavar='FILE',
+                       help='Probe failure history file; hosts that keep failing are backed off and skipped')
+    parser.add_argument('--tls-report', metavar='FILE',
+                       help='Write certificate expiry, issuer, TLS version and timings per host as JSON')
+    parser.add_argument('--cert-warn-days', type=int, default=CERT_WARN_DAYS,
+                       help=f'Flag certificates expiring within this many days (default: {CERT_WARN_DAYS})')
+    parser.add_argument('--nts', action='store_true',
+                       help='Also probe NTS-KE (TCP 4460) and record nts/nts_ke_ms in the YAML')
+    parser.add_argument('--nts-timeout', type=float, default=5.0,
+                       help='NTS-KE timeout in seconds (default: 5.0)')
+    parser.add_argument('--nts-port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--stream', metavar='FILE',
+                       help='Streaming mode for very large lists: read entries incrementally and write one NDJSON '
+                            'result per host to FILE as it completes, without modifying the input')
+    replay = parser.add_mutually_exclusive_group()
+    replay.add_argument('--record', metavar='FILE',
+                        help='Record each host\'s HTTPS status, TLS details and NTS-KE result to FILE')
+    replay.add_argument('--replay', metavar='FILE',
+                        help='Replay a recording instead of probing the network')
     
     args = parser.parse_args()
     
+    if args.replay and args.history:
+        parser.error('--replay cannot be combined with --history')
+    
     # Validate input file
     input_path = Path(args.input_file)
     if not input_path.exists():
@@ -361,6 +842,45 @@ async def main() -> None:
         print(f"✗ Error: Output path '{output_path}' is a directory")
         sys.exit(1)
     
+    archive = None
+    if args.replay or args.record:
+        try:
+            archive = ProbeArchive.load(args.replay) if args.replay else ProbeArchive(args.record)
+        except (OSError, ValueError) as e:
+            print(f"✗ Error: cannot read recording: {e}")
+            sys.exit(1)
+    started = time.perf_counter()
+    
+    def report_replay(count: int) -> None:
+        if archive is not None and archive.replaying:
+            elapsed = time.perf_counter() - started
+            rate = count / elapsed if elapsed else 0
+            print(f"⏱ Replayed {count} hostnames from {args.replay} in {elapsed:.3f}s ({rate:.0f} hostnames/s)")
+    
+    def save_archive() -> None:
+        # Whatever was probed is kept, also when the run fails or is interrupted
+        if archive is not None and not archive.replaying:
+            archive.save()
+            print(f"💾 Probe results recorded to: {args.record}")
+    
+    if args.stream:
+        history = FailureHistory.load(args.history) if args.history else None
+        print(f"🚀 Streaming {input_path} with max {args.max_concurrent} concurrent connections...")
+        try:
+            processed = await stream_hostnames(input_path, Path(args.stream), args.timeout, args.max_concurrent,
+                                               history, args.nts_timeout if args.nts else None, args.nts_port,
+                                               archive)
+        except (yaml.YAMLError, ValueError, OSError) as e:
+            print(f"✗ Error: {e}")
+            sys.exit(1)
+        finally:
+            save_archive()
+        if history and not args.dry_run:
+            history.save()
+        report_replay(processed)
+        print(f"\n💾 {processed} results written to: {args.stream}")
+        return
+    
     try:
         # Load YAML content
         content = yaml.safe_load(input_path.read_text(encoding='utf-8'))
@@ -382,7 +902,28 @@ async def main() -> None:
         
         # Process all hostnames asynchronously
         print(f"🚀 Starting async processing with max {args.max_concurrent} concurrent connections...")
-        results = await process_all_hostnames(hostname_infos, args.timeout, args.max_concurrent)
+        history = FailureHistory.load(args.history) if args.history else None
+        tls = TlsCollector()
+        https_stage = process_all_hostnames(hostname_infos, args.timeout, args.max_concurrent, history, tls, archive)
+        if args.nts:
+            # NTS-KE runs in the same event loop, concurrently with the HTTPS checks
+            results, nts_results = await asyncio.gather(
+                https_stage,
+                process_all_nts(hostname_infos, args.nts_timeout, args.max_concurrent, args.nts_port, archive))
+            nts_updates = nts_changes(content, hostname_infos, nts_results)
+        else:
+            results, nts_updates = await https_stage, []
+        if history and not args.dry_run:
+            history.save()
+        report_replay(hostname_count)
+        
+        # Certificate details come from the same connections, no second scan
+        print()
+        if not report_certificates(tls.metadata, args.cert_warn_days):
+            print(f"✅ No certificates expire within {args.cert_warn_days} days")
+        if args.tls_report:
+            write_tls_report(tls.metadata, Path(args.tls_report))
+            print(f"💾 TLS report written to: {args.tls_report}")
         
         # Report results
         if results:
@@ -405,12 +946,18 @@ async def main() -> None:
         else:
             print("\n✅ No changes made - all hostnames are already in correct format")
         
+        if nts_updates:
+            print("\n🔐 NTS changes:")
+            for change in nts_updates:
+                print(f"  → {change['hostname']}: nts {'true' if change['nts'] else 'false'} ({change['reason']})")
+        
         # Apply changes and write output (unless dry run)
-        if not args.dry_run and results:
+        if not args.dry_run and (results or nts_updates):
             modified_content = apply_changes_to_content(content, results)
+            apply_nts_changes(modified_content, nts_updates)
             write_yaml_with_formatting(modified_content, output_path)
             print(f"\n💾 Output written to: {output_path}")
-        elif args.dry_run and results:
+        elif args.dry_run and (results or nts_updates):
             print(f"\n🔄 [DRY RUN] Would write to: {output_path}")
             
     except yaml.YAMLError as e:
@@ -428,6 +975,8 @@ async def main() -> None:
     except Exception as e:
         print(f"✗ Unexpected error: {e}")
         sys.exit(1)
+    finally:
+        save_archive()
 
 
 if __name__ == '__main__':
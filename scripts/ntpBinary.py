@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+ntpBinary.py - Compact fixed-layout binary export of ntp-sources.yml
+
+Layout (all integers little-endian):
+
+  header   magic "NTPS", version u16, reserved u16,
+           server_count u32, string_count u32, location_count u32, asn_count u32,
+           strings_offset u32, records_offset u32, locations_offset u32, asns_offset u32
+  strings  (string_count + 1) u32 offsets into the UTF-8 blob that follows
+  records  server_count fixed 24-byte records:
+             hostname u32, owner u32, notes u32 (string indexes),
+             location u16 (location index), stratum u8 (255 = unknown), flags u8 (bit 0 = vm),
+             asn_start u32, asn_len u16, reserved u16
+  locations location_count u32 string indexes, in first-seen order
+  asns     asn_count u32 AS numbers, each server's slice sorted ascending
+
+Consumers can mmap the file and filter by location, stratum, AS or vm without parsing text.
+
+Usage: python3 ntpBinary.py <ntp-sources.bin> [--location L] [--stratum N] [--asn N] [--vm|--no-vm]
+"""
+
+import argparse
+import mmap
+import re
+import struct
+
+from asnReport import parse_as_field
+
+MAGIC = b"NTPS"
+VERSION = 1
+STRATUM_UNKNOWN = 255
+FLAG_VM = 0x01
+
+HEADER = struct.Struct("<4sHHIIIIIIII")
+RECORD = struct.Struct("<IIIHBBIHH")
+U32 = struct.Struct("<I")
+U16_MAX = 0xFFFF
+U32_MAX = 0xFFFFFFFF
+
+
+def check_range(value, limit, what):
+    """Return value, or raise ValueError if it does not fit its field of the layout."""
+    if not 0 <= value <= limit:
+        raise ValueError(f"{what} {value} does not fit the binary layout (maximum {limit})")
+    return value
+
+
+def extract_hostname(hostname_field):
+    if isinstance(hostname_field, str) and hostname_field.startswith("[") and "](" in hostname_field and hostname_field.endswith(")"):
+        match = re.search(r"\[([^\]]+)\]\(.*\)", hostname_field)
+        if match:
+            return match.group(1)
+    return hostname_field
+
+
+def generate_binary(data):
+    """Encode the loaded server list into the fixed binary layout; raises ValueError if it does not fit."""
+    strings = []
+    string_index = {}
+
+    def intern(value):
+        value = "" if value is None else str(value)
+        if value not in string_index:
+            string_index[value] = len(strings)
+            strings.append(value)
+        return string_index[value]
+
+    locations = []
+    location_index = {}
+    records = bytearray()
+    asns = []
+
+    for server in data["servers"]:
+        location = str(server.get("location", ""))
+        if location not in location_index:
+            location_index[location] = check_range(len(locations), U16_MAX, "location count")
+            locations.append(intern(location))
+
+        stratum = server.get("stratum")
+        if not isinstance(stratum, int) or not 0 <= stratum < STRATUM_UNKNOWN:
+            stratum = STRATUM_UNKNOWN
+
+        server_asns, _ = parse_as_field(server.get("AS"))
+        # parse_as_field already rejects AS numbers beyond 32 bits
+        hostname = extract_hostname(server["hostname"])
+        flags = FLAG_VM if server.get("vm", False) else 0
+
+        records += RECORD.pack(
+            intern(hostname),
+            intern(server.get("owner")),
+            intern(server.get("notes")),
+            location_index[location],
+            stratum,
+            flags,
+            check_range(len(asns), U32_MAX, "AS table size"),
+            check_range(len(server_asns), U16_MAX, f"{hostname}: AS count"),
+            0,
+        )
+        asns.extend(server_asns)
+
+    blobs = [s.encode("utf-8") for s in strings]
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    string_table = struct.pack(f"<{len(offsets)}I", *offsets) + b"".join(blobs)
+    # Keep the following sections 4-byte aligned
+    string_table += b"\0" * (-len(string_table) % 4)
+
+    strings_offset = HEADER.size
+    records_offset = strings_offset + len(string_table)
+    locations_offset = records_offset + len(records)
+    asns_offset = locations_offset + 4 * len(locations)
+
+    header = HEADER.pack(
+        MAGIC, VERSION, 0,
+        len(data["servers"]), len(strings), len(locations), len(asns),
+        strings_offset, records_offset, locations_offset, asns_offset,
+    )
+    return b"".join((
+        header,
+        string_table,
+        bytes(records),
+        struct.pack(f"<{len(locations)}I", *locations),
+        struct.pack(f"<{len(asns)}I", *asns),
+    ))
+
+
+def write_binary(data, path):
+    with open(path, "wb") as file:
+        file.write(generate_binary(data))
+
+
+class NtpSourcesBinary:
+    """Read-only view over a binary export, backed by mmap when given a path."""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        (magic, version, _, self.server_count, self.string_count, self.location_count,
+         self.asn_count, self.strings_offset, self.records_offset, self.locations_offset,
+         self.asns_offset) = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("Not an NTP sources binary file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported NTP sources binary version {version}")
+        self.blob_offset = self.strings_offset + 4 * (self.string_count + 1)
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as file:
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def string(self, index):
+        start, end = struct.unpack_from("<II", self.buffer, self.strings_offset + 4 * index)
+        return bytes(self.buffer[self.blob_offset + start:self.blob_offset + end]).decode("utf-8")
+
+    def location_id(self, name):
+        for i in range(self.location_count):
+            if self.string(U32.unpack_from(self.buffer, self.locations_offset + 4 * i)[0]) == name:
+                return i
+        return None
+
+    def record(self, i):
+        return RECORD.unpack_from(self.buffer, self.records_offset + RECORD.size * i)
+
+    def asns(self, start, length):
+        return struct.unpack_from(f"<{length}I", self.buffer, self.asns_offset + 4 * start)
+
+    def select(self, location=None, stratum=None, asn=None, vm=None):
+        """Yield record indexes matching every given filter; strings are only decoded on demand."""
+        location_id = None
+        if location is not None:
+            location_id = self.location_id(location)
+            if location_id is None:
+                return
+        for i in range(self.server_count):
+            _, _, _, loc, srv_stratum, flags, asn_start, asn_len, _ = self.record(i)
+            if location_id is not None and loc != location_id:
+                continue
+            if stratum is not None and srv_stratum != stratum:
+                continue
+            if vm is not None and bool(flags & FLAG_VM) != vm:
+                continue
+            if asn is not None and asn not in self.asns(asn_start, asn_len):
+                continue
+            yield i
+
+    def server(self, i):
+        hostname, owner, notes, loc, stratum, flags, asn_start, asn_len, _ = self.record(i)
+        location = self.string(U32.unpack_from(self.buffer, self.locations_offset + 4 * loc)[0])
+        return {
+            "hostname": self.string(hostname),
+            "AS": ", ".join(f"AS{a}" for a in self.asns(asn_start, asn_len)) or "Unknown",
+            "stratum": "Unknown" if stratum == STRATUM_UNKNOWN else stratum,
+            "location": location,
+            "owner": self.string(owner),
+            "notes": self.string(notes),
+            "vm": bool(flags & FLAG_VM),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Filter servers from a binary NTP sources export")
+    parser.add_argument("binary_file", help="Path to the binary export")
+    parser.add_argument("--location", help="Only servers in this location group")
+    parser.add_argument("--stratum", type=int, help="Only servers with this stratum")
+    parser.add_argument("--asn", type=int, help="Only servers announced from this AS number")
+    parser.add_argument("--vm", action=argparse.BooleanOptionalAction, default=None,
+                        help="Only virtualized (--vm) or non-virtualized (--no-vm) servers")
+    args = parser.parse_args()
+
+    view = NtpSourcesBinary.open(args.binary_file)
+    for i in view.select(args.location, args.stratum, args.asn, args.vm):
+        print(view.server(i)["hostname"])
+
+
+if __name__ == "__main__":
+    main()
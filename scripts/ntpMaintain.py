@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+ntpMaintain.py - Run the whole list maintenance pipeline in one pass
+
+Loads ntp-sources.yml once and runs the maintenance stages as a DAG:
+
+  resolve -> { asn (asnmap), ntp (stratum probe), https (link check) } -> merge -> write -> render
+
+The resolve stage fills a shared address cache used by the native NTP probes
+and the HTTPS checks (asnmap resolves the names it is given itself), the
+three lookup stages run concurrently, the YAML is written once at the end and
+README.md, chrony.conf and ntp.toml are regenerated from the in-memory data.
+
+Usage: python3 ntpMaintain.py [--dry-run] [--skip STAGE] <ntp-sources.yml>
+"""
+
+import sys
+import asyncio
+import logging
+import argparse
+import contextlib
+import shutil
+import time
+from pathlib import Path
+
+import yaml
+
+import linkCheck
+from ntpProbe import ProbeScheduler
+from ntpServerConvertor import iter_markdown, generate_chrony_conf, generate_ntp_toml, resolve_servers, update_readme
+from ntpUpdateSources import (apply_lookups, extract_hostname, format_change_report_markdown,
+                              get_as_numbers_batch, get_strata, write_yaml_with_formatting)
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+STAGES = ('asn', 'ntp', 'https', 'render')
+
+
+class StageTimer:
+    """Collects wall-clock time per pipeline stage"""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextlib.contextmanager
+    def __call__(self, name):
+        start = time.perf_counter()
+        logger.info(f"[{name}] started")
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - start
+            logger.info(f"[{name}] finished in {self.timings[name]:.2f}s")
+
+
+async def run_asn_stage(hostnames, timer):
+    with timer('asn'):
+        # asnmap is a blocking batch subprocess; keep the event loop free for the other stages
+        return await asyncio.to_thread(get_as_numbers_batch, hostnames)
+
+
+async def run_ntp_stage(hostnames, addresses, backend, max_processes, timer):
+    with timer('ntp'):
+        if backend == 'ntpdate':
+            return await get_strata(hostnames, max_processes)
+
+        scheduler = ProbeScheduler()
+        budget = asyncio.Semaphore(max_processes)
+
+        async def stratum(hostname):
+            resolved = addresses.get(hostname)
+            if not resolved:
+                return None
+            outcome = await scheduler.probe(hostname, target=resolved[0], budget=budget,
+                                            deadline=2.0, attempts=3, stagger=0.3)
+            response = outcome.response
+            return response.stratum if response is not None and 1 <= response.stratum <= 15 else None
+
+        strata = await asyncio.gather(*(stratum(hostname) for hostname in hostnames))
+        return dict(zip(hostnames, strata))
+
+
+async def run_https_stage(data, addresses, timeout, max_concurrent, timer):
+    try:
+        import aiohttp  # noqa: F401 - only the probes need it, so it stays optional
+    except ImportError as e:
+        logger.warning(f"Skipping https stage: {e}")
+        return []
+
+    with timer('https'):
+        hostname_infos = linkCheck.extract_hostname_info(data)
+        return await linkCheck.process_all_hostnames(hostname_infos, timeout, max_concurrent, addresses=addresses)
+
+
+async def run_lookups(data, hostnames, addresses, args, timer):
+    """Run the asn, ntp and https stages concurrently"""
+    async def skipped(result=None):
+        return result
+
+    asn = run_asn_stage(hostnames, timer) if 'asn' not in args.skip else skipped()
+    ntp = (run_ntp_stage(hostnames, addresses, args.ntp_backend, args.max_processes, timer)
+           if 'ntp' not in args.skip else skipped())
+    https = (run_https_stage(data, addresses, args.timeout, args.max_concurrent, timer)
+             if 'https' not in args.skip else skipped([]))
+    return await asyncio.gather(asn, ntp, https)
+
+
+def merge_lookups(data, as_lookup, stratum_lookup, link_results, dry_run=False):
+    """
+    Apply the stage results to data in place (nothing is changed on a dry run)
+    Returns (updated, changes) as apply_lookups() does
+    """
+    updated, changes = apply_lookups(data, as_lookup or {}, stratum_lookup or {}, dry_run=dry_run)
+    if link_results:
+        for result in link_results:
+            logger.info(f"  {'Linking' if result['action'] == 'convert_to_markdown' else 'Unlinking'} "
+                        f"{result['old']} -> {result['new']}")
+        if not dry_run:
+            linkCheck.apply_changes_to_content(data, link_results)
+        updated = True
+    return updated, changes
+
+
+def render(data, readme_path, chrony_path, toml_path):
+    update_readme(readme_path, iter_markdown(data))
+    with open(chrony_path, 'w') as f:
+        f.write(generate_chrony_conf(data))
+    with open(toml_path, 'w') as f:
+        f.write(generate_ntp_toml(data))
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(
+        description="Run AS, stratum and HTTPS maintenance on ntp-sources.yml as one pipeline",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python3 ntpMaintain.py ntp-sources.yml
+  python3 ntpMaintain.py --dry-run ntp-sources.yml
+  python3 ntpMaintain.py --skip https --ntp-backend ntpdate ntp-sources.yml
+        """
+    )
+    parser.add_argument('yaml_file', help='Path to the ntp-sources.yml file')
+    parser.add_argument('--dry-run', '-n', action='store_true',
+                       help='Show what changes would be made without modifying any file')
+    parser.add_argument('--skip', action='append', choices=STAGES, default=[],
+                       help='Skip a stage (repeatable)')
+    parser.add_argument('--ntp-backend', choices=['native', 'ntpdate'], default='native',
+                       help='Stratum probe: built-in NTP client or ntpdate/ntpq (default: native)')
+    parser.add_argument('--max-processes', '-j', type=int, default=16,
+                       help='Maximum concurrent stratum probes, native or ntpdate/ntpq (default: 16)')
+    parser.add_argument('--timeout', type=float, default=5.0,
+                       help='HTTPS connection timeout in seconds (default: 5.0)')
+    parser.add_argument('--max-concurrent', type=int, default=20,
+                       help='Maximum concurrent HTTPS connections (default: 20)')
+    parser.add_argument('--report-markdown', metavar='FILE',
+                       help='Write the AS/stratum changes as a Markdown summary')
+    args = parser.parse_args()
+
+    if not Path(args.yaml_file).exists():
+        logger.error(f"File not found: {args.yaml_file}")
+        sys.exit(1)
+    required = []
+    if 'asn' not in args.skip:
+        required.append('asnmap')
+    if 'ntp' not in args.skip and args.ntp_backend == 'ntpdate':
+        required.append('ntpdate')
+    missing = [tool for tool in required if shutil.which(tool) is None]
+    if missing:
+        logger.error(f"Missing required tools: {', '.join(missing)} (see ntpUpdateSources.py, or use --skip)")
+        sys.exit(1)
+
+    timer = StageTimer()
+    started = time.perf_counter()
+
+    with timer('load'):
+        with open(args.yaml_file, 'r') as f:
+            data = yaml.safe_load(f)
+    if not data or 'servers' not in data:
+        logger.error("Invalid YAML structure. Expected 'servers' key.")
+        sys.exit(1)
+
+    hostnames = list(dict.fromkeys(extract_hostname(server['hostname'])
+                                   for server in data['servers'] if 'hostname' in server))
+
+    with timer('resolve'):
+        addresses = resolve_servers(data)['addresses']
+    unresolved = [hostname for hostname in hostnames if not addresses.get(hostname)]
+    logger.info(f"Resolved {len(hostnames) - len(unresolved)} of {len(hostnames)} hostnames")
+
+    as_lookup, stratum_lookup, link_results = asyncio.run(
+        run_lookups(data, hostnames, addresses, args, timer))
+
+    with timer('merge'):
+        updated, changes = merge_lookups(data, as_lookup, stratum_lookup, link_results, args.dry_run)
+
+    logger.info(f"{len(changes)} AS/stratum changes, {len(link_results)} hostname link changes")
+    for change in changes:
+        logger.info(f"  - {change}")
+    if args.report_markdown:
+        with open(args.report_markdown, 'w', encoding='utf-8') as f:
+            f.write(format_change_report_markdown(changes, args.dry_run))
+
+    if args.dry_run:
+        logger.info("Dry run: no files written")
+    else:
+        if updated:
+            with timer('write'):
+                shutil.copy2(args.yaml_file, f"{args.yaml_file}.backup")
+                write_yaml_with_formatting(data, args.yaml_file)
+            logger.info(f"Updated {args.yaml_file}")
+        if 'render' not in args.skip:
+            with timer('render'):
+                render(data, 'README.md', 'chrony.conf', 'ntp.toml')
+
+    summary = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in timer.timings.items())
+    logger.info(f"Pipeline finished in {time.perf_counter() - started:.2f}s ({summary})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Minimal native NTP client probe (RFC 5905 client/server mode).
+
+Sends a few staggered mode 3 requests over UDP and returns as soon as the
+first valid, correctly originated server reply arrives, so a healthy host is
+confirmed within one round trip instead of waiting out a tool's timeout.
+"""
+
+import asyncio
+import contextlib
+import os
+import socket
+import struct
+import time
+from typing import NamedTuple, Optional
+
+NTP_PORT = 123
+NTP_PACKET = struct.Struct("!BBbbII4sQQQQ")
+# Seconds between the NTP era 0 epoch (1900) and the Unix epoch (1970)
+NTP_EPOCH_OFFSET = 2208988800
+
+MODE_CLIENT = 3
+MODE_SERVER = 4
+LEAP_ALARM = 3
+
+# Root distance (root delay / 2 + root dispersion) beyond which ntpd and chrony
+# treat a source as unfit for synchronization (ntpd's default maxdist)
+MAX_ROOT_DISTANCE = 1.5
+# A synchronized server updates its reference time at least every few poll intervals
+MAX_REFERENCE_AGE = 86400
+# Name resolution runs in the default thread pool and may queue behind other
+# lookups, so it gets its own budget rather than eating into the probe deadline
+RESOLVE_TIMEOUT = 5.0
+
+
+class NtpResponse(NamedTuple):
+    """Fields decoded from a server reply plus the measured round trip."""
+    address: str
+    leap: int
+    version: int
+    stratum: int
+    poll: int
+    precision: int
+    root_delay: float
+    root_dispersion: float
+    ref_id: bytes
+    reference_time: float
+    rtt: float
+    offset: float
+
+
+def to_ntp_time(unix_time: float) -> int:
+    return int((unix_time + NTP_EPOCH_OFFSET) * 2**32)
+
+
+def from_ntp_time(ntp_time: int) -> float:
+    return ntp_time / 2**32 - NTP_EPOCH_OFFSET
+
+
+def from_short_format(value: int) -> float:
+    return value / 2**16
+
+
+def build_request(transmit: int, version: int = 4) -> bytes:
+    """Build a 48-byte client request carrying transmit as its transmit timestamp."""
+    return NTP_PACKET.pack((version << 3) | MODE_CLIENT, 0, 0, 0, 0, 0, b"\0" * 4, 0, 0, 0, transmit)
+
+
+def parse_response(
+    data: bytes,
+    address: str,
+    sent: dict[int, float],
+    received: float
+) -> Optional[NtpResponse]:
+    """
+    Decode a server reply, or return None if it is not a valid answer to one of our requests.
+
+    Args:
+        data: Raw UDP payload
+        address: Address the reply came from
+        sent: Transmit timestamps we sent, mapped to their local send time
+        received: Local receive time of the reply
+    """
+    if len(data) < NTP_PACKET.size:
+        return None
+    (flags, stratum, poll, precision, root_delay, root_dispersion, ref_id,
+     reference, origin, receive, transmit) = NTP_PACKET.unpack_from(data)
+    if flags & 0x7 != MODE_SERVER or origin not in sent or transmit == 0:
+        return None
+
+    t1 = sent[origin]
+    t2 = from_ntp_time(receive)
+    t3 = from_ntp_time(transmit)
+    t4 = received
+    return NtpResponse(
+        address=address,
+        leap=flags >> 6,
+        version=(flags >> 3) & 0x7,
+        stratum=stratum,
+        poll=poll,
+        precision=precision,
+        root_delay=from_short_format(root_delay),
+        root_dispersion=from_short_format(root_dispersion),
+        ref_id=ref_id,
+        reference_time=from_ntp_time(reference) if reference else 0.0,
+        rtt=(t4 - t1) - (t3 - t2),
+        offset=((t2 - t1) + (t3 - t4)) / 2,
+    )
+
+
+class _ProbeProtocol(asyncio.DatagramProtocol):
+    def __init__(self, address: str, sent: dict[int, float], done: asyncio.Future):
+        self.address = address
+        self.sent = sent
+        self.done = done
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        response = parse_response(data, self.address, self.sent, time.time())
+        if response is not None and not self.done.done():
+            self.done.set_result(response)
+
+    def error_received(self, exc: Exception) -> None:
+        # ICMP unreachable and friends: stop early rather than waiting out the deadline
+        if not self.done.done():
+            self.done.set_exception(exc)
+
+
+async def probe(
+    hostname: str,
+    deadline: float = 0.5,
+    attempts: int = 2,
+    stagger: float = 0.1,
+    port: int = NTP_PORT,
+    resolve_timeout: float = RESOLVE_TIMEOUT
+) -> Optional[NtpResponse]:
+    """
+    Probe a server and return its first valid reply, or None once the deadline passes.
+
+    Args:
+        hostname: Server name or address
+        deadline: Seconds allowed for all attempts, counted from when the name is resolved
+        attempts: Number of requests to send
+        stagger: Seconds between successive requests
+        port: Server UDP port
+        resolve_timeout: Seconds allowed for name resolution
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        infos = await asyncio.wait_for(
+            loop.getaddrinfo(hostname, port, type=socket.SOCK_DGRAM), resolve_timeout)
+    except (OSError, asyncio.TimeoutError, UnicodeError):
+        return None
+    end = loop.time() + deadline
+
+    family, _, _, _, sockaddr = infos[0]
+    done = loop.create_future()
+    sent: dict[int, float] = {}
+    try:
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _ProbeProtocol(sockaddr[0], sent, done), remote_addr=sockaddr[:2], family=family)
+    except OSError:
+        return None
+
+    try:
+        for attempt in range(attempts):
+            now = time.time()
+            # Random low-order bits make every request's origin unique and unguessable
+            transmit = to_ntp_time(now) & ~0xFFFFFF | int.from_bytes(os.urandom(3), "big")
+            sent[transmit] = now
+            transport.sendto(build_request(transmit))
+            wait = stagger if attempt < attempts - 1 else end - loop.time()
+            wait = min(wait, end - loop.time())
+            if wait <= 0:
+                break
+            try:
+                return await asyncio.wait_for(asyncio.shield(done), wait)
+            except asyncio.TimeoutError:
+                continue
+        return None
+    except OSError:
+        return None
+    finally:
+        transport.close()
+        if done.done() and not done.cancelled():
+            done.exception()  # Mark a late ICMP error as retrieved
+        else:
+            done.cancel()
+
+
+def format_ref_id(ref_id: bytes, stratum: int) -> str:
+    """
+    Render a reference ID the way ntpq does: a source code such as "GPS" or
+    "PPS" for stratum 0 and 1, the upstream IPv4 address (or IPv6 hash) above.
+    """
+    if stratum <= 1:
+        return ref_id.rstrip(b"\0").decode("ascii", errors="replace")
+    return socket.inet_ntoa(ref_id)
+
+
+def health_issues(response: NtpResponse, now: Optional[float] = None) -> list[str]:
+    """
+    Misconfiguration visible in a single reply: leap alarm, leap second pending,
+    excessive root distance or a stale reference time.
+    """
+    issues = []
+    if response.leap == LEAP_ALARM:
+        issues.append("leap alarm (server reports itself unsynchronized)")
+    elif response.leap:
+        issues.append(f"leap second pending ({'insert' if response.leap == 1 else 'delete'})")
+    root_distance = response.root_delay / 2 + response.root_dispersion
+    if root_distance > MAX_ROOT_DISTANCE:
+        issues.append(f"root distance {root_distance:.3f}s exceeds {MAX_ROOT_DISTANCE}s")
+    now = time.time() if now is None else now
+    if response.reference_time and now - response.reference_time > MAX_REFERENCE_AGE:
+        issues.append(f"reference time is {(now - response.reference_time) / 86400:.1f} days old")
+    return issues
+
+
+def kiss_code(response: Optional[NtpResponse]) -> Optional[str]:
+    """Return the Kiss-o'-Death code (e.g. "RATE") of a stratum 0 reply, else None."""
+    if response is None or response.stratum != 0:
+        return None
+    return response.ref_id.rstrip(b"\0").decode("ascii", errors="replace")
+
+
+# Kiss codes after which the server must not be queried again (RFC 5905 section 7.4)
+KISS_STOP = frozenset({"DENY", "RSTR"})
+KISS_RATE = "RATE"
+
+
+class ProbeOutcome(NamedTuple):
+    """
+    Result of a scheduled probe; response is None when skipped, silent or kissed.
+    timestamp is the Unix time the probe finished (None when skipped).
+    """
+    response: Optional[NtpResponse]
+    kiss: Optional[str] = None
+    skipped: bool = False
+    timestamp: Optional[float] = None
+
+
+class ProbeScheduler:
+    """
+    Rate-limit aware scheduling of probes.
+
+    Enforces a minimum interval between probes to the same server, doubles it
+    whenever the server answers RATE, stops probing servers that answer DENY or
+    RSTR, and spreads probes to the same group (AS number or operator) over
+    time with a per-group concurrency cap and start gap.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = 2.0,
+        max_interval: float = 64.0,
+        group_concurrency: int = 2,
+        group_gap: float = 0.05
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.group_concurrency = group_concurrency
+        self.group_gap = group_gap
+        self.intervals: dict[str, float] = {}
+        self.next_allowed: dict[str, float] = {}
+        self.host_locks: dict[str, asyncio.Lock] = {}
+        self.group_slots: dict[str, asyncio.Semaphore] = {}
+        self.group_locks: dict[str, asyncio.Lock] = {}
+        self.group_next: dict[str, float] = {}
+        self.stopped: dict[str, str] = {}
+        self.kisses: dict[str, list[str]] = {}
+
+    async def _wait_for_group(self, group: str, loop: asyncio.AbstractEventLoop) -> None:
+        # Serialize start times within a group so its probes never burst
+        async with self.group_locks.setdefault(group, asyncio.Lock()):
+            delay = self.group_next.get(group, 0.0) - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.group_next[group] = loop.time() + self.group_gap
+
+    async def probe(
+        self,
+        hostname: str,
+        group: Optional[str] = None,
+        target: Optional[str] = None,
+        budget: Optional[asyncio.Semaphore] = None,
+        **kwargs
+    ) -> ProbeOutcome:
+        """
+        Probe hostname once its interval and its group allow it.
+
+        Args:
+            hostname: Server to probe
+            group: AS number or operator used to spread load; defaults to the hostname
+            target: Address to send to instead of resolving hostname again
+            budget: Global concurrency limit, held only while the probe itself runs
+                so hosts waiting on their interval or group do not starve other groups
+            kwargs: Passed through to probe()
+        """
+        if hostname in self.stopped:
+            return ProbeOutcome(response=None, kiss=self.stopped[hostname], skipped=True)
+
+        loop = asyncio.get_running_loop()
+        group = group or hostname
+        slots = self.group_slots.setdefault(group, asyncio.Semaphore(self.group_concurrency))
+        async with self.host_locks.setdefault(hostname, asyncio.Lock()), slots:
+            delay = self.next_allowed.get(hostname, 0.0) - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._wait_for_group(group, loop)
+            if hostname in self.stopped:
+                return ProbeOutcome(response=None, kiss=self.stopped[hostname], skipped=True)
+
+            async with budget or contextlib.nullcontext():
+                response = await probe(target or hostname, **kwargs)
+            finished = time.time()
+            kiss = kiss_code(response)
+            interval = self.intervals.get(hostname, self.min_interval)
+            if kiss is not None:
+                self.kisses.setdefault(hostname, []).append(kiss)
+                if kiss in KISS_STOP:
+                    self.stopped[hostname] = kiss
+                elif kiss == KISS_RATE:
+                    interval = min(interval * 2, self.max_interval)
+            self.intervals[hostname] = interval
+            self.next_allowed[hostname] = loop.time() + interval
+
+        if kiss is not None:
+            return ProbeOutcome(response=None, kiss=kiss, timestamp=finished)
+        return ProbeOutcome(response=response, timestamp=finished)
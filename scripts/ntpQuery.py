@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+
+import argparse
+import sys
+import time
+from collections import defaultdict
+
+import yaml
+
+from asnReport import parse_as_field
+from ntpServerConvertor import load_yaml, extract_hostname, generate_markdown, generate_chrony_conf, generate_ntp_toml
+
+
+class ServerIndex:
+    """In-memory inverted indexes over the loaded server list."""
+
+    def __init__(self, servers):
+        self.servers = servers
+        self.all = frozenset(range(len(servers)))
+        self.by_location = defaultdict(set)
+        self.by_owner = defaultdict(set)
+        self.by_stratum = defaultdict(set)
+        self.by_asn = defaultdict(set)
+        self.by_vm = defaultdict(set)
+        self.by_nts = defaultdict(set)
+
+        for i, server in enumerate(servers):
+            self.by_location[str(server.get("location", "")).lower()].add(i)
+            self.by_owner[str(server.get("owner", "")).lower()].add(i)
+            self.by_stratum[server.get("stratum")].add(i)
+            self.by_vm[bool(server.get("vm", False))].add(i)
+            self.by_nts[bool(server.get("nts", False))].add(i)
+            asns, _ = parse_as_field(server.get("AS"))
+            for asn in asns:
+                self.by_asn[asn].add(i)
+
+    @staticmethod
+    def _union(index, keys):
+        result = set()
+        for key in keys:
+            result |= index.get(key, set())
+        return result
+
+    def query(self, locations=None, owners=None, strata=None, asns=None, exclude_asns=None, vm=None, nts=None):
+        """Intersect the index postings for every given filter; returns indexes in list order."""
+        result = set(self.all)
+        if locations:
+            result &= self._union(self.by_location, (location.lower() for location in locations))
+        if owners:
+            result &= self._union(self.by_owner, (owner.lower() for owner in owners))
+        if strata:
+            result &= self._union(self.by_stratum, strata)
+        if asns:
+            result &= self._union(self.by_asn, asns)
+        if exclude_asns:
+            result -= self._union(self.by_asn, exclude_asns)
+        if vm is not None:
+            result &= self.by_vm[vm]
+        if nts is not None:
+            result &= self.by_nts[nts]
+        return sorted(result)
+
+
+def parse_asn(value):
+    value = value.strip()
+    if value[:2].upper() == "AS":
+        value = value[2:]
+    if not value.isdigit():
+        raise argparse.ArgumentTypeError(f"invalid AS number: {value}")
+    return int(value)
+
+
+def parse_stratum(value):
+    if value.lower() == "unknown":
+        return "Unknown"
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid stratum: {value}")
+
+
+OUTPUT_FORMATS = {
+    "list": lambda data: "".join(f"{extract_hostname(server['hostname'])}\n" for server in data["servers"]),
+    "markdown": generate_markdown,
+    "chrony": generate_chrony_conf,
+    "toml": generate_ntp_toml,
+    "yaml": lambda data: yaml.dump(data, default_flow_style=False, sort_keys=False, allow_unicode=True, width=1000),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Query NTP servers by location, owner, stratum, AS, vm and NTS, emitting any convertor format",
+        epilog='Example: %(prog)s --location Germany --stratum 1 --no-vm --exclude-asn AS15169 --format chrony'
+    )
+    parser.add_argument("input_file", default="ntp-sources.yml", nargs="?",
+                        help="Path to the input YAML file (default: ntp-sources.yml)")
+    parser.add_argument("--location", action="append", help="Location group (repeatable, case-insensitive)")
+    parser.add_argument("--owner", action="append", help="Owner (repeatable, case-insensitive)")
+    parser.add_argument("--stratum", action="append", type=parse_stratum, help="Stratum, or 'Unknown' (repeatable)")
+    parser.add_argument("--asn", action="append", type=parse_asn, help="Include servers in this AS (repeatable)")
+    parser.add_argument("--exclude-asn", action="append", type=parse_asn, help="Exclude servers in this AS (repeatable)")
+    parser.add_argument("--vm", action=argparse.BooleanOptionalAction, default=None,
+                        help="Only virtualized (--vm) or non-virtualized (--no-vm) servers")
+    parser.add_argument("--nts", action=argparse.BooleanOptionalAction, default=None,
+                        help="Only servers with (--nts) or without (--no-nts) NTS")
+    parser.add_argument("--format", choices=sorted(OUTPUT_FORMATS), default="list",
+                        help="Output format (default: list)")
+    parser.add_argument("--timing", action="store_true", help="Report index build and lookup times on stderr")
+    args = parser.parse_args()
+
+    try:
+        data = load_yaml(args.input_file)
+    except FileNotFoundError:
+        print(f"Error: Input file '{args.input_file}' not found.", file=sys.stderr)
+        sys.exit(1)
+    except yaml.YAMLError as e:
+        print(f"Error parsing YAML file '{args.input_file}': {e}", file=sys.stderr)
+        sys.exit(1)
+
+    start = time.perf_counter()
+    index = ServerIndex(data["servers"])
+    built = time.perf_counter()
+    matches = index.query(args.location, args.owner, args.stratum, args.asn, args.exclude_asn, args.vm, args.nts)
+    queried = time.perf_counter()
+
+    if args.timing:
+        print(f"Indexed {len(index.servers)} servers in {(built - start) * 1000:.3f} ms, "
+              f"query matched {len(matches)} in {(queried - built) * 1000:.3f} ms", file=sys.stderr)
+
+    sys.stdout.write(OUTPUT_FORMATS[args.format]({"servers": [index.servers[i] for i in matches]}))
+
+
+if __name__ == "__main__":
+    main()
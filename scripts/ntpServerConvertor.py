@@ -4,6 +4,58 @@ import yaml
 import argparse
 import re
 import os
+import shutil
+import socket
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import chain
+
+from ntpBinary import write_binary
+from ntpValidate import shape_problems
+from operatorReport import build_report, iter_summary_markdown, probe_summary
+from probeStore import ProbeStore
+
+# Fields the generators read and the types they rely on. Only a missing field
+# or a wrong type stops the output from being written; values are checked by
+# ntpValidate.py, so one odd probe result never blocks regeneration.
+GENERATOR_FIELDS = {"hostname": str, "stratum": (int, str), "location": str, "owner": str}
+OPTIONAL_GENERATOR_FIELDS = {"vm": bool, "nts": bool}
+
+
+# Locations that name a country or region; every other location group is an
+# operator or anycast service and is sharded under "Global".
+LOCATION_CONTINENTS = {
+    "Austria": "Europe",
+    "Basque Country": "Europe",
+    "Belgium": "Europe",
+    "Brazil": "South America",
+    "Canada": "North America",
+    "Chile": "South America",
+    "China": "Asia",
+    "Croatia": "Europe",
+    "Czech Republic": "Europe",
+    "France": "Europe",
+    "Germany": "Europe",
+    "Hong Kong": "Asia",
+    "Hungary": "Europe",
+    "India": "Asia",
+    "Iran": "Asia",
+    "Italy": "Europe",
+    "Japan": "Asia",
+    "Mexico": "North America",
+    "Netherlands": "Europe",
+    "Poland": "Europe",
+    "Romania": "Europe",
+    "Russia": "Europe",
+    "Spain": "Europe",
+    "Sweden": "Europe",
+    "Switzerland": "Europe",
+    "UK": "Europe",
+    "US": "North America",
+    "Ukraine": "Europe",
+}
 
 
 def load_yaml(file_path):
@@ -19,9 +71,19 @@ def extract_hostname(hostname_field):
     return hostname_field
 
 
-def generate_markdown(data):
-    markdown = "|Hostname|AS|Stratum|Location|Owner|Notes|\n" # Start directly with table header
-    markdown += "|---|---|:---:|---|---|---|\n"
+def markdown_row(server):
+    hostname = server["hostname"]
+    asn = server.get("AS", "Unknown")
+    stratum = server["stratum"]
+    location = server["location"]
+    owner = server["owner"]
+    notes = server.get("notes", "")
+    return f"|{hostname}|{asn}|{stratum}|{location}|{owner}|{notes}|\n"
+
+
+def iter_markdown(data):
+    yield "|Hostname|AS|Stratum|Location|Owner|Notes|\n" # Start directly with table header
+    yield "|---|---|:---:|---|---|---|\n"
     current_location = None
     vm_servers = []
 
@@ -31,34 +93,82 @@ def generate_markdown(data):
             continue
         if server["location"] != current_location:
             if current_location is not None:
-                markdown += "||\n"
+                yield "||\n"
             current_location = server["location"]
 
-        hostname = server["hostname"]
-        asn = server.get("AS", "Unknown")
-        stratum = server["stratum"]
-        location = server["location"]
-        owner = server["owner"]
-        notes = server.get("notes", "")
-        markdown += f"|{hostname}|{asn}|{stratum}|{location}|{owner}|{notes}|\n"
+        yield markdown_row(server)
 
     if vm_servers:
-        markdown += "\n\nThe following servers are known to be virtualized and may be less accurate. YMMV.\n\n"
-        markdown += "|Hostname|AS|Stratum|Location|Owner|Notes|\n"
-        markdown += "|---|---|:---:|---|---|---|\n"
+        yield "\n\nThe following servers are known to be virtualized and may be less accurate. YMMV.\n\n"
+        yield "|Hostname|AS|Stratum|Location|Owner|Notes|\n"
+        yield "|---|---|:---:|---|---|---|\n"
         for server in vm_servers:
-            hostname = server["hostname"]
-            asn = server.get("AS", "Unknown")
-            stratum = server["stratum"]
-            location = server["location"]
-            owner = server["owner"]
-            notes = server.get("notes", "")
-            markdown += f"|{hostname}|{asn}|{stratum}|{location}|{owner}|{notes}|\n"
-    return markdown
+            yield markdown_row(server)
+
+
+def generate_markdown(data):
+    return "".join(iter_markdown(data))
 
 
-def generate_chrony_conf(data):
+def resolve_address(hostname):
+    try:
+        infos = socket.getaddrinfo(hostname, 123, type=socket.SOCK_DGRAM)
+    except (socket.gaierror, UnicodeError):
+        return []
+    # getaddrinfo may repeat an address per protocol; keep first-seen order
+    return list(dict.fromkeys(info[4][0] for info in infos))
+
+
+def resolve_servers(data, ttl=3600, mode="comment", max_workers=32):
+    hostnames = list(dict.fromkeys(extract_hostname(server["hostname"]) for server in data["servers"]))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        addresses = dict(zip(hostnames, executor.map(resolve_address, hostnames)))
+    return {
+        "resolved_at": datetime.now(timezone.utc).replace(microsecond=0),
+        "ttl": ttl,
+        "mode": mode,
+        "addresses": addresses,
+    }
+
+
+def resolution_header(resolution):
+    if resolution is None:
+        return ""
+    resolved_at = resolution["resolved_at"]
+    expires = resolved_at + timedelta(seconds=resolution["ttl"])
+    return (f"# Addresses resolved at {resolved_at.isoformat()}, "
+            f"valid for {resolution['ttl']}s (until {expires.isoformat()})\n\n")
+
+
+def chrony_entry(hostname, resolution=None, nts=False):
+    entry = f"server {hostname} iburst{' nts' if nts else ''}\n"
+    if resolution is None:
+        return entry
+    addresses = resolution["addresses"].get(hostname, [])
+    if not addresses:
+        return entry + f"# {hostname} did not resolve\n"
+    if resolution["mode"] == "fallback":
+        # NTS certificates name the hostname, so address fallbacks are plain NTP
+        return entry + f"# {hostname} fallback addresses\n" + "".join(f"server {address} iburst\n" for address in addresses)
+    return entry + f"# {hostname} -> {' '.join(addresses)}\n"
+
+
+def toml_entry(hostname, resolution=None, nts=False):
+    entry = f'[[source]]\nmode = "{"nts" if nts else "server"}"\naddress = "{hostname}"\n\n'
+    if resolution is None:
+        return entry
+    addresses = resolution["addresses"].get(hostname, [])
+    if not addresses:
+        return entry + f"# {hostname} did not resolve\n\n"
+    if resolution["mode"] == "fallback":
+        return entry + "".join(f'# {hostname}\n[[source]]\nmode = "server"\naddress = "{address}"\n\n'
+                               for address in addresses)
+    return entry + f"# {hostname} -> {' '.join(addresses)}\n\n"
+
+
+def generate_chrony_conf(data, resolution=None):
     chrony_conf = "#\n# NTP servers in chrony format\n#\n\n"
+    chrony_conf += resolution_header(resolution)
     current_location = None
     vm_servers = []
 
@@ -73,18 +183,19 @@ def generate_chrony_conf(data):
             current_location = server["location"]
 
         hostname = extract_hostname(server["hostname"])
-        chrony_conf += f"server {hostname} iburst\n"
+        chrony_conf += chrony_entry(hostname, resolution, server.get("nts", False))
 
     if vm_servers:
         chrony_conf += "\n# Known VM servers (may be less accurate)\n"
         for server in vm_servers:
             hostname = extract_hostname(server["hostname"])
-            chrony_conf += f"server {hostname} iburst\n"
+            chrony_conf += chrony_entry(hostname, resolution, server.get("nts", False))
     return chrony_conf
 
 
-def generate_ntp_toml(data):
+def generate_ntp_toml(data, resolution=None):
     ntp_toml = "#\n# NTP servers in ntpd-rs format\n#\n\n"
+    ntp_toml += resolution_header(resolution)
     current_location = None
     vm_servers = []
 
@@ -100,56 +211,136 @@ def generate_ntp_toml(data):
             current_location = server["location"]
 
         hostname = extract_hostname(server["hostname"])
-        ntp_toml += f'[[source]]\nmode = "server"\naddress = "{hostname}"\n\n'
+        ntp_toml += toml_entry(hostname, resolution, server.get("nts", False))
 
     if vm_servers:
         ntp_toml += "\n# Known VM servers (may be less accurate)\n"
         for server in vm_servers:
             hostname = extract_hostname(server["hostname"])
-            ntp_toml += f'[[source]]\nmode = "server"\naddress = "{hostname}"\n\n'
+            ntp_toml += toml_entry(hostname, resolution, server.get("nts", False))
     return ntp_toml
 
 
-def update_readme(readme_path, new_content):
-    try:
-        with open(readme_path, "r") as file:
-            content = file.read()
-    except FileNotFoundError:
-        print(f"Warning: {readme_path} not found. Creating a new file with the content.")
-        # Ensure new_content itself forms a valid complete document if README is missing
-        full_new_content = f"## The List\n{new_content}" if not new_content.startswith("## The List") else new_content
-        with open(readme_path, "w") as file:
-            file.write(full_new_content)
-        return
+def continent_for(location):
+    return LOCATION_CONTINENTS.get(location, "Global")
+
 
+def slugify(name):
+    return re.sub(r"[^a-z0-9]+", "-", str(name).lower()).strip("-")
+
+
+def select_servers(data, locations=None, max_per_group=None):
+    wanted = {location.lower() for location in locations} if locations else None
+    counts = defaultdict(int)
+    selected = []
+    # Fill each group with non-VM servers first so a cap keeps the better time sources
+    for server in sorted(data["servers"], key=lambda server: bool(server.get("vm", False))):
+        location = server["location"]
+        if wanted is not None and location.lower() not in wanted:
+            continue
+        if max_per_group is not None and counts[location] >= max_per_group:
+            continue
+        counts[location] += 1
+        selected.append(server)
+    # Restore the original list order for output
+    order = {id(server): i for i, server in enumerate(data["servers"])}
+    selected.sort(key=lambda server: order[id(server)])
+    return {"servers": selected}
+
+
+def shard_servers(data):
+    shards = {"location": defaultdict(list), "continent": defaultdict(list)}
+    for server in data["servers"]:
+        shards["location"][server["location"]].append(server)
+        shards["continent"][continent_for(server["location"])].append(server)
+    return shards
+
+
+def shard_slugs(groups):
+    # Distinct group names must not share a file name, or one shard would overwrite another
+    slugs = {}
+    for name in groups:
+        slug = slugify(name)
+        if not slug:
+            raise ValueError(f"Shard name '{name}' has no usable file name")
+        if slug in slugs:
+            raise ValueError(f"Shard names '{slugs[slug]}' and '{name}' both map to '{slug}'")
+        slugs[slug] = name
+    return {name: slug for slug, name in slugs.items()}
+
+
+def write_shards(data, shard_dir, resolution=None):
+    shards = shard_servers(data)
+    slugs = {kind: shard_slugs(groups) for kind, groups in shards.items()}
+    written = 0
+    for kind, groups in shards.items():
+        kind_dir = os.path.join(shard_dir, kind)
+        os.makedirs(kind_dir, exist_ok=True)
+        for name, servers in groups.items():
+            base = os.path.join(kind_dir, slugs[kind][name])
+            with open(f"{base}.conf", "w") as file:
+                file.write(generate_chrony_conf({"servers": servers}, resolution))
+            with open(f"{base}.toml", "w") as file:
+                file.write(generate_ntp_toml({"servers": servers}, resolution))
+            written += 1
+    return written
+
+
+def update_readme(readme_path, new_content):
+    # new_content may be a string or an iterable of chunks (e.g. iter_markdown); it is
+    # streamed into a temp file between the copied prefix and suffix, then renamed over the README
+    chunks = [new_content] if isinstance(new_content, str) else new_content
     start_marker = "## The List"
     end_marker = "## Star History"
 
-    start_index = content.find(start_marker)
-
-    if start_index == -1:
-        print(f"Warning: Start marker '{start_marker}' not found in {readme_path}. Appending content to the end.")
-        updated_content = content + "\n" + start_marker + "\n" + new_content # Ensure newlines
+    if not os.path.exists(readme_path):
+        print(f"Warning: {readme_path} not found. Creating a new file with the content.")
+        chunks = iter(chunks)
+        first = next(chunks, "")
         with open(readme_path, "w") as file:
-            file.write(updated_content)
+            # Ensure new_content itself forms a valid complete document if README is missing
+            if not first.startswith(start_marker):
+                file.write(f"{start_marker}\n")
+            file.write(first)
+            file.writelines(chunks)
         return
 
-    # Content before the start marker (inclusive of the marker itself)
-    before_start_marker = content[:start_index + len(start_marker)]
-    
-    # Find end marker after the start marker
-    end_index = content.find(end_marker, start_index + len(start_marker))
-
-    if end_index != -1:
-        # Content after the new_content (from end_marker onwards)
-        after_new_content = content[end_index:]
-        updated_content = before_start_marker + "\n" + new_content + "\n" + after_new_content
-    else:
-        print(f"Warning: End marker '{end_marker}' not found after start marker in {readme_path}. Replacing content after start marker.")
-        updated_content = before_start_marker + "\n" + new_content # Appends new_content, ensures a newline before it
-
-    with open(readme_path, "w") as file:
-        file.write(updated_content)
+    readme_dir = os.path.dirname(os.path.abspath(readme_path))
+    temp = tempfile.NamedTemporaryFile("w", dir=readme_dir, prefix=".README.", suffix=".tmp", delete=False)
+    try:
+        with open(readme_path, "r") as src, temp:
+            # Copy up to and including the start marker
+            found_start = False
+            for line in src:
+                index = line.find(start_marker)
+                if index != -1:
+                    temp.write(line[:index + len(start_marker)])
+                    found_start = True
+                    break
+                temp.write(line)
+            if not found_start:
+                print(f"Warning: Start marker '{start_marker}' not found in {readme_path}. Appending content to the end.")
+                temp.write(f"\n{start_marker}")
+
+            temp.write("\n")
+            temp.writelines(chunks)
+
+            # Skip the old table, then copy from the end marker onwards
+            for line in src:
+                index = line.find(end_marker)
+                if index != -1:
+                    temp.write("\n")
+                    temp.write(line[index:])
+                    shutil.copyfileobj(src, temp)
+                    break
+            else:
+                if found_start:
+                    print(f"Warning: End marker '{end_marker}' not found after start marker in {readme_path}. Replacing content after start marker.")
+        shutil.copymode(readme_path, temp.name)
+        os.replace(temp.name, readme_path)
+    except BaseException:
+        os.unlink(temp.name)
+        raise
 
 
 def main():
@@ -158,7 +349,29 @@ def main():
     )
     parser.add_argument("input_file", default="ntp-sources.yml", nargs="?",
                         help="Path to the input YAML file (default: ntp-sources.yml)")
+    parser.add_argument("--binary", metavar="PATH",
+                        help="Also write a compact binary export for embedded consumers (e.g. ntp-sources.bin)")
+    parser.add_argument("--shard-dir", metavar="DIR",
+                        help="Also write per-location and per-continent chrony/ntpd-rs shards under DIR")
+    parser.add_argument("--location", action="append",
+                        help="Only include this location group in shards (repeatable, case-insensitive)")
+    parser.add_argument("--max-per-group", type=int, metavar="N",
+                        help="Keep at most N servers per location group in shards, preferring non-VM servers")
+    parser.add_argument("--resolve", choices=["comment", "fallback"],
+                        help="Embed freshly resolved addresses in chrony/ntpd-rs output, as comments or as fallback server lines")
+    parser.add_argument("--resolve-ttl", type=int, default=3600, metavar="SECONDS",
+                        help="Validity window recorded with resolved addresses (default: 3600)")
+    parser.add_argument("--summary", action="store_true",
+                        help="Append per-owner, per-AS and per-location rollups below the list in README.md")
+    parser.add_argument("--summary-top", type=int, metavar="N",
+                        help="Show at most N rows per rollup table")
+    parser.add_argument("--probe-store", metavar="DIR",
+                        help="Include reachability and median RTT from this probe store in the rollups")
     args = parser.parse_args()
+    if not args.shard_dir and (args.location or args.max_per_group is not None):
+        parser.error("--location and --max-per-group only apply to --shard-dir")
+    if not args.summary and (args.summary_top is not None or args.probe_store):
+        parser.error("--summary-top and --probe-store only apply to --summary")
     
     try:
         data = load_yaml(args.input_file)
@@ -169,23 +382,60 @@ def main():
         print(f"Error parsing YAML file '{args.input_file}': {e}")
         return
 
+    errors = shape_problems(data, GENERATOR_FIELDS, OPTIONAL_GENERATOR_FIELDS)
+    if errors:
+        for problem in errors:
+            print(problem.format(args.input_file))
+        print(f"Error: {len(errors)} validation error(s), nothing written (run ntpValidate.py for line numbers)")
+        return
+
     readme_path = "README.md" 
     chrony_path = "chrony.conf"
     toml_path = "ntp.toml"
 
-    markdown_content = generate_markdown(data)
-    update_readme(readme_path, markdown_content)
+    readme_content = iter_markdown(data)
+    if args.summary:
+        probes = None
+        if args.probe_store:
+            probes = probe_summary(ProbeStore(args.probe_store), (datetime.now(timezone.utc) - timedelta(days=30)).timestamp())
+        report = build_report(data["servers"], probes)
+        readme_content = chain(readme_content, iter_summary_markdown(report, args.summary_top))
+
+    update_readme(readme_path, readme_content)
     print(f"Processed {readme_path}")
 
-    chrony_content = generate_chrony_conf(data)
+    resolution = None
+    if args.resolve:
+        resolution = resolve_servers(data, args.resolve_ttl, args.resolve)
+        failed = sum(1 for addresses in resolution["addresses"].values() if not addresses)
+        print(f"Resolved {len(resolution['addresses']) - failed} of {len(resolution['addresses'])} hostnames")
+
+    chrony_content = generate_chrony_conf(data, resolution)
     with open(chrony_path, "w") as file:
         file.write(chrony_content)
     print(f"Written {chrony_path}")
 
-    toml_content = generate_ntp_toml(data)
+    toml_content = generate_ntp_toml(data, resolution)
     with open(toml_path, "w") as file:
         file.write(toml_content)
     print(f"Written {toml_path}")
 
+    if args.binary:
+        try:
+            write_binary(data, args.binary)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+        print(f"Written {args.binary}")
+
+    if args.shard_dir:
+        shard_data = select_servers(data, args.location, args.max_per_group)
+        try:
+            count = write_shards(shard_data, args.shard_dir, resolution)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+        print(f"Written {count} shards for {len(shard_data['servers'])} servers to {args.shard_dir}")
+
 if __name__ == "__main__":
     main()
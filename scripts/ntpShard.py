@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+ntpShard.py - Sharded NTP probing across worker processes or nodes
+
+Hostnames are assigned to shards by a stable hash, so every worker derives
+the same split from the same ntp-sources.yml with no coordination. Each
+worker probes its shard from its own vantage point and writes NDJSON; the
+merge step combines any number of result files into one report with
+per-vantage RTT for every server.
+
+Usage:
+  python3 ntpShard.py work ntp-sources.yml --shard 0 --shards 4 --vantage fra1 -o fra1-0.ndjson
+  python3 ntpShard.py merge fra1-*.ndjson sfo1-*.ndjson -o report.json
+  python3 ntpShard.py local ntp-sources.yml --workers 4 -o report.json
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from statistics import median
+
+from ntpProbe import ProbeScheduler, NTP_PORT
+from ntpServerConvertor import load_yaml, extract_hostname
+
+
+def shard_of(hostname, shards):
+    """Stable shard index for a hostname (independent of PYTHONHASHSEED and list order)"""
+    digest = hashlib.sha256(hostname.lower().encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shards
+
+
+def shard_hostnames(data, shard, shards):
+    hostnames = dict.fromkeys(extract_hostname(server["hostname"]) for server in data["servers"])
+    return [hostname for hostname in hostnames if shard_of(hostname, shards) == shard]
+
+
+async def probe_shard(hostnames, vantage, shard, deadline, port, out):
+    scheduler = ProbeScheduler()
+    budget = asyncio.Semaphore(64)
+
+    async def one(hostname):
+        outcome = await scheduler.probe(hostname, budget=budget, deadline=deadline, attempts=3, stagger=deadline / 4,
+                                        port=port)
+        response = outcome.response
+        record = {
+            "hostname": hostname,
+            "vantage": vantage,
+            "shard": shard,
+            "timestamp": round(time.time(), 3),
+            "address": response.address if response else None,
+            "stratum": response.stratum if response else None,
+            "rtt": response.rtt if response else None,
+            "offset": response.offset if response else None,
+            "kiss": outcome.kiss,
+        }
+        # Written as each probe completes, so a partial file is still usable
+        out.write(json.dumps(record) + "\n")
+        out.flush()
+
+    await asyncio.gather(*(one(hostname) for hostname in hostnames))
+
+
+def read_ndjson(paths):
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def merge_results(records):
+    """
+    Combine worker records into one report keyed by hostname
+    The latest record per (hostname, vantage) wins
+    """
+    latest = {}
+    for record in records:
+        key = (record["hostname"], record["vantage"])
+        if key not in latest or record["timestamp"] >= latest[key]["timestamp"]:
+            latest[key] = record
+
+    by_host = defaultdict(dict)
+    for (hostname, vantage), record in latest.items():
+        by_host[hostname][vantage] = {
+            "stratum": record["stratum"],
+            "rtt": record["rtt"],
+            "offset": record["offset"],
+            "address": record["address"],
+            "kiss": record["kiss"],
+        }
+
+    servers = {}
+    for hostname in sorted(by_host):
+        vantages = by_host[hostname]
+        rtts = [result["rtt"] for result in vantages.values() if result["rtt"] is not None]
+        strata = {result["stratum"] for result in vantages.values() if result["stratum"] is not None}
+        servers[hostname] = {
+            "reachable_from": sum(1 for result in vantages.values() if result["stratum"] is not None),
+            "vantages_probed": len(vantages),
+            "best_rtt": min(rtts) if rtts else None,
+            "median_rtt": median(rtts) if rtts else None,
+            "strata": sorted(strata),
+            "vantages": dict(sorted(vantages.items())),
+        }
+    return {
+        "vantages": sorted({vantage for _, vantage in latest}),
+        "servers": servers,
+    }
+
+
+def write_report(report, path):
+    if path in (None, "-"):
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+
+def run_work(args):
+    data = load_yaml(args.input_file)
+    hostnames = shard_hostnames(data, args.shard, args.shards)
+    print(f"Shard {args.shard}/{args.shards} ({args.vantage}): probing {len(hostnames)} servers", file=sys.stderr)
+    if args.output in (None, "-"):
+        asyncio.run(probe_shard(hostnames, args.vantage, args.shard, args.deadline, args.port, sys.stdout))
+    else:
+        with open(args.output, "w", encoding="utf-8") as out:
+            asyncio.run(probe_shard(hostnames, args.vantage, args.shard, args.deadline, args.port, out))
+
+
+def run_local(args):
+    # One OS process per shard, exactly as separate nodes would run them
+    with tempfile.TemporaryDirectory() as workdir:
+        outputs = [os.path.join(workdir, f"{args.vantage}-{shard}.ndjson") for shard in range(args.workers)]
+        workers = [
+            subprocess.Popen([sys.executable, os.path.abspath(__file__), "work", args.input_file,
+                              "--shard", str(shard), "--shards", str(args.workers), "--vantage", args.vantage,
+                              "--deadline", str(args.deadline), "--port", str(args.port), "-o", output])
+            for shard, output in enumerate(outputs)
+        ]
+        failed = [shard for shard, worker in enumerate(workers) if worker.wait() != 0]
+        if failed:
+            print(f"Error: shard worker(s) {failed} failed", file=sys.stderr)
+            sys.exit(1)
+        write_report(merge_results(read_ndjson(outputs)), args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded NTP probing with NDJSON output and a merge step")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_probe_options(sub):
+        sub.add_argument("input_file", help="Path to the input YAML file")
+        sub.add_argument("--vantage", default=os.uname().nodename, help="Name of this vantage point (default: hostname)")
+        sub.add_argument("--deadline", type=float, default=2.0, help="Per-server probe deadline in seconds (default: 2.0)")
+        sub.add_argument("--port", type=int, default=NTP_PORT, help=argparse.SUPPRESS)
+        sub.add_argument("-o", "--output", help="Output file (default: stdout)")
+
+    work = subparsers.add_parser("work", help="Probe one shard and write NDJSON")
+    add_probe_options(work)
+    work.add_argument("--shard", type=int, required=True, help="Shard index (0-based)")
+    work.add_argument("--shards", type=int, required=True, help="Total number of shards")
+
+    merge = subparsers.add_parser("merge", help="Merge NDJSON results into a JSON report")
+    merge.add_argument("inputs", nargs="+", help="NDJSON files from workers")
+    merge.add_argument("-o", "--output", help="Report file (default: stdout)")
+
+    local = subparsers.add_parser("local", help="Run all shards as local processes and merge")
+    add_probe_options(local)
+    local.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Number of shard processes")
+
+    args = parser.parse_args()
+    if args.command == "work":
+        if not 0 <= args.shard < args.shards:
+            parser.error("--shard must be between 0 and --shards - 1")
+        run_work(args)
+    elif args.command == "merge":
+        write_report(merge_results(read_ndjson(args.inputs)), args.output)
+    else:
+        run_local(args)
+
+
+if __name__ == "__main__":
+    main()
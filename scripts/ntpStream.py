@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Streaming helpers for very large server lists.
+
+iter_servers() parses a ntp-sources style YAML file one server entry at a
+time instead of building the whole document, and run_bounded() feeds such an
+iterator through a bounded work queue to a fixed pool of async workers,
+handing each result to a callback as soon as it completes. Together they keep
+peak memory flat no matter how many entries the list holds.
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable, Iterable, Iterator
+from typing import Any, Optional
+
+import yaml
+
+_DONE = object()
+
+
+def iter_servers(file_path: str) -> Iterator[dict]:
+    """
+    Yield the entries of the top-level 'servers' list one at a time.
+
+    Uses the pure Python loader because libyaml exposes no per-node composition.
+    Anchors are forgotten after every entry, so entries cannot alias each other.
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        loader = yaml.SafeLoader(f)
+        try:
+            loader.get_event()  # StreamStart
+            if not loader.check_event(yaml.DocumentStartEvent):
+                return
+            loader.get_event()
+            if not loader.check_event(yaml.MappingStartEvent):
+                raise ValueError(f"{file_path}: expected a mapping with a 'servers' key")
+            loader.get_event()
+
+            while not loader.check_event(yaml.MappingEndEvent):
+                key = loader.compose_node(None, None)
+                if (isinstance(key, yaml.ScalarNode) and key.value == "servers"
+                        and loader.check_event(yaml.SequenceStartEvent)):
+                    loader.get_event()
+                    while not loader.check_event(yaml.SequenceEndEvent):
+                        yield loader.construct_document(loader.compose_node(None, None))
+                        loader.anchors = {}
+                    loader.get_event()
+                else:
+                    # Other top-level keys are parsed and dropped
+                    loader.compose_node(None, None)
+                    loader.anchors = {}
+        finally:
+            loader.dispose()
+
+
+async def run_bounded(
+    items: Iterable[Any],
+    worker: Callable[[Any], Awaitable[Any]],
+    concurrency: int,
+    on_result: Callable[[Any, Any], None],
+    on_error: Optional[Callable[[Any, BaseException], None]] = None
+) -> int:
+    """
+    Run worker over items with at most concurrency calls in flight.
+
+    Items are pulled lazily into a queue of twice the concurrency, so the
+    iterator may be arbitrarily long. on_result(item, result) is called in
+    completion order. Without on_error the first exception cancels the run;
+    it is re-raised as is, as is any exception from the items iterator.
+
+    Returns:
+        Number of items processed
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    processed = 0
+
+    async def produce() -> None:
+        for item in items:
+            await queue.put(item)
+        for _ in range(concurrency):
+            await queue.put(_DONE)
+
+    async def consume() -> None:
+        nonlocal processed
+        while (item := await queue.get()) is not _DONE:
+            try:
+                result = await worker(item)
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(item, e)
+            else:
+                on_result(item, result)
+            processed += 1
+
+    try:
+        async with asyncio.TaskGroup() as group:
+            group.create_task(produce())
+            for _ in range(concurrency):
+                group.create_task(consume())
+    except ExceptionGroup as failures:
+        # The first failure cancels the other tasks; callers see it as raised by the iterator or worker
+        raise failures.exceptions[0] from None
+    return processed
@@ -3,20 +3,34 @@
 ntpUpdateSources.py - Update NTP sources with AS numbers and stratum information
 
 This script reads an ntp-sources.yml file and updates each server entry with:
-- Correct AS number (using asnmap tool) in format "AS12345"
+- Correct AS number (using a single batched asnmap run) in format "AS12345"
 - Correct stratum (using ntpdate tool)
 
-Usage: python3 ntpUpdateSources.py <ntp-sources.yml>
+--record FILE saves the raw tool output of a run and --replay FILE runs the
+same parsing and decisions against it offline (see probeReplay.py).
+
+Usage: python3 ntpUpdateSources.py [--record FILE | --replay FILE] <ntp-sources.yml>
 """
 
 import sys
+import asyncio
 import yaml
 import subprocess
 import json
 import re
 import logging
 import argparse
+import shutil
+import time
+import tempfile
 from pathlib import Path
+from typing import Any, NamedTuple
+
+from asnReport import format_as_numbers, parse_as_field
+from processRunner import ProcessRunner
+from probeHistory import FailureHistory
+from probeReplay import ProbeArchive, RecordingRunner, ReplayRunner
+from probeStore import ProbeStore, Sample
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -24,15 +38,8 @@ logger = logging.getLogger(__name__)
 
 def check_required_tools():
     """Check if required external tools are available"""
-    tools = ['asnmap', 'ntpdate', 'jq']
-    missing_tools = []
-    
-    for tool in tools:
-        try:
-            subprocess.run([tool, '--help' if tool != 'jq' else '--version'], 
-                         capture_output=True, check=True, timeout=5)
-        except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
-            missing_tools.append(tool)
+    tools = ['asnmap', 'ntpdate']
+    missing_tools = [tool for tool in tools if shutil.which(tool) is None]
     
     if missing_tools:
         logger.error(f"Missing required tools: {', '.join(missing_tools)}")
@@ -42,78 +49,122 @@ def check_required_tools():
                 logger.error("  asnmap: go install -v github.com/projectdiscovery/asnmap/cmd/asnmap@latest")
             elif tool == 'ntpdate':
                 logger.error("  ntpdate: sudo apt-get install ntpdate (Ubuntu/Debian) or equivalent")
-            elif tool == 'jq':
-                logger.error("  jq: sudo apt-get install jq (Ubuntu/Debian) or equivalent")
         return False
     return True
 
-def get_as_numbers(hostname):
+def extract_hostname(hostname_field):
+    """Extract the plain hostname from a possible markdown link"""
+    if isinstance(hostname_field, str) and hostname_field.startswith("[") and "](" in hostname_field and hostname_field.endswith(")"):
+        match = re.search(r"\[([^\]]+)\]\(.*\)", hostname_field)
+        if match:
+            return match.group(1)
+    return hostname_field
+
+def parse_asnmap_output(output):
     """
-    Get AS numbers for a hostname using asnmap
-    Returns the AS numbers in format "AS12345, AS67890" or None if not found
+    Parse asnmap JSON lines output
+    Returns a dict mapping each input (lowercased) to its set of integer AS numbers
     """
+    results = {}
+    for line in output.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            logger.debug(f"Ignoring non-JSON asnmap output: {line}")
+            continue
+        if not isinstance(record, dict):
+            logger.debug(f"Ignoring asnmap output that is not an object: {line}")
+            continue
+        hostname = str(record.get('input', '')).lower()
+        as_number = str(record.get('as_number') or '')
+        if as_number[:2].upper() == 'AS':
+            as_number = as_number[2:]
+        if hostname and as_number.isdigit():
+            results.setdefault(hostname, set()).add(int(as_number))
+    return results
+
+def record_asnmap_output(archive, hostnames, output):
+    """Store the raw asnmap JSON lines of each hostname in a probe recording"""
+    raw = {hostname.lower(): [] for hostname in hostnames}
+    for line in output.splitlines():
+        try:
+            hostname = str(json.loads(line).get('input', '')).lower()
+        except (json.JSONDecodeError, AttributeError):
+            continue
+        if hostname in raw:
+            raw[hostname].append(line)
+    for hostname, lines in raw.items():
+        archive.record('asnmap', hostname, lines)
+
+def get_as_numbers_batch(hostnames, archive=None):
+    """
+    Get AS numbers for many hostnames with a single asnmap invocation
+    With a probe archive the asnmap output is recorded, or replayed instead of running asnmap
+    Returns a dict mapping hostname to "AS12345, AS67890" (or None if not found)
+    """
+    hostnames = list(dict.fromkeys(hostnames))
+    if not hostnames:
+        return {}
+    
+    results = {}
     try:
-        # Run: asnmap -d hostname -silent -j | jq -r '.as_number' | sort -u
-        asnmap_cmd = ['asnmap', '-d', hostname, '-silent', '-j']
-        jq_cmd = ['jq', '-r', '.as_number']
-        sort_cmd = ['sort', '-u']
-        
-        # Chain the commands
-        asnmap_proc = subprocess.Popen(asnmap_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        jq_proc = subprocess.Popen(jq_cmd, stdin=asnmap_proc.stdout, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        asnmap_proc.stdout.close()
-        sort_proc = subprocess.Popen(sort_cmd, stdin=jq_proc.stdout, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        jq_proc.stdout.close()
-        
-        output, error = sort_proc.communicate(timeout=30)
-        
-        if sort_proc.returncode == 0 and output.strip():
-            as_numbers = output.decode().strip().split('\n')
-            # Filter out null/empty values and collect all valid AS numbers
-            valid_as_numbers = []
-            for as_num in as_numbers:
-                if as_num and as_num != 'null' and as_num.isdigit():
-                    valid_as_numbers.append(f"AS{as_num}")
+        if archive is not None and archive.replaying:
+            output = '\n'.join(line for hostname in hostnames
+                               for line in archive.lookup('asnmap', hostname.lower()) or ())
+        else:
+            # Run: asnmap -d <file with one hostname per line> -silent -j
+            with tempfile.NamedTemporaryFile('w', suffix='.txt') as host_list:
+                host_list.write('\n'.join(hostnames) + '\n')
+                host_list.flush()
+                cmd = ['asnmap', '-d', host_list.name, '-silent', '-j']
+                result = subprocess.run(cmd, capture_output=True, text=True,
+                                        timeout=max(30, 2 * len(hostnames)))
             
-            if valid_as_numbers:
-                return ", ".join(valid_as_numbers)
+            if result.returncode != 0:
+                logger.error(f"asnmap exited with status {result.returncode}: {result.stderr.strip()}")
+            output = result.stdout
+            if archive is not None:
+                record_asnmap_output(archive, hostnames, output)
         
-        logger.warning(f"Could not determine AS numbers for {hostname}")
-        return None
+        as_by_input = parse_asnmap_output(output)
+        for hostname in hostnames:
+            as_numbers = as_by_input.get(hostname.lower())
+            results[hostname] = format_as_numbers(sorted(as_numbers)) if as_numbers else None
         
     except Exception as e:
-        logger.error(f"Error getting AS numbers for {hostname}: {e}")
-        return None
+        logger.error(f"Error getting AS numbers: {e}")
+        return {hostname: None for hostname in hostnames}
+    
+    return results
 
-def parse_existing_as_numbers(as_string):
+def get_as_numbers(hostname):
     """
-    Parse existing AS numbers from string format
-    Returns set of AS numbers for comparison
+    Get AS numbers for a hostname using asnmap
+    Returns the AS numbers in format "AS12345, AS67890" or None if not found
     """
-    if not as_string or as_string == "Unknown":
-        return set()
-    
-    # Split by comma and clean up
-    as_numbers = set()
-    for as_num in as_string.split(','):
-        as_num = as_num.strip()
-        if as_num.startswith('AS') and as_num[2:].isdigit():
-            as_numbers.add(as_num)
-    
+    as_numbers = get_as_numbers_batch([hostname]).get(hostname)
+    if as_numbers is None:
+        logger.warning(f"Could not determine AS numbers for {hostname}")
     return as_numbers
 
+def parse_existing_as_numbers(as_string):
+    """
+    Parse existing AS numbers from string format (malformed tokens are dropped)
+    Returns set of "AS12345" strings for comparison
+    """
+    asns, _ = parse_as_field(as_string)
+    return {f"AS{asn}" for asn in asns}
+
 def normalize_as_numbers(as_string):
     """
     Normalize AS numbers string to consistent format
-    Returns sorted, comma-separated AS numbers
+    Returns sorted, comma-separated AS numbers or None if there are none
     """
-    as_numbers = parse_existing_as_numbers(as_string)
-    if not as_numbers:
-        return None
-    
-    # Sort AS numbers by their numeric value
-    sorted_as = sorted(as_numbers, key=lambda x: int(x[2:]))
-    return ", ".join(sorted_as)
+    asns, _ = parse_as_field(as_string)
+    return format_as_numbers(asns) or None
 
 def is_unknown_value(value):
     """
@@ -125,43 +176,90 @@ def is_unknown_value(value):
         return True
     return False
 
-def get_stratum(hostname):
+# Leap indicator words printed by ntpdate -q, in leap indicator order
+NTPDATE_LEAP = ('no-leap', 'add-leap', 'del-leap', 'unsync')
+
+def parse_ntpdate_reading(line, hostname):
     """
-    Get stratum for a hostname using ntpdate
+    Parse everything one line of ntpdate -q output carries
+    Example line: "2025-05-23 02:57:29.980318 (+0000) +0.000214 +/- 0.003723 time.cloudflare.com 162.159.200.1 s3 no-leap"
+    Returns a dict with stratum, leap, offset and address (None when absent) or None if the line has no stratum
+    """
+    line = line.strip()
+    if not line or hostname not in line:
+        return None
+    # Look for pattern like "s3" or "s1" etc.
+    stratum_match = re.search(r'\bs(\d+)\b', line)
+    if not stratum_match:
+        return None
+    words = line.split()
+    offset_match = re.search(r'\s([+-]\d+\.\d+) \+/- ', line)
+    host_index = words.index(hostname) if hostname in words else -1
+    leap = next((NTPDATE_LEAP.index(word) for word in words if word in NTPDATE_LEAP), None)
+    return {
+        'stratum': int(stratum_match.group(1)),
+        'leap': leap,
+        'offset': float(offset_match.group(1)) if offset_match else None,
+        'address': words[host_index + 1] if 0 <= host_index < len(words) - 1 else None,
+    }
+
+def parse_ntpdate_stratum(line, hostname):
+    """Parse the stratum from one line of ntpdate -q output"""
+    reading = parse_ntpdate_reading(line, hostname)
+    return reading['stratum'] if reading else None
+
+def parse_ntpq_stratum(line, hostname):
+    """Parse the stratum from one line of ntpq -p output"""
+    if hostname in line or '*' in line or '+' in line:
+        parts = line.split()
+        if len(parts) >= 3 and parts[2].isdigit():
+            return int(parts[2])
+    return None
+
+async def get_stratum_async(runner, hostname, fast=False, readings=None):
+    """
+    Get stratum for a hostname using ntpdate, falling back to ntpq
+    Output is parsed as it arrives and the tool is stopped on the first stratum seen
+    A fast probe uses a short ntpdate timeout and no fallback
+    When readings is a dict, the full ntpdate reading (leap, offset, address) is stored under hostname
     Returns the stratum as integer or None if not found
     """
+    found = []
+    
+    def watch(parser):
+        def on_line(line):
+            stratum = parser(line, hostname)
+            if stratum is not None:
+                found.append(stratum)
+                return True
+            return False
+        return on_line
+    
+    def parse_ntpdate(line, hostname):
+        reading = parse_ntpdate_reading(line, hostname)
+        if reading is None:
+            return None
+        if readings is not None:
+            readings[hostname] = reading
+        return reading['stratum']
+    
     try:
         # Run: ntpdate -q hostname
-        cmd = ['ntpdate', '-q', hostname]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        await runner.run(['ntpdate', '-q', hostname], timeout=5 if fast else 30, on_line=watch(parse_ntpdate))
+        if found:
+            return found[0]
         
-        if result.returncode == 0:
-            # Parse output to find stratum
-            # Example output: "2025-05-23 02:57:29.980318 (+0000) +0.000214 +/- 0.003723 time.cloudflare.com 162.159.200.1 s3 no-leap"
-            for line in result.stdout.split('\n'):
-                line = line.strip()
-                if line and hostname in line:
-                    # Look for pattern like "s3" or "s1" etc.
-                    stratum_match = re.search(r'\bs(\d+)\b', line)
-                    if stratum_match:
-                        return int(stratum_match.group(1))
+        if fast:
+            logger.warning(f"Fast probe failed for {hostname}")
+            return None
         
         # If ntpdate fails, try alternative approach with timeout
         logger.warning(f"ntpdate failed for {hostname}, trying alternative method")
         
         # Alternative: use ntpq if available
-        try:
-            cmd_alt = ['timeout', '10', 'ntpq', '-p', hostname]
-            result_alt = subprocess.run(cmd_alt, capture_output=True, text=True)
-            if result_alt.returncode == 0:
-                # Parse ntpq output for stratum
-                for line in result_alt.stdout.split('\n'):
-                    if hostname in line or '*' in line or '+' in line:
-                        parts = line.split()
-                        if len(parts) >= 3 and parts[2].isdigit():
-                            return int(parts[2])
-        except:
-            pass
+        await runner.run(['ntpq', '-p', hostname], timeout=10, on_line=watch(parse_ntpq_stratum))
+        if found:
+            return found[0]
         
         logger.warning(f"Could not determine stratum for {hostname}")
         return None
@@ -170,6 +268,29 @@ def get_stratum(hostname):
         logger.error(f"Error getting stratum for {hostname}: {e}")
         return None
 
+async def get_strata(hostnames, max_processes=16, fast_hostnames=(), readings=None, archive=None):
+    """
+    Get strata for many hostnames concurrently under a global process budget
+    Hostnames in fast_hostnames get a single fast probe; readings collects full ntpdate readings
+    With a probe archive the tool output is recorded, or replayed instead of running the tools
+    Returns a dict mapping hostname to stratum (or None)
+    """
+    runner = ProcessRunner(max_processes)
+    if archive is not None:
+        runner = ReplayRunner(archive) if archive.replaying else RecordingRunner(runner, archive)
+    hostnames = list(dict.fromkeys(hostnames))
+    fast_hostnames = set(fast_hostnames)
+    strata = await asyncio.gather(*(get_stratum_async(runner, hostname, hostname in fast_hostnames, readings)
+                                    for hostname in hostnames))
+    return dict(zip(hostnames, strata))
+
+def get_stratum(hostname):
+    """
+    Get stratum for a hostname using ntpdate
+    Returns the stratum as integer or None if not found
+    """
+    return asyncio.run(get_strata([hostname]))[hostname]
+
 def write_yaml_with_formatting(data, filepath):
     """Write YAML with proper formatting including newlines between entries."""
     def str_presenter(dumper, data):
@@ -203,9 +324,169 @@ def write_yaml_with_formatting(data, filepath):
         f.write('\n'.join(formatted_lines))
 
 
-def update_ntp_sources(yaml_file, dry_run=False):
+class Change(NamedTuple):
+    """A single change to a server entry"""
+    action: str      # REPLACE, ADD, UPDATE or NORMALIZE
+    field: str       # 'AS' or 'stratum'
+    hostname: str
+    location: str
+    old: Any
+    new: Any
+    
+    def __str__(self):
+        if self.action == 'REPLACE':
+            return f"REPLACE Unknown {self.field} for {self.hostname}: {self.new}"
+        if self.action == 'ADD':
+            return f"ADD {self.field} for {self.hostname}: {self.new}"
+        return f"{self.action} {self.field} for {self.hostname}: {self.old} -> {self.new}"
+
+def summarize_changes(changes):
+    """
+    Count changes by action and by location
+    Returns (by_action, by_location) dicts in first-seen order
+    """
+    by_action = {}
+    by_location = {}
+    for change in changes:
+        by_action[change.action] = by_action.get(change.action, 0) + 1
+        by_location[change.location] = by_location.get(change.location, 0) + 1
+    return by_action, by_location
+
+def write_change_report_json(changes, filepath, dry_run=False):
+    """Write changes as a JSON report with per-type and per-location counts"""
+    by_action, by_location = summarize_changes(changes)
+    report = {
+        'dry_run': dry_run,
+        'total': len(changes),
+        'by_action': by_action,
+        'by_location': by_location,
+        'changes': [change._asdict() for change in changes],
+    }
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+        f.write('\n')
+
+def format_change_report_markdown(changes, dry_run=False):
+    """Format changes as a Markdown summary suitable for a pull request body"""
+    if not changes:
+        return "No changes to NTP sources.\n"
+    
+    by_action, by_location = summarize_changes(changes)
+    verb = "would be made" if dry_run else "made"
+    lines = [f"{len(changes)} changes {verb} to `ntp-sources.yml`.", "", "|Change|Count|", "|---|:---:|"]
+    lines += [f"|{action}|{count}|" for action, count in by_action.items()]
+    
+    for location in by_location:
+        lines += ["", f"### {location} ({by_location[location]})", "",
+                  "|Hostname|Field|Change|Before|After|", "|---|---|---|---|---|"]
+        for change in changes:
+            if change.location == location:
+                old = '' if change.old is None else change.old
+                lines.append(f"|{change.hostname}|{change.field}|{change.action}|{old}|{change.new}|")
+    return '\n'.join(lines) + '\n'
+
+def apply_lookups(data, as_lookup, stratum_lookup, dry_run=False):
+    """
+    Merge looked-up AS numbers and strata into the server entries
+    Returns (updated, changes) where changes is a list of Change records
+    """
+    updated = False
+    changes_made = []
+    
+    # Process each server entry
+    for server_entry in data['servers']:
+        if 'hostname' not in server_entry:
+            logger.warning("Server entry missing 'hostname' field, skipping")
+            continue
+        
+        hostname = extract_hostname(server_entry['hostname'])
+        location = server_entry.get('location', 'Unknown')
+        logger.info(f"Processing {hostname}...")
+        
+        # Update AS numbers
+        current_as = server_entry.get('AS')
+        new_as = as_lookup.get(hostname)
+        
+        if new_as is not None:
+            # Normalize both current and new AS numbers for comparison
+            current_as_normalized = normalize_as_numbers(current_as) if not is_unknown_value(current_as) else None
+            new_as_normalized = normalize_as_numbers(new_as)
+            
+            if current_as_normalized != new_as_normalized:
+                if is_unknown_value(current_as):
+                    change_msg = f"  Replacing Unknown AS for {hostname}: {new_as_normalized}"
+                    logger.info(change_msg)
+                    changes_made.append(Change('REPLACE', 'AS', hostname, location, current_as, new_as_normalized))
+                elif current_as is None or current_as == "":
+                    change_msg = f"  Adding AS numbers for {hostname}: {new_as_normalized}"
+                    logger.info(change_msg)
+                    changes_made.append(Change('ADD', 'AS', hostname, location, current_as, new_as_normalized))
+                else:
+                    change_msg = f"  Updating AS numbers for {hostname}: {current_as} -> {new_as_normalized}"
+                    logger.info(change_msg)
+                    changes_made.append(Change('UPDATE', 'AS', hostname, location, current_as, new_as_normalized))
+                
+                if not dry_run:
+                    server_entry['AS'] = new_as_normalized
+                updated = True
+            else:
+                logger.info(f"  AS numbers for {hostname} are correct: {new_as_normalized}")
+        else:
+            logger.warning(f"  Could not update AS numbers for {hostname}")
+            # If we have existing AS numbers but can't verify, log them
+            if current_as and not is_unknown_value(current_as):
+                logger.info(f"  Keeping existing AS numbers for {hostname}: {current_as}")
+                # Still normalize the existing format
+                normalized_existing = normalize_as_numbers(current_as)
+                if normalized_existing and normalized_existing != current_as:
+                    change_msg = f"  Normalizing AS format for {hostname}: {current_as} -> {normalized_existing}"
+                    logger.info(change_msg)
+                    changes_made.append(Change('NORMALIZE', 'AS', hostname, location, current_as, normalized_existing))
+                    if not dry_run:
+                        server_entry['AS'] = normalized_existing
+                    updated = True
+            elif is_unknown_value(current_as):
+                logger.warning(f"  AS remains Unknown for {hostname} (lookup failed)")
+        
+        # Update stratum
+        current_stratum = server_entry.get('stratum')
+        new_stratum = stratum_lookup.get(hostname)
+        
+        if new_stratum is not None:
+            # Handle both numeric and string "Unknown" values
+            current_stratum_unknown = is_unknown_value(current_stratum)
+            
+            if current_stratum != new_stratum:
+                if current_stratum_unknown:
+                    change_msg = f"  Replacing Unknown stratum for {hostname}: {new_stratum}"
+                    logger.info(change_msg)
+                    changes_made.append(Change('REPLACE', 'stratum', hostname, location, current_stratum, new_stratum))
+                elif current_stratum is None:
+                    change_msg = f"  Adding stratum for {hostname}: {new_stratum}"
+                    logger.info(change_msg)
+                    changes_made.append(Change('ADD', 'stratum', hostname, location, current_stratum, new_stratum))
+                else:
+                    change_msg = f"  Updating stratum for {hostname}: {current_stratum} -> {new_stratum}"
+                    logger.info(change_msg)
+                    changes_made.append(Change('UPDATE', 'stratum', hostname, location, current_stratum, new_stratum))
+                
+                if not dry_run:
+                    server_entry['stratum'] = new_stratum
+                updated = True
+            else:
+                logger.info(f"  Stratum for {hostname} is correct: {new_stratum}")
+        else:
+            logger.warning(f"  Could not update stratum for {hostname}")
+            if is_unknown_value(current_stratum):
+                logger.warning(f"  Stratum remains Unknown for {hostname} (lookup failed)")
+    
+    return updated, changes_made
+
+def update_ntp_sources(yaml_file, dry_run=False, max_processes=16, history=None, store=None,
+                       report_json=None, report_markdown=None, archive=None):
     """
     Update NTP sources YAML file with AS numbers and stratum information
+    archive is a probeReplay.ProbeArchive to record the lookups into, or to replay them from
     """
     try:
         # Read the YAML file
@@ -216,97 +497,78 @@ def update_ntp_sources(yaml_file, dry_run=False):
             logger.error("Invalid YAML structure. Expected 'servers' key.")
             return False
         
-        updated = False
-        changes_made = []
-        
         if dry_run:
             logger.info("=== DRY RUN MODE - No changes will be made ===")
         
-        # Process each server entry
-        for server_entry in data['servers']:
-            if 'hostname' not in server_entry:
-                logger.warning("Server entry missing 'hostname' field, skipping")
-                continue
-            
-            hostname = server_entry['hostname']
-            logger.info(f"Processing {hostname}...")
-            
-            # Update AS numbers
-            current_as = server_entry.get('AS')
-            new_as = get_as_numbers(hostname)
-            
-            if new_as is not None:
-                # Normalize both current and new AS numbers for comparison
-                current_as_normalized = normalize_as_numbers(current_as) if not is_unknown_value(current_as) else None
-                new_as_normalized = normalize_as_numbers(new_as)
-                
-                if current_as_normalized != new_as_normalized:
-                    if is_unknown_value(current_as):
-                        change_msg = f"  Replacing Unknown AS for {hostname}: {new_as_normalized}"
-                        logger.info(change_msg)
-                        changes_made.append(f"REPLACE Unknown AS for {hostname}: {new_as_normalized}")
-                    elif current_as is None or current_as == "":
-                        change_msg = f"  Adding AS numbers for {hostname}: {new_as_normalized}"
-                        logger.info(change_msg)
-                        changes_made.append(f"ADD AS for {hostname}: {new_as_normalized}")
-                    else:
-                        change_msg = f"  Updating AS numbers for {hostname}: {current_as} -> {new_as_normalized}"
-                        logger.info(change_msg)
-                        changes_made.append(f"UPDATE AS for {hostname}: {current_as} -> {new_as_normalized}")
-                    
-                    if not dry_run:
-                        server_entry['AS'] = new_as_normalized
-                    updated = True
-                else:
-                    logger.info(f"  AS numbers for {hostname} are correct: {new_as_normalized}")
-            else:
-                logger.warning(f"  Could not update AS numbers for {hostname}")
-                # If we have existing AS numbers but can't verify, log them
-                if current_as and not is_unknown_value(current_as):
-                    logger.info(f"  Keeping existing AS numbers for {hostname}: {current_as}")
-                    # Still normalize the existing format
-                    normalized_existing = normalize_as_numbers(current_as)
-                    if normalized_existing and normalized_existing != current_as:
-                        change_msg = f"  Normalizing AS format for {hostname}: {current_as} -> {normalized_existing}"
-                        logger.info(change_msg)
-                        changes_made.append(f"NORMALIZE AS for {hostname}: {current_as} -> {normalized_existing}")
-                        if not dry_run:
-                            server_entry['AS'] = normalized_existing
-                        updated = True
-                elif is_unknown_value(current_as):
-                    logger.warning(f"  AS remains Unknown for {hostname} (lookup failed)")
-            
-            # Update stratum
-            current_stratum = server_entry.get('stratum')
-            new_stratum = get_stratum(hostname)
-            
-            if new_stratum is not None:
-                # Handle both numeric and string "Unknown" values
-                current_stratum_unknown = is_unknown_value(current_stratum)
-                
-                if current_stratum != new_stratum:
-                    if current_stratum_unknown:
-                        change_msg = f"  Replacing Unknown stratum for {hostname}: {new_stratum}"
-                        logger.info(change_msg)
-                        changes_made.append(f"REPLACE Unknown stratum for {hostname}: {new_stratum}")
-                    elif current_stratum is None:
-                        change_msg = f"  Adding stratum for {hostname}: {new_stratum}"
-                        logger.info(change_msg)
-                        changes_made.append(f"ADD stratum for {hostname}: {new_stratum}")
-                    else:
-                        change_msg = f"  Updating stratum for {hostname}: {current_stratum} -> {new_stratum}"
-                        logger.info(change_msg)
-                        changes_made.append(f"UPDATE stratum for {hostname}: {current_stratum} -> {new_stratum}")
-                    
-                    if not dry_run:
-                        server_entry['stratum'] = new_stratum
-                    updated = True
-                else:
-                    logger.info(f"  Stratum for {hostname} is correct: {new_stratum}")
-            else:
-                logger.warning(f"  Could not update stratum for {hostname}")
-                if is_unknown_value(current_stratum):
-                    logger.warning(f"  Stratum remains Unknown for {hostname} (lookup failed)")
+        # Look up AS numbers for every host with one asnmap run
+        hostnames = [extract_hostname(server_entry['hostname'])
+                     for server_entry in data['servers'] if 'hostname' in server_entry]
+        as_hostnames, fast_as_hostnames, skipped_as = hostnames, [], []
+        ntp_hostnames, fast_ntp_hostnames, skipped_ntp = hostnames, [], []
+        if history is not None:
+            # Skip hosts whose circuit is open; half-open hosts get one cheap probe
+            as_hostnames, fast_as_hostnames, skipped_as = history.partition(hostnames, 'asn')
+            ntp_hostnames, fast_ntp_hostnames, skipped_ntp = history.partition(hostnames, 'ntp')
+            for hostname in skipped_as:
+                logger.info(f"  Skipping AS lookup for {hostname} (circuit open)")
+            for hostname in skipped_ntp:
+                logger.info(f"  Skipping stratum probe for {hostname} (circuit open)")
+        
+        started = time.perf_counter()
+        as_hostnames = as_hostnames + fast_as_hostnames
+        logger.info(f"Looking up AS numbers for {len(as_hostnames)} hostnames...")
+        as_lookup = get_as_numbers_batch(as_hostnames, archive)
+        
+        # Probe strata for every host concurrently
+        ntp_hostnames = ntp_hostnames + fast_ntp_hostnames
+        logger.info(f"Probing stratum for {len(ntp_hostnames)} hostnames ({max_processes} at a time)...")
+        readings = {} if store is not None else None
+        stratum_lookup = asyncio.run(get_strata(ntp_hostnames, max_processes, fast_ntp_hostnames, readings, archive))
+        
+        # A dry run must not move hosts towards an open circuit
+        if history is not None and not dry_run:
+            for hostname in as_hostnames:
+                history.record(hostname, 'asn', as_lookup.get(hostname) is not None)
+            for hostname in ntp_hostnames:
+                history.record(hostname, 'ntp', stratum_lookup.get(hostname) is not None)
+            history.save()
+        
+        if store is not None:
+            # Keep every observation, not just the latest value written to the YAML.
+            # Only hosts that were NTP-probed get a sample: a stratum of None means
+            # "no answer", which a host skipped by its open circuit never gave.
+            now = time.time()
+            samples = []
+            for hostname in dict.fromkeys(hostnames):
+                if hostname not in stratum_lookup:
+                    continue
+                asns, _ = parse_as_field(as_lookup.get(hostname))
+                reading = readings.get(hostname, {})
+                samples.append(Sample(
+                    hostname=hostname,
+                    timestamp=now,
+                    stratum=stratum_lookup.get(hostname),
+                    asn=asns[0] if asns else None,
+                    offset=reading.get('offset'),
+                    leap=reading.get('leap'),
+                ))
+            store.append(samples)
+            logger.info(f"Recorded {len(samples)} samples in {store.directory}")
+        
+        updated, changes_made = apply_lookups(data, as_lookup, stratum_lookup, dry_run)
+        
+        if archive is not None and archive.replaying:
+            elapsed = time.perf_counter() - started
+            logger.info(f"Replayed {len(hostnames)} hostnames from {archive.path} in {elapsed:.3f}s "
+                        f"({len(hostnames) / elapsed if elapsed else 0:.0f} hostnames/s)")
+        
+        if report_json:
+            write_change_report_json(changes_made, report_json, dry_run)
+            logger.info(f"Wrote change report: {report_json}")
+        if report_markdown:
+            with open(report_markdown, 'w', encoding='utf-8') as f:
+                f.write(format_change_report_markdown(changes_made, dry_run))
+            logger.info(f"Wrote change summary: {report_markdown}")
         
         # Summary of changes
         if dry_run:
@@ -324,7 +586,7 @@ def update_ntp_sources(yaml_file, dry_run=False):
         if updated:
             # Create backup
             backup_file = f"{yaml_file}.backup"
-            subprocess.run(['cp', yaml_file, backup_file])
+            shutil.copy2(yaml_file, backup_file)
             logger.info(f"Created backup: {backup_file}")
             
             # Write updated data
@@ -342,6 +604,11 @@ def update_ntp_sources(yaml_file, dry_run=False):
     except Exception as e:
         logger.error(f"Error updating NTP sources: {e}")
         return False
+    finally:
+        # Whatever was looked up is kept, also when the run fails or is interrupted
+        if archive is not None and not archive.replaying:
+            archive.save()
+            logger.info(f"Recorded probe results in {archive.path}")
 
 def main():
     """Main function"""
@@ -363,19 +630,65 @@ Examples:
                        action='store_true',
                        help='Show what changes would be made without modifying the file')
     
+    parser.add_argument('--max-processes', '-j',
+                       type=int, default=16,
+                       help='Maximum concurrent ntpdate/ntpq processes (default: 16)')
+    
+    parser.add_argument('--report-json',
+                       metavar='FILE',
+                       help='Write the changes as a JSON report')
+    
+    parser.add_argument('--report-markdown',
+                       metavar='FILE',
+                       help='Write the changes as a Markdown summary (e.g. for a pull request body)')
+    
+    parser.add_argument('--store',
+                       metavar='DIR',
+                       help='Append this run\'s stratum, leap, offset and AS results to the probe history store in DIR')
+    
+    parser.add_argument('--history',
+                       metavar='FILE',
+                       help='Probe failure history file; hosts that keep failing are backed off and skipped')
+    
+    replay = parser.add_mutually_exclusive_group()
+    replay.add_argument('--record',
+                       metavar='FILE',
+                       help='Record the raw asnmap and ntpdate/ntpq output of this run to FILE')
+    replay.add_argument('--replay',
+                       metavar='FILE',
+                       help='Replay a recording instead of running asnmap and ntpdate/ntpq (no network access)')
+    
     args = parser.parse_args()
     
+    if args.replay and (args.history or args.store):
+        parser.error("--replay cannot be combined with --history or --store")
+    
     # Check if file exists
     if not Path(args.yaml_file).exists():
         logger.error(f"File not found: {args.yaml_file}")
         sys.exit(1)
     
-    # Check required tools
-    if not check_required_tools():
-        sys.exit(1)
+    archive = None
+    if args.replay:
+        try:
+            archive = ProbeArchive.load(args.replay)
+        except (OSError, ValueError) as e:
+            logger.error(f"Cannot read recording: {e}")
+            sys.exit(1)
+    elif args.record:
+        archive = ProbeArchive(args.record)
+    
+    # Check required tools (a replay never runs them)
+    if archive is None or not archive.replaying:
+        if not check_required_tools():
+            sys.exit(1)
+    
+    history = FailureHistory.load(args.history) if args.history else None
+    store = ProbeStore(args.store) if args.store else None
     
     # Update NTP sources
-    if update_ntp_sources(args.yaml_file, dry_run=args.dry_run):
+    if update_ntp_sources(args.yaml_file, dry_run=args.dry_run, max_processes=args.max_processes, history=history, store=store,
+                          report_json=args.report_json, report_markdown=args.report_markdown, archive=archive):
         if args.dry_run:
             logger.info("Dry run completed successfully")
         else:
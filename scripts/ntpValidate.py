@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+ntpValidate.py - Validate ntp-sources.yml before it is converted or committed
+
+Checks every entry in one pass and reports all problems at once:
+- Required fields are present and all known fields have the right type and format
+- Unknown fields are flagged (warning)
+- Hostnames are unique (case-insensitive, links resolved to the bare hostname)
+- Entries of one location are grouped together
+- Hostnames are in alphabetical order within their location (warning)
+
+Errors exit with status 1; --strict also fails on warnings. Several files may
+be given, so the script can run as a pre-commit hook.
+
+Usage: python3 ntpValidate.py [--strict] [ntp-sources.yml ...]
+"""
+
+import argparse
+import ipaddress
+import re
+import sys
+from typing import NamedTuple, Optional
+
+import yaml
+
+from asnReport import parse_as_field
+
+ERROR = "error"
+WARNING = "warning"
+
+HOSTNAME_PATTERN = re.compile(
+    r"^(?=.{1,253}$)(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z][A-Za-z0-9-]{0,61}[A-Za-z0-9]$")
+LINK_PATTERN = re.compile(r"^\[([^\]]+)\]\((https?://[^\s)]+)\)$")
+
+
+class Problem(NamedTuple):
+    """
+    One validation finding; line is 1-based when known. field names the entry
+    field it concerns ('servers' for the list structure, None for checks that
+    span entries such as duplicates and grouping).
+    """
+    severity: str
+    message: str
+    hostname: Optional[str] = None
+    line: Optional[int] = None
+    field: Optional[str] = None
+
+    def format(self, path):
+        location = f"{path}:{self.line}" if self.line else path
+        subject = f"{self.hostname}: " if self.hostname else ""
+        return f"{location}: {self.severity}: {subject}{self.message}"
+
+
+def is_ip_literal(value):
+    try:
+        ipaddress.ip_address(value)
+    except ValueError:
+        return False
+    return True
+
+
+def bare_hostname(value):
+    """Hostname or IP address without a Markdown link wrapper, or None if the field is malformed"""
+    match = LINK_PATTERN.match(value)
+    hostname = match.group(1) if match else value
+    return hostname if HOSTNAME_PATTERN.match(hostname) or is_ip_literal(hostname) else None
+
+
+def check_hostname(value):
+    if not isinstance(value, str) or bare_hostname(value) is None:
+        return f"expected a hostname, an IP address or [hostname](https://...), got {value!r}"
+    return None
+
+
+def check_as(value):
+    if not isinstance(value, str):
+        return f"expected a string like 'AS123, AS456' or 'Unknown', got {value!r}"
+    asns, malformed = parse_as_field(value)
+    if malformed:
+        return f"malformed AS token(s) {', '.join(malformed)}"
+    if not asns and value != "Unknown":
+        return "empty AS (use 'Unknown')"
+    return None
+
+
+def check_stratum(value):
+    # ntpUpdateSources.py stores what servers report, including 16 for unsynchronized
+    if value == "Unknown" or (type(value) is int and 0 <= value <= 16):
+        return None
+    return f"expected 0-16 or 'Unknown', got {value!r}"
+
+
+def check_text(value):
+    if not isinstance(value, str) or not value.strip():
+        return f"expected a non-empty string, got {value!r}"
+    return None
+
+
+def check_notes(value):
+    return None if isinstance(value, str) else f"expected a string, got {value!r}"
+
+
+def check_vm(value):
+    return None if isinstance(value, bool) else f"expected true or false, got {value!r}"
+
+
+def check_milliseconds(value):
+    return None if type(value) is int and value >= 0 else f"expected milliseconds as an integer, got {value!r}"
+
+
+# Field -> validator returning an error message or None; every field is required
+FIELD_VALIDATORS = {
+    "hostname": check_hostname,
+    "AS": check_as,
+    "stratum": check_stratum,
+    "location": check_text,
+    "owner": check_text,
+}
+
+# Fields that may be left out; nts/nts_ke_ms are written by linkCheck.py --nts
+OPTIONAL_VALIDATORS = {
+    "notes": check_notes,
+    "vm": check_vm,
+    "nts": check_vm,
+    "nts_ke_ms": check_milliseconds,
+}
+
+
+def load_with_lines(file_path):
+    """
+    Parse a YAML file once, keeping the start line of every server entry
+    Returns (data, lines) where lines[i] is the 1-based line of servers[i]
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        # libyaml is several times faster when PyYAML was built with it
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)(f)
+        try:
+            node = loader.get_single_node()
+            data = loader.construct_document(node) if node is not None else None
+        finally:
+            loader.dispose()
+
+    lines = []
+    if isinstance(node, yaml.MappingNode):
+        for key, value in node.value:
+            if key.value == "servers" and isinstance(value, yaml.SequenceNode):
+                lines = [item.start_mark.line + 1 for item in value.value]
+    return data, lines
+
+
+def shape_problems(data, required, optional=None):
+    """
+    Problems that stop code reading the given fields: no top-level 'servers'
+    list, entries that are not mappings, and fields that are missing or of
+    the wrong type. required and optional map field names to a type or tuple
+    of types; values are not checked any further.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("servers"), list):
+        return [Problem(ERROR, "expected a top-level 'servers' list", field="servers")]
+
+    problems = []
+    fields = {**(optional or {}), **required}
+    for i, server in enumerate(data["servers"]):
+        if not isinstance(server, dict):
+            problems.append(Problem(ERROR, f"entry {i + 1} is not a mapping", field="servers"))
+            continue
+        raw = server.get("hostname")
+        label = raw if isinstance(raw, str) else f"entry {i + 1}"
+        for field, types in fields.items():
+            if field not in server:
+                if field in required:
+                    problems.append(Problem(ERROR, f"missing field '{field}'", label, field=field))
+            elif not isinstance(server[field], types):
+                problems.append(Problem(ERROR, f"{field}: unexpected type {type(server[field]).__name__}",
+                                        label, field=field))
+    return problems
+
+
+def validate(data, lines=()):
+    """Validate parsed ntp-sources data; returns every Problem found"""
+    if not isinstance(data, dict) or not isinstance(data.get("servers"), list):
+        return [Problem(ERROR, "expected a top-level 'servers' list", field="servers")]
+
+    problems = []
+    seen = {}
+    closed_locations = set()
+    previous_location = previous_hostname = None
+
+    for i, server in enumerate(data["servers"]):
+        line = lines[i] if i < len(lines) else None
+        if not isinstance(server, dict):
+            problems.append(Problem(ERROR, f"entry {i + 1} is not a mapping", line=line, field="servers"))
+            continue
+
+        raw = server.get("hostname")
+        hostname = bare_hostname(raw) if isinstance(raw, str) else None
+        label = hostname or (raw if isinstance(raw, str) else f"entry {i + 1}")
+
+        for field, check in FIELD_VALIDATORS.items():
+            if field not in server:
+                problems.append(Problem(ERROR, f"missing field '{field}'", label, line, field))
+                continue
+            message = check(server[field])
+            if message:
+                problems.append(Problem(ERROR, f"{field}: {message}", label, line, field))
+        for field, value in server.items():
+            if field in FIELD_VALIDATORS:
+                continue
+            if field not in OPTIONAL_VALIDATORS:
+                problems.append(Problem(WARNING, f"unknown field '{field}'", label, line, field))
+            elif message := OPTIONAL_VALIDATORS[field](value):
+                problems.append(Problem(ERROR, f"{field}: {message}", label, line, field))
+
+        if hostname:
+            key = hostname.lower()
+            if key in seen:
+                first_line = seen[key]
+                where = f" (first at line {first_line})" if first_line else ""
+                problems.append(Problem(ERROR, f"duplicate hostname{where}", hostname, line))
+            else:
+                seen[key] = line
+
+        location = server.get("location")
+        if not isinstance(location, str):
+            continue
+        if location != previous_location:
+            if location in closed_locations:
+                problems.append(Problem(ERROR, f"location '{location}' is not grouped with its other entries",
+                                        label, line))
+            if previous_location is not None:
+                closed_locations.add(previous_location)
+            previous_location, previous_hostname = location, None
+        if hostname:
+            if previous_hostname and hostname.lower() < previous_hostname.lower():
+                problems.append(Problem(WARNING, f"not in alphabetical order within '{location}' "
+                                                 f"(after {previous_hostname})", hostname, line))
+            previous_hostname = hostname
+
+    return problems
+
+
+def validate_file(file_path):
+    """Validate one file; YAML and I/O errors are reported as a single Problem"""
+    try:
+        data, lines = load_with_lines(file_path)
+    except OSError as e:
+        return [Problem(ERROR, f"cannot read file: {e.strerror}")]
+    except yaml.YAMLError as e:
+        mark = getattr(e, "problem_mark", None)
+        return [Problem(ERROR, f"invalid YAML: {getattr(e, 'problem', e)}", line=mark.line + 1 if mark else None)]
+    return validate(data, lines)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(
+        description="Validate ntp-sources.yml fields, uniqueness, grouping and ordering",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python3 ntpValidate.py ntp-sources.yml
+  python3 ntpValidate.py --strict ntp-sources.yml
+  python3 ntpValidate.py --no-order ntp-sources.yml
+        """
+    )
+    parser.add_argument("yaml_files", nargs="*", default=["ntp-sources.yml"],
+                        help="Files to validate (default: ntp-sources.yml)")
+    parser.add_argument("--strict", action="store_true",
+                        help="Treat warnings (alphabetical order, unknown fields) as errors")
+    parser.add_argument("--no-order", action="store_true",
+                        help="Skip the alphabetical order check")
+    args = parser.parse_args()
+
+    failed = False
+    for file_path in args.yaml_files:
+        problems = validate_file(file_path)
+        if args.no_order:
+            # Order warnings span entries; unknown-field warnings name their field
+            problems = [problem for problem in problems if problem.severity != WARNING or problem.field]
+        for problem in problems:
+            print(problem.format(file_path), file=sys.stderr)
+        errors = sum(1 for problem in problems if problem.severity == ERROR)
+        warnings = len(problems) - errors
+        if errors or (args.strict and warnings):
+            failed = True
+        if problems:
+            print(f"{file_path}: {errors} error(s), {warnings} warning(s)", file=sys.stderr)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
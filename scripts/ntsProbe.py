@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+ntsProbe.py - Network Time Security key establishment (NTS-KE) probe
+
+Connects to TCP 4460 with TLS 1.3 and ALPN "ntske/1", sends the RFC 8915
+request (NTPv4, AEAD_AES_SIV_CMAC_256) and reads the reply records until
+End of Message. A server supports NTS when it negotiates the protocol and
+hands out at least one cookie. Runs on asyncio so it can share an event loop
+with the other probes.
+
+Usage: python3 ntsProbe.py [--timeout SECONDS] [--cafile PEM] hostname [hostname ...]
+"""
+
+import argparse
+import asyncio
+import ssl
+import struct
+import sys
+import time
+from typing import NamedTuple, Optional
+
+NTS_KE_PORT = 4460
+ALPN = "ntske/1"
+
+# Record types (RFC 8915 section 4)
+END_OF_MESSAGE = 0
+NEXT_PROTOCOL = 1
+ERROR = 2
+WARNING = 3
+AEAD_ALGORITHM = 4
+NEW_COOKIE = 5
+SERVER = 6
+PORT = 7
+CRITICAL = 0x8000
+
+NTPV4 = 0
+AEAD_AES_SIV_CMAC_256 = 15
+RECORD_HEADER = struct.Struct("!HH")
+
+ERROR_CODES = {0: "unrecognized critical record", 1: "bad request", 2: "internal server error"}
+
+
+class NtsResult(NamedTuple):
+    """
+    Outcome of one NTS-KE exchange; supported is None when the probe was
+    inconclusive (timeout or network error) rather than a definite answer.
+    """
+    hostname: str
+    supported: Optional[bool]
+    ke_time: Optional[float] = None
+    cookies: int = 0
+    server: Optional[str] = None
+    port: Optional[int] = None
+    error: Optional[str] = None
+
+
+def build_request():
+    """NTS-KE client request: NTPv4, AES-SIV-CMAC-256, End of Message"""
+    return b"".join((
+        RECORD_HEADER.pack(CRITICAL | NEXT_PROTOCOL, 2), struct.pack("!H", NTPV4),
+        RECORD_HEADER.pack(AEAD_ALGORITHM, 2), struct.pack("!H", AEAD_AES_SIV_CMAC_256),
+        RECORD_HEADER.pack(CRITICAL | END_OF_MESSAGE, 0),
+    ))
+
+
+async def read_records(reader):
+    """Read records until End of Message; returns [(type, body)] without the critical bit"""
+    records = []
+    while True:
+        record_type, length = RECORD_HEADER.unpack(await reader.readexactly(RECORD_HEADER.size))
+        body = await reader.readexactly(length)
+        record_type &= ~CRITICAL
+        if record_type == END_OF_MESSAGE:
+            return records
+        records.append((record_type, body))
+
+
+def interpret(hostname, records, ke_time):
+    """Turn the server's reply records into an NtsResult"""
+    cookies = 0
+    server = port = None
+    protocols = algorithms = ()
+    for record_type, body in records:
+        if record_type == ERROR:
+            code = struct.unpack("!H", body[:2])[0] if len(body) >= 2 else None
+            return NtsResult(hostname, False, ke_time, error=f"NTS-KE error: {ERROR_CODES.get(code, code)}")
+        if record_type == NEXT_PROTOCOL:
+            protocols = struct.unpack(f"!{len(body) // 2}H", body[:len(body) // 2 * 2])
+        elif record_type == AEAD_ALGORITHM:
+            algorithms = struct.unpack(f"!{len(body) // 2}H", body[:len(body) // 2 * 2])
+        elif record_type == NEW_COOKIE:
+            cookies += 1
+        elif record_type == SERVER:
+            server = body.decode("ascii", "replace")
+        elif record_type == PORT and len(body) == 2:
+            port = struct.unpack("!H", body)[0]
+
+    if NTPV4 not in protocols:
+        return NtsResult(hostname, False, ke_time, error="NTPv4 not offered")
+    if AEAD_AES_SIV_CMAC_256 not in algorithms:
+        return NtsResult(hostname, False, ke_time, error="no supported AEAD algorithm")
+    if not cookies:
+        return NtsResult(hostname, False, ke_time, error="no cookies")
+    return NtsResult(hostname, True, ke_time, cookies, server, port)
+
+
+def create_context(cafile=None):
+    """TLS 1.3 client context offering only the NTS-KE ALPN protocol"""
+    context = ssl.create_default_context(cafile=cafile)
+    context.minimum_version = ssl.TLSVersion.TLSv1_3
+    context.set_alpn_protocols([ALPN])
+    return context
+
+
+async def probe(hostname, timeout=5.0, port=NTS_KE_PORT, context=None):
+    """
+    Run one NTS-KE exchange; never raises for network or protocol problems
+    ke_time covers TCP connect, TLS handshake and the record exchange
+    """
+    context = context or create_context()
+    started = time.perf_counter()
+    writer = None
+    try:
+        async with asyncio.timeout(timeout):
+            reader, writer = await asyncio.open_connection(hostname, port, ssl=context, server_hostname=hostname)
+            ssl_object = writer.get_extra_info("ssl_object")
+            if ssl_object is None or ssl_object.selected_alpn_protocol() != ALPN:
+                return NtsResult(hostname, False, error="ALPN ntske/1 not negotiated")
+            writer.write(build_request())
+            await writer.drain()
+            records = await read_records(reader)
+        return interpret(hostname, records, time.perf_counter() - started)
+    except TimeoutError:
+        return NtsResult(hostname, None, error="timeout")
+    except ssl.SSLCertVerificationError as e:
+        return NtsResult(hostname, False, error=f"certificate: {e.verify_message}")
+    except ssl.SSLError as e:
+        return NtsResult(hostname, False, error=f"TLS: {e.reason or e}")
+    except ConnectionRefusedError:
+        return NtsResult(hostname, False, error="connection refused")
+    except asyncio.IncompleteReadError:
+        return NtsResult(hostname, False, error="connection closed before End of Message")
+    except OSError as e:
+        return NtsResult(hostname, None, error=f"network: {e.strerror or e}")
+    finally:
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+
+
+async def probe_all(hostnames, timeout=5.0, max_concurrent=20, port=NTS_KE_PORT, context=None):
+    """Probe hostnames concurrently; returns NtsResults in input order"""
+    context = context or create_context()
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def one(hostname):
+        async with semaphore:
+            return await probe(hostname, timeout, port, context)
+
+    return await asyncio.gather(*(one(hostname) for hostname in hostnames))
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Check NTS-KE support (TCP 4460, ALPN ntske/1)")
+    parser.add_argument("hostnames", nargs="+", help="Servers to probe")
+    parser.add_argument("--timeout", type=float, default=5.0, help="Per-server timeout in seconds (default: 5.0)")
+    parser.add_argument("--cafile", help="PEM bundle to trust instead of the system store")
+    parser.add_argument("--port", type=int, default=NTS_KE_PORT, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    results = asyncio.run(probe_all(args.hostnames, args.timeout, port=args.port, context=create_context(args.cafile)))
+    for result in results:
+        if result.supported:
+            extra = f", NTP at {result.server or result.hostname}:{result.port or 123}"
+            print(f"{result.hostname}: NTS supported (KE {result.ke_time * 1000:.0f} ms, {result.cookies} cookies{extra})")
+        else:
+            print(f"{result.hostname}: {'no NTS' if result.supported is False else 'inconclusive'} ({result.error})")
+    sys.exit(0 if any(result.supported for result in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
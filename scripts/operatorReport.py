@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+operatorReport.py - Per-owner, per-AS and per-location rollups of ntp-sources.yml
+
+One pass over the server list (and, with --store, one scan of the probe
+history store) produces for every owner, AS number and location:
+- Number of servers
+- Reachable share: servers whose latest stored probe answered, out of those probed
+- Median RTT over the probed servers' median RTTs
+- Stratum distribution as listed in ntp-sources.yml
+
+Servers announcing several AS numbers count once towards each of them. The
+rollups are written as JSON and/or as a Markdown section, which
+ntpServerConvertor.py --summary splices into README.md below the list.
+
+Usage: python3 operatorReport.py [--store DIR] [--json FILE] [--markdown FILE] [ntp-sources.yml]
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import Counter, defaultdict
+from statistics import median
+
+import yaml
+
+from asnReport import parse_as_field
+from ntpValidate import bare_hostname
+from probeStore import ProbeStore, parse_date
+
+# Dimension name -> heading used in the Markdown section
+DIMENSIONS = {
+    "owner": "Owner",
+    "as": "AS",
+    "location": "Location",
+}
+
+
+def probe_summary(store, since=None):
+    """
+    Reduce the probe store to one entry per hostname in a single scan
+    Returns {hostname: (answered, median rtt or None)} where answered refers to the latest sample
+    """
+    latest = {}
+    rtts = defaultdict(list)
+    for sample in store.scan(since):
+        latest[sample.hostname] = sample
+        if sample.rtt is not None:
+            rtts[sample.hostname].append(sample.rtt)
+    return {hostname: (sample.stratum is not None, median(rtts[hostname]) if rtts[hostname] else None)
+            for hostname, sample in latest.items()}
+
+
+def server_hostname(server):
+    raw = server.get("hostname")
+    return (bare_hostname(raw) or raw) if isinstance(raw, str) else None
+
+
+def group_keys(server):
+    """(dimension, key) pairs a server counts towards"""
+    keys = [("owner", str(server.get("owner") or "Unknown")),
+            ("location", str(server.get("location") or "Unknown"))]
+    asns, _ = parse_as_field(server.get("AS"))
+    keys += [("as", f"AS{asn}") for asn in asns] or [("as", "Unknown")]
+    return keys
+
+
+def stratum_sort_key(item):
+    stratum = item[0]
+    return (0, stratum) if isinstance(stratum, int) else (1, str(stratum))
+
+
+def rollup(servers, probes=None):
+    """
+    Aggregate servers by owner, AS and location in one pass
+    probes is the probe_summary() mapping, or None when no probe results are available
+    Returns {dimension: [group dict]} with groups ordered by server count, then name
+    """
+    groups = {dimension: defaultdict(lambda: {"servers": 0, "probed": 0, "reachable": 0,
+                                              "rtts": [], "strata": Counter()})
+              for dimension in DIMENSIONS}
+
+    for server in servers:
+        probe = probes.get(server_hostname(server)) if probes is not None else None
+        for dimension, key in group_keys(server):
+            group = groups[dimension][key]
+            group["servers"] += 1
+            group["strata"][server.get("stratum", "Unknown")] += 1
+            if probe is not None:
+                answered, rtt = probe
+                group["probed"] += 1
+                group["reachable"] += answered
+                if rtt is not None:
+                    group["rtts"].append(rtt)
+
+    result = {}
+    for dimension, by_key in groups.items():
+        rows = []
+        for key, group in by_key.items():
+            rows.append({
+                "name": key,
+                "servers": group["servers"],
+                "probed": group["probed"],
+                "reachable": group["reachable"],
+                "reachable_share": round(group["reachable"] / group["probed"], 3) if group["probed"] else None,
+                "median_rtt_ms": round(median(group["rtts"]) * 1000, 1) if group["rtts"] else None,
+                "strata": {str(stratum): count for stratum, count in sorted(group["strata"].items(),
+                                                                             key=stratum_sort_key)},
+            })
+        result[dimension] = sorted(rows, key=lambda row: (-row["servers"], row["name"].lower()))
+    return result
+
+
+def build_report(servers, probes=None):
+    """Rollups plus totals, ready for json.dump"""
+    return {
+        "servers": len(servers),
+        "probed": sum(1 for server in servers if server_hostname(server) in probes) if probes else 0,
+        **{f"by_{dimension}": rows for dimension, rows in rollup(servers, probes).items()},
+    }
+
+
+def iter_summary_markdown(report, top=None):
+    """Yield the Markdown section for a build_report() result; top limits rows per table"""
+    probed = report["probed"] > 0
+    yield "\n### Diversity Summary\n\n"
+    yield f"{report['servers']} servers"
+    if probed:
+        yield f", {report['probed']} with probe results"
+    yield ".\n"
+    for dimension, heading in DIMENSIONS.items():
+        rows = report[f"by_{dimension}"]
+        shown = rows[:top] if top else rows
+        yield f"\n#### By {heading}\n\n"
+        if probed:
+            yield f"|{heading}|Servers|Reachable|Median RTT|Strata|\n|---|:---:|:---:|:---:|---|\n"
+        else:
+            yield f"|{heading}|Servers|Strata|\n|---|:---:|---|\n"
+        for row in shown:
+            strata = ", ".join(f"{stratum}: {count}" for stratum, count in row["strata"].items())
+            if probed:
+                share = "-" if row["reachable_share"] is None else f"{row['reachable_share']:.0%}"
+                rtt = "-" if row["median_rtt_ms"] is None else f"{row['median_rtt_ms']:.1f} ms"
+                yield f"|{row['name']}|{row['servers']}|{share}|{rtt}|{strata}|\n"
+            else:
+                yield f"|{row['name']}|{row['servers']}|{strata}|\n"
+        if len(shown) < len(rows):
+            yield f"\n{len(rows) - len(shown)} more not shown.\n"
+
+
+def load_report(yaml_file, store_dir=None, since=None):
+    """Load the server list and optional probe store and build the report"""
+    with open(yaml_file, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    if not isinstance(data, dict) or not isinstance(data.get("servers"), list):
+        raise ValueError(f"{yaml_file}: expected a top-level 'servers' list")
+
+    probes = None
+    if store_dir:
+        probes = probe_summary(ProbeStore(store_dir), since)
+    return build_report(data["servers"], probes)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(
+        description="Summarize ntp-sources.yml per owner, AS and location",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python3 operatorReport.py ntp-sources.yml
+  python3 operatorReport.py --store probes --json rollup.json ntp-sources.yml
+  python3 operatorReport.py --top 15 --markdown summary.md ntp-sources.yml
+        """
+    )
+    parser.add_argument("yaml_file", nargs="?", default="ntp-sources.yml",
+                        help="Path to the ntp-sources.yml file (default: ntp-sources.yml)")
+    parser.add_argument("--store", metavar="DIR",
+                        help="Probe history store with reachability and RTT results")
+    parser.add_argument("--since", type=parse_date,
+                        help="Only use probe results from this date on (ISO format, UTC unless an offset is given; "
+                             "default: 30 days ago)")
+    parser.add_argument("--json", metavar="FILE", help="Write the rollups as JSON")
+    parser.add_argument("--markdown", metavar="FILE", help="Write the Markdown section to FILE")
+    parser.add_argument("--top", type=int, metavar="N", help="Show at most N rows per Markdown table")
+    args = parser.parse_args()
+
+    since = args.since if args.since is not None else time.time() - 30 * 86400
+    try:
+        report = load_report(args.yaml_file, args.store, since)
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Written {args.json}")
+    if args.markdown:
+        with open(args.markdown, "w", encoding="utf-8") as f:
+            f.writelines(iter_summary_markdown(report, args.top))
+        print(f"Written {args.markdown}")
+    if not args.json and not args.markdown:
+        sys.stdout.writelines(iter_summary_markdown(report, args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+probeHistory.py - Per-hostname failure history and circuit breaker for probes
+
+Each probe stage (ntp, asn, https, chrony) records successes and failures per
+hostname in a small JSON file. After FAILURE_THRESHOLD consecutive failures the
+circuit opens and the host is skipped for an exponentially growing backoff
+window (capped at MAX_BACKOFF). Once the window expires the circuit is
+half-open: the host gets a single fast probe, which either closes the circuit
+or reopens it for twice as long.
+
+Usage: python3 probeHistory.py [--all] <history.json>
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+FAILURE_THRESHOLD = 3
+BASE_BACKOFF = 24 * 3600
+MAX_BACKOFF = 30 * 24 * 3600
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class FailureHistory:
+    """Failure counters and circuit state keyed by hostname, then by stage."""
+
+    def __init__(self, path=None, entries=None):
+        self.path = path
+        self.entries = entries or {}
+
+    @classmethod
+    def load(cls, path):
+        """Load history from path; a missing file starts an empty history"""
+        try:
+            with open(path, 'r') as f:
+                return cls(path, json.load(f))
+        except FileNotFoundError:
+            return cls(path)
+
+    def save(self):
+        """Atomically write the history back to its file"""
+        if self.path is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(f.name, self.path)
+
+    def _entry(self, hostname, stage):
+        return self.entries.setdefault(hostname, {}).setdefault(stage, {
+            'failures': 0,
+            'total_failures': 0,
+            'last_success': None,
+            'last_failure': None,
+            'open_until': None,
+        })
+
+    def state(self, hostname, stage, now=None):
+        """Return CLOSED, OPEN or HALF_OPEN for a hostname's stage"""
+        entry = self.entries.get(hostname, {}).get(stage)
+        if not entry or entry['open_until'] is None:
+            return CLOSED
+        now = time.time() if now is None else now
+        return OPEN if now < entry['open_until'] else HALF_OPEN
+
+    def record_success(self, hostname, stage, now=None):
+        entry = self._entry(hostname, stage)
+        entry['failures'] = 0
+        entry['last_success'] = time.time() if now is None else now
+        entry['open_until'] = None
+
+    def record_failure(self, hostname, stage, now=None):
+        """Count a failure and open the circuit once the threshold is reached"""
+        now = time.time() if now is None else now
+        entry = self._entry(hostname, stage)
+        entry['failures'] += 1
+        entry['total_failures'] += 1
+        entry['last_failure'] = now
+        excess = entry['failures'] - FAILURE_THRESHOLD
+        if excess >= 0:
+            entry['open_until'] = now + min(BASE_BACKOFF * 2 ** excess, MAX_BACKOFF)
+
+    def record(self, hostname, stage, ok, now=None):
+        if ok:
+            self.record_success(hostname, stage, now)
+        else:
+            self.record_failure(hostname, stage, now)
+
+    def partition(self, hostnames, stage, now=None):
+        """
+        Split hostnames by circuit state
+        Returns (probe, fast_probe, skipped) lists preserving input order
+        """
+        probe, fast_probe, skipped = [], [], []
+        for hostname in hostnames:
+            state = self.state(hostname, stage, now)
+            if state == OPEN:
+                skipped.append(hostname)
+            elif state == HALF_OPEN:
+                fast_probe.append(hostname)
+            else:
+                probe.append(hostname)
+        return probe, fast_probe, skipped
+
+    def report(self, include_closed=False, now=None):
+        """
+        Rows of (hostname, stage, state, consecutive failures, total failures, last success, open until)
+        ordered by consecutive failures, worst first
+        """
+        rows = []
+        for hostname, stages in self.entries.items():
+            for stage, entry in stages.items():
+                state = self.state(hostname, stage, now)
+                if state == CLOSED and not include_closed:
+                    continue
+                rows.append((hostname, stage, state, entry['failures'], entry['total_failures'],
+                             entry['last_success'], entry['open_until']))
+        rows.sort(key=lambda row: (-row[3], row[0], row[1]))
+        return rows
+
+
+def format_time(timestamp):
+    if timestamp is None:
+        return "never"
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d %H:%M')
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(
+        description="Report hosts with open or half-open probe circuits, as candidates for pruning"
+    )
+    parser.add_argument('history_file', help='Path to the probe history JSON file')
+    parser.add_argument('--all', action='store_true', help='Include hosts whose circuits are closed')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.history_file):
+        print(f"Error: {args.history_file} not found.")
+        sys.exit(1)
+
+    rows = FailureHistory.load(args.history_file).report(include_closed=args.all)
+    if not rows:
+        print("No hosts with open circuits.")
+        return
+
+    print("|Hostname|Stage|State|Consecutive failures|Total failures|Last success|Open until|")
+    print("|---|---|---|:---:|:---:|---|---|")
+    for hostname, stage, state, failures, total, last_success, open_until in rows:
+        print(f"|{hostname}|{stage}|{state}|{failures}|{total}|{format_time(last_success)}|{format_time(open_until)}|")
+
+
+if __name__ == "__main__":
+    main()
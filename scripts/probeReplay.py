@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+probeReplay.py - Record probe inputs once, replay them deterministically
+
+A recording captures what the scripts read from the outside world, per host:
+
+  asnmap   raw asnmap JSON lines for each input hostname
+  process  output lines, exit status and timeout flag of each ntpdate/ntpq run
+  https    HTTPS status or error and TLS details of each linkCheck probe
+  nts      NTS-KE result of each linkCheck --nts probe
+
+ntpUpdateSources.py and linkCheck.py take --record FILE to write one and
+--replay FILE to run against one instead of the network. Replayed input
+goes through the same parsing and decision code as live input, so a bad run
+can be reproduced exactly. A replay does no network I/O, so its timing is a
+benchmark of the processing path alone. Hosts missing from the recording
+are treated as failed lookups, which leave their AS and stratum unchanged;
+linkCheck.py skips them, so their links and NTS flags stay as they are.
+
+Archives are gzip-compressed JSON.
+
+Usage: python3 probeReplay.py [--kind KIND] <archive.json.gz>
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from processRunner import RunResult
+
+VERSION = 1
+
+
+class ProbeArchive:
+    """Recorded probe inputs keyed by kind, then by host or command line."""
+
+    def __init__(self, path=None, entries=None, replaying=False, created=None):
+        self.path = path
+        self.entries = entries or {}
+        self.replaying = replaying
+        self.created = created or time.time()
+
+    @classmethod
+    def load(cls, path):
+        """Open an existing recording for replay"""
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            archive = json.load(f)
+        if archive.get('version') != VERSION:
+            raise ValueError(f"{path}: unsupported recording version {archive.get('version')!r}")
+        return cls(path, archive['entries'], replaying=True, created=archive.get('created'))
+
+    def save(self):
+        """Atomically write the recording to its file"""
+        if self.path is None or self.replaying:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with tempfile.NamedTemporaryFile('wb', dir=directory, suffix='.tmp', delete=False) as f:
+            with gzip.GzipFile(fileobj=f, mode='wb', mtime=0) as compressed:
+                document = {'version': VERSION, 'created': self.created, 'entries': self.entries}
+                compressed.write(json.dumps(document, separators=(',', ':')).encode('utf-8'))
+        os.replace(f.name, self.path)
+
+    def record(self, kind, key, value):
+        """Store one observation; a later one for the same key replaces it"""
+        self.entries.setdefault(kind, {})[key] = value
+
+    def lookup(self, kind, key):
+        """Recorded observation, or None if key was never recorded"""
+        return self.entries.get(kind, {}).get(key)
+
+
+def command_key(argv):
+    return ' '.join(argv)
+
+
+class RecordingRunner:
+    """ProcessRunner wrapper that records every command's output."""
+
+    def __init__(self, runner, archive):
+        self.runner = runner
+        self.archive = archive
+
+    async def run(self, argv, timeout, on_line=None):
+        result = await self.runner.run(argv, timeout, on_line)
+        self.archive.record('process', command_key(argv), result._asdict())
+        return result
+
+
+class ReplayRunner:
+    """Stand-in for ProcessRunner that feeds recorded output to on_line."""
+
+    def __init__(self, archive):
+        self.archive = archive
+
+    async def run(self, argv, timeout, on_line=None):
+        recorded = self.archive.lookup('process', command_key(argv))
+        if recorded is None:
+            return RunResult(returncode=None, lines=[f"{argv[0]}: not in recording"])
+
+        lines = []
+        for line in recorded['lines']:
+            lines.append(line)
+            if on_line is not None and on_line(line):
+                return RunResult(returncode=None, lines=lines, stopped=True)
+        return RunResult(returncode=recorded['returncode'], lines=lines, timed_out=recorded['timed_out'])
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Summarize a probe recording")
+    parser.add_argument("archive", help="Recording written with --record")
+    parser.add_argument("--kind", help="List the keys recorded for one kind (asnmap, process, https, nts)")
+    args = parser.parse_args()
+
+    try:
+        archive = ProbeArchive.load(args.archive)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    created = datetime.fromtimestamp(archive.created, timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+    print(f"{args.archive}: recorded {created}")
+    for kind, entries in sorted(archive.entries.items()):
+        print(f"  {kind}: {len(entries)} entries")
+    if args.kind:
+        for key in sorted(archive.entries.get(args.kind, {})):
+            print(f"    {key}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+probeStore.py - Append-only columnar history of probe results
+
+Each probe run is appended to <dir>/samples.bin as one block:
+
+  header  magic "NTPB", version u8, count u32, first_ms u64, last_ms u64, payload_len u32
+  payload host ids     count x u32 (line numbers in <dir>/hosts.txt)
+          timestamps   count varints, delta-encoded from first_ms (sorted ascending)
+          stratum      count x u8 (255 = no answer)
+          AS number    count x u32 (first AS, 0 = unknown)
+          rtt          count x float32 seconds (NaN = unknown)
+          offset       count x float32 seconds (NaN = unknown)
+          leap         count x u8 (255 = unknown)                      version 2
+          precision    count x i8 log2 seconds (127 = unknown)         version 2
+          root delay   count x float32 seconds (NaN = unknown)         version 2
+          root disp.   count x float32 seconds (NaN = unknown)         version 2
+          ref id       count x 4 raw bytes (all zero = unknown)        version 2
+
+Version 1 blocks are still read; their version 2 fields are None.
+
+Writers hold an exclusive flock on <dir>/lock while appending, and re-read
+hosts.txt under it, so concurrent runs never hand out the same host id twice.
+
+Range queries read only block headers until a block overlaps the range, so
+"which servers degraded this month" never replays unrelated history.
+
+Usage:
+  python3 probeStore.py <dir> query [--host H] [--since DATE] [--until DATE] [--bucket SECONDS]
+  python3 probeStore.py <dir> degraded [--since DATE] [--until DATE]
+  python3 probeStore.py <dir> latest [--host H] [--since DATE] [--until DATE]
+"""
+
+import argparse
+import fcntl
+import math
+import os
+import re
+import socket
+import struct
+import sys
+import time
+from array import array
+from collections import defaultdict
+from datetime import datetime, timezone
+from statistics import median
+from typing import NamedTuple, Optional
+
+MAGIC = b"NTPB"
+VERSION = 2
+HEADER = struct.Struct("<4sBIQQI")
+STRATUM_UNKNOWN = 255
+LEAP_UNKNOWN = 255
+PRECISION_UNKNOWN = 127
+LEAP_ALARM = 3
+# Same limit as ntpProbe.MAX_ROOT_DISTANCE; not imported to keep asyncio off this path
+MAX_ROOT_DISTANCE = 1.5
+IPV4_PATTERN = re.compile(r"^\d{1,3}(?:\.\d{1,3}){3}$")
+
+
+class Sample(NamedTuple):
+    """One probe result for one server."""
+    hostname: str
+    timestamp: float
+    stratum: Optional[int] = None
+    asn: Optional[int] = None
+    rtt: Optional[float] = None
+    offset: Optional[float] = None
+    leap: Optional[int] = None
+    ref_id: Optional[str] = None
+    precision: Optional[int] = None
+    root_delay: Optional[float] = None
+    root_dispersion: Optional[float] = None
+
+
+def encode_ref_id(ref_id):
+    """Pack a reference ID ("GPS", ".PPS." or an upstream IPv4 address) into 4 bytes"""
+    if not ref_id:
+        return b"\0" * 4
+    if IPV4_PATTERN.match(ref_id):
+        try:
+            return socket.inet_aton(ref_id)
+        except OSError:
+            pass
+    return ref_id.strip(".").encode("ascii", "replace")[:4].ljust(4, b"\0")
+
+
+def decode_ref_id(raw, stratum):
+    """Inverse of encode_ref_id; the stratum decides between source code and address"""
+    if raw == b"\0" * 4:
+        return None
+    if stratum is not None and stratum >= 2:
+        return socket.inet_ntoa(raw)
+    return raw.rstrip(b"\0").decode("ascii", "replace")
+
+
+def _optional(value, unknown):
+    return unknown if value is None else value
+
+
+def encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varints(buffer, offset, count):
+    values = []
+    for _ in range(count):
+        value = shift = 0
+        while True:
+            byte = buffer[offset]
+            offset += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        values.append(value)
+    return values, offset
+
+
+def _column(typecode, values):
+    column = array(typecode, values)
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column.tobytes()
+
+
+def _read_column(typecode, buffer, offset, count):
+    column = array(typecode)
+    size = column.itemsize * count
+    column.frombytes(buffer[offset:offset + size])
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column, offset + size
+
+
+class ProbeStore:
+    """Append-only columnar sample store in a directory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.samples_path = os.path.join(directory, "samples.bin")
+        self.hosts_path = os.path.join(directory, "hosts.txt")
+        self.lock_path = os.path.join(directory, "lock")
+        self._load_hosts()
+
+    def _load_hosts(self):
+        self.hosts = []
+        if os.path.exists(self.hosts_path):
+            with open(self.hosts_path, "r", encoding="utf-8") as f:
+                self.hosts = f.read().splitlines()
+        self.host_ids = {hostname: i for i, hostname in enumerate(self.hosts)}
+
+    def _host_id(self, hostname, new_hosts):
+        if hostname not in self.host_ids:
+            self.host_ids[hostname] = len(self.hosts)
+            self.hosts.append(hostname)
+            new_hosts.append(hostname)
+        return self.host_ids[hostname]
+
+    def append(self, samples):
+        """Append one block holding samples; returns the number written"""
+        samples = sorted(samples, key=lambda sample: sample.timestamp)
+        if not samples:
+            return 0
+        os.makedirs(self.directory, exist_ok=True)
+
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Another process may have added hosts since this store was opened
+            self._load_hosts()
+            self._append_locked(samples)
+        return len(samples)
+
+    def _append_locked(self, samples):
+        new_hosts = []
+        host_ids = [self._host_id(sample.hostname, new_hosts) for sample in samples]
+        stamps = [int(sample.timestamp * 1000) for sample in samples]
+        deltas = bytearray()
+        previous = stamps[0]
+        for stamp in stamps:
+            encode_varint(stamp - previous, deltas)
+            previous = stamp
+
+        nan = float("nan")
+        payload = b"".join((
+            _column("I", host_ids),
+            bytes(deltas),
+            bytes(STRATUM_UNKNOWN if sample.stratum is None or not 0 <= sample.stratum < STRATUM_UNKNOWN
+                  else sample.stratum for sample in samples),
+            _column("I", [sample.asn or 0 for sample in samples]),
+            _column("f", [nan if sample.rtt is None else sample.rtt for sample in samples]),
+            _column("f", [nan if sample.offset is None else sample.offset for sample in samples]),
+            bytes(LEAP_UNKNOWN if sample.leap is None else sample.leap & 0x3 for sample in samples),
+            _column("b", [PRECISION_UNKNOWN if sample.precision is None or not -128 <= sample.precision < PRECISION_UNKNOWN
+                          else sample.precision for sample in samples]),
+            _column("f", [_optional(sample.root_delay, nan) for sample in samples]),
+            _column("f", [_optional(sample.root_dispersion, nan) for sample in samples]),
+            b"".join(encode_ref_id(sample.ref_id) for sample in samples),
+        ))
+
+        # Host names first, so a block never refers to an id that is not on disk
+        if new_hosts:
+            with open(self.hosts_path, "a", encoding="utf-8") as f:
+                f.write("".join(f"{hostname}\n" for hostname in new_hosts))
+        with open(self.samples_path, "ab") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(samples), stamps[0], stamps[-1], len(payload)))
+            f.write(payload)
+
+    def scan(self, start=None, end=None, hostnames=None):
+        """Yield samples with start <= timestamp < end, optionally limited to hostnames"""
+        if not os.path.exists(self.samples_path):
+            return
+        start_ms = -1 if start is None else int(start * 1000)
+        end_ms = math.inf if end is None else int(end * 1000)
+        wanted = None if hostnames is None else {self.host_ids[h] for h in hostnames if h in self.host_ids}
+
+        with open(self.samples_path, "rb") as f:
+            while header := f.read(HEADER.size):
+                magic, version, count, first_ms, last_ms, payload_len = HEADER.unpack(header)
+                if magic != MAGIC or not 1 <= version <= VERSION:
+                    raise ValueError(f"Corrupt block in {self.samples_path}")
+                if last_ms < start_ms or first_ms >= end_ms:
+                    f.seek(payload_len, os.SEEK_CUR)
+                    continue
+                yield from self._decode_block(f.read(payload_len), version, count, first_ms, start_ms, end_ms, wanted)
+
+    def _decode_block(self, payload, version, count, first_ms, start_ms, end_ms, wanted):
+        host_ids, offset = _read_column("I", payload, 0, count)
+        deltas, offset = decode_varints(payload, offset, count)
+        strata = payload[offset:offset + count]
+        offset += count
+        asns, offset = _read_column("I", payload, offset, count)
+        rtts, offset = _read_column("f", payload, offset, count)
+        offsets, offset = _read_column("f", payload, offset, count)
+        if version >= 2:
+            leaps = payload[offset:offset + count]
+            offset += count
+            precisions, offset = _read_column("b", payload, offset, count)
+            root_delays, offset = _read_column("f", payload, offset, count)
+            root_dispersions, offset = _read_column("f", payload, offset, count)
+            ref_ids = payload[offset:offset + 4 * count]
+
+        stamp = first_ms
+        for i in range(count):
+            stamp += deltas[i]
+            if stamp < start_ms or stamp >= end_ms or (wanted is not None and host_ids[i] not in wanted):
+                continue
+            stratum = None if strata[i] == STRATUM_UNKNOWN else strata[i]
+            sample = Sample(
+                hostname=self.hosts[host_ids[i]],
+                timestamp=stamp / 1000,
+                stratum=stratum,
+                asn=asns[i] or None,
+                rtt=None if math.isnan(rtts[i]) else rtts[i],
+                offset=None if math.isnan(offsets[i]) else offsets[i],
+            )
+            if version >= 2:
+                sample = sample._replace(
+                    leap=None if leaps[i] == LEAP_UNKNOWN else leaps[i],
+                    ref_id=decode_ref_id(ref_ids[4 * i:4 * i + 4], stratum),
+                    precision=None if precisions[i] == PRECISION_UNKNOWN else precisions[i],
+                    root_delay=None if math.isnan(root_delays[i]) else root_delays[i],
+                    root_dispersion=None if math.isnan(root_dispersions[i]) else root_dispersions[i],
+                )
+            yield sample
+
+    def downsample(self, bucket, start=None, end=None, hostnames=None):
+        """
+        Aggregate samples into fixed buckets of bucket seconds
+        Returns {hostname: [(bucket_start, samples, answered, worst stratum, median rtt)]}
+        """
+        buckets = defaultdict(list)
+        for sample in self.scan(start, end, hostnames):
+            buckets[(sample.hostname, int(sample.timestamp // bucket) * bucket)].append(sample)
+
+        result = defaultdict(list)
+        for (hostname, bucket_start), samples in sorted(buckets.items()):
+            strata = [s.stratum for s in samples if s.stratum is not None]
+            rtts = [s.rtt for s in samples if s.rtt is not None]
+            result[hostname].append((
+                bucket_start,
+                len(samples),
+                len(strata),
+                max(strata) if strata else None,
+                median(rtts) if rtts else None,
+            ))
+        return result
+
+    def degraded(self, start=None, end=None, rtt_factor=1.5, rtt_floor=0.005):
+        """
+        Compare each server's first and last samples in the range
+        Returns [(hostname, reason)] for lost answers, worse stratum, AS changes, RTT growth,
+        and a leap alarm or excessive root distance in the latest answer
+        """
+        by_host = defaultdict(list)
+        for sample in self.scan(start, end):
+            by_host[sample.hostname].append(sample)
+
+        findings = []
+        for hostname, samples in sorted(by_host.items()):
+            first, last = samples[0], samples[-1]
+            if first.stratum is not None and last.stratum is None:
+                findings.append((hostname, "stopped answering"))
+            elif first.stratum is not None and last.stratum is not None and last.stratum > first.stratum:
+                findings.append((hostname, f"stratum {first.stratum} -> {last.stratum}"))
+            if first.asn and last.asn and first.asn != last.asn:
+                findings.append((hostname, f"AS{first.asn} -> AS{last.asn}"))
+            answered = [s for s in samples if s.stratum is not None]
+            latest = answered[-1] if answered else None
+            if latest and latest.leap == LEAP_ALARM:
+                findings.append((hostname, "leap alarm (unsynchronized)"))
+            if latest and latest.root_dispersion is not None:
+                root_distance = (latest.root_delay or 0) / 2 + latest.root_dispersion
+                if root_distance > MAX_ROOT_DISTANCE:
+                    findings.append((hostname, f"root distance {root_distance:.3f}s"))
+
+            half = len(samples) // 2
+            early = [s.rtt for s in samples[:half] if s.rtt is not None]
+            late = [s.rtt for s in samples[half:] if s.rtt is not None]
+            if early and late:
+                before, after = median(early), median(late)
+                if after > before * rtt_factor and after - before > rtt_floor:
+                    findings.append((hostname, f"median rtt {before * 1000:.1f} ms -> {after * 1000:.1f} ms"))
+        return findings
+
+
+def parse_date(value):
+    """ISO date or date-time as a Unix timestamp; UTC unless the value carries an offset"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def format_sample(sample):
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:.1f} ms"
+
+    return (f"{sample.hostname}  {format_time(sample.timestamp)}  "
+            f"stratum {'-' if sample.stratum is None else sample.stratum}  "
+            f"ref {sample.ref_id or '-'}  leap {'-' if sample.leap is None else sample.leap}  "
+            f"precision {'-' if sample.precision is None else f'2^{sample.precision}'}  "
+            f"root delay {ms(sample.root_delay)}  root disp {ms(sample.root_dispersion)}  rtt {ms(sample.rtt)}")
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Query the probe history store")
+    parser.add_argument("directory", help="Probe store directory")
+    parser.add_argument("command", choices=["query", "degraded", "latest"])
+    parser.add_argument("--host", action="append", help="Only this hostname (repeatable)")
+    parser.add_argument("--since", type=parse_date, help="Start date (ISO format, UTC unless an offset is given; default: 30 days ago)")
+    parser.add_argument("--until", type=parse_date, help="End date (ISO format, UTC unless an offset is given; default: now)")
+    parser.add_argument("--bucket", type=int, default=86400,
+                        help="Downsampling bucket in seconds for query (default: 86400)")
+    args = parser.parse_args()
+
+    store = ProbeStore(args.directory)
+    since = args.since if args.since is not None else time.time() - 30 * 86400
+
+    if args.command == "degraded":
+        findings = store.degraded(since, args.until)
+        for hostname, reason in findings:
+            print(f"{hostname}: {reason}")
+        if not findings:
+            print("No degraded servers.")
+        return
+
+    if args.command == "latest":
+        latest = {}
+        for sample in store.scan(since, args.until, args.host):
+            latest[sample.hostname] = sample
+        for hostname, sample in sorted(latest.items()):
+            print(format_sample(sample))
+        return
+
+    for hostname, rows in store.downsample(args.bucket, since, args.until, args.host).items():
+        print(hostname)
+        for bucket_start, samples, answered, stratum, rtt in rows:
+            rtt_text = "-" if rtt is None else f"{rtt * 1000:.1f} ms"
+            print(f"  {format_time(bucket_start)}  {answered}/{samples} answered  "
+                  f"stratum {'-' if stratum is None else stratum}  rtt {rtt_text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Async subprocess runner for external NTP tools (ntpdate, ntpq, chronyd).
+
+Runs commands concurrently under a global process budget with per-call
+timeouts. Output is handed to a line callback as it arrives so callers can
+stop a tool as soon as they have what they need; timed out, stopped and
+cancelled processes are always killed and reaped.
+"""
+
+import asyncio
+import os
+import signal
+from collections.abc import Callable, Sequence
+from typing import NamedTuple, Optional
+
+
+class RunResult(NamedTuple):
+    """Outcome of a single command."""
+    returncode: Optional[int]
+    lines: list[str]
+    timed_out: bool = False
+    stopped: bool = False
+
+
+class ProcessRunner:
+    """Run commands concurrently, never exceeding max_processes live children."""
+
+    def __init__(self, max_processes: int = 16):
+        # Each child holds three pipes, so this bounds open FDs as well as processes
+        self.budget = asyncio.Semaphore(max_processes)
+
+    async def run(
+        self,
+        argv: Sequence[str],
+        timeout: float,
+        on_line: Optional[Callable[[str], bool]] = None
+    ) -> RunResult:
+        """
+        Run argv and collect its combined stdout/stderr lines.
+
+        Args:
+            argv: Command and arguments (never passed through a shell)
+            timeout: Seconds before the process is killed
+            on_line: Called with each decoded line; returning True stops the process early
+
+        Returns:
+            RunResult with the exit status (None if killed) and lines seen so far
+        """
+        async with self.budget:
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *argv,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT,
+                    start_new_session=True
+                )
+            except OSError as e:
+                return RunResult(returncode=None, lines=[str(e)])
+
+            lines: list[str] = []
+            stopped = False
+
+            async def read_lines() -> None:
+                nonlocal stopped
+                while line := await proc.stdout.readline():
+                    text = line.decode(errors='replace').rstrip('\n')
+                    lines.append(text)
+                    if on_line is not None and on_line(text):
+                        stopped = True
+                        return
+
+            # One deadline covers reading and exiting, so a child that closes its output
+            # and lingers cannot stretch the run to twice the timeout
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            try:
+                await asyncio.wait_for(read_lines(), timeout)
+                if stopped:
+                    return RunResult(returncode=None, lines=lines, stopped=True)
+                returncode = await asyncio.wait_for(proc.wait(), max(0.0, deadline - loop.time()))
+                return RunResult(returncode=returncode, lines=lines)
+            except asyncio.TimeoutError:
+                return RunResult(returncode=None, lines=lines, timed_out=True)
+            finally:
+                # Runs on success, timeout, early stop and cancellation alike
+                if proc.returncode is None:
+                    try:
+                        # Kill the whole group so helper children cannot keep the pipe open
+                        os.killpg(proc.pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+                    await proc.wait()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+startupBench.py - Measure CLI startup cost of the scripts in this directory
+
+Runs each script's --help (or any given arguments) several times, reporting
+the median wall-clock time and the import time recorded by python -X importtime,
+with the heaviest top-level imports so regressions are easy to attribute.
+
+Usage: python3 startupBench.py [--runs N] [--top N] [script.py ...] [-- ARGS]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from statistics import median
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)$")
+
+
+def parse_importtime(stderr):
+    """
+    Parse -X importtime output
+    Returns (total cumulative microseconds of top-level imports, [(module, microseconds)])
+    """
+    top_level = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        # Nested imports are indented beyond the single separating space
+        if match and len(match.group(3)) == 1:
+            top_level.append((match.group(4), int(match.group(2))))
+    return sum(us for _, us in top_level), sorted(top_level, key=lambda item: -item[1])
+
+
+def bench(script, script_args, runs):
+    """Run script runs times; returns (median wall ms, median import ms, heaviest imports of the last run)"""
+    walls, imports = [], []
+    heaviest = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-X", "importtime", script, *script_args],
+                                capture_output=True, text=True, cwd=SCRIPT_DIR)
+        walls.append((time.perf_counter() - start) * 1000)
+        total, heaviest = parse_importtime(result.stderr)
+        imports.append(total / 1000)
+    return median(walls), median(imports), heaviest
+
+
+def main():
+    argv = sys.argv[1:]
+    script_args = ["--help"]
+    if "--" in argv:
+        script_args = argv[argv.index("--") + 1:]
+        argv = argv[:argv.index("--")]
+
+    parser = argparse.ArgumentParser(description="Benchmark script startup with -X importtime")
+    parser.add_argument("scripts", nargs="*", help="Scripts to measure (default: every *.py here)")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per script (default: 5)")
+    parser.add_argument("--top", type=int, default=3, help="Heaviest imports to list per script (default: 3)")
+    args = parser.parse_args(argv)
+
+    scripts = args.scripts or sorted(
+        name for name in os.listdir(SCRIPT_DIR)
+        if name.endswith(".py") and name != os.path.basename(__file__))
+
+    print("|Script|Wall (ms)|Imports (ms)|Heaviest imports|")
+    print("|---|---:|---:|---|")
+    for script in scripts:
+        wall, imports, heaviest = bench(os.path.join(SCRIPT_DIR, script), script_args, args.runs)
+        top = ", ".join(f"{module} {us / 1000:.1f}" for module, us in heaviest[:args.top])
+        print(f"|{script}|{wall:.1f}|{imports:.1f}|{top}|")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,10 @@
 #     "ntplib>=0.4.0",
 # ]
 # ///
+import argparse
 import yaml
-import ntplib
 import socket
-import requests
+import struct
 import time
 import re
 import sys
@@ -53,15 +53,32 @@ def write_yaml_with_formatting(data, filepath):
     with open(filepath, 'w', encoding='utf-8') as f:
         f.write('\n'.join(formatted_lines))
 
-def get_stratum(hostname):
+def get_stratum(hostname, retries=2, backoff=4):
+    # Imported on first use so --help and runs with nothing to probe start fast
+    import ntplib
+
     client = ntplib.NTPClient()
-    try:
-        response = client.request(hostname, version=3, timeout=2)
-        return response.stratum
-    except Exception:
-        return None
+    for attempt in range(retries + 1):
+        try:
+            response = client.request(hostname, version=3, timeout=2)
+        except Exception:
+            return None
+        if response.stratum != 0:
+            return response.stratum
+
+        # Stratum 0 is a Kiss-o'-Death reply; the reference ID carries the code
+        kiss = struct.pack("!I", response.ref_id).rstrip(b"\0").decode("ascii", errors="replace")
+        print(f"  Kiss-o'-Death {kiss} from {hostname}")
+        if kiss != "RATE" or attempt == retries:
+            # DENY/RSTR mean stop querying this server altogether
+            return None
+        # Honor RATE by backing off exponentially before asking again
+        time.sleep(backoff * 2 ** attempt)
+    return None
 
 def get_as_info(hostname):
+    import requests
+
     try:
         # Get all IP addresses for the hostname
         _, _, ip_list = socket.gethostbyname_ex(hostname)
@@ -93,7 +110,14 @@ def get_as_info(hostname):
     return None
 
 def main():
-    yaml_file = "ntp-sources.yml"
+    parser = argparse.ArgumentParser(description="Fill in Unknown stratum and AS values in ntp-sources.yml")
+    parser.add_argument("yaml_file", default="ntp-sources.yml", nargs="?",
+                        help="Path to the input YAML file (default: ntp-sources.yml)")
+    parser.add_argument("--dry-run", "-n", action="store_true",
+                        help="Show what would be updated without modifying the file")
+    args = parser.parse_args()
+
+    yaml_file = args.yaml_file
     if not os.path.exists(yaml_file):
         print(f"Error: {yaml_file} not found.")
         sys.exit(1)
@@ -133,7 +157,9 @@ def main():
                 else:
                     print(f"  Could not determine AS for {hostname}")
 
-    if updated:
+    if updated and args.dry_run:
+        print(f"\nDry run: {yaml_file} was not modified.")
+    elif updated:
         write_yaml_with_formatting(data, yaml_file)
         print(f"\nSuccessfully updated {yaml_file}")
     else:
@@ -2,8 +2,15 @@
 
 import yaml
 import argparse
-import subprocess
+import asyncio
 import re
+import time
+
+from asnReport import parse_as_field
+from ntpProbe import ProbeScheduler, format_ref_id, health_issues
+from processRunner import ProcessRunner
+from probeHistory import CLOSED, HALF_OPEN, OPEN, FailureHistory
+from probeStore import ProbeStore, Sample
 
 
 def load_yaml(file_path):
@@ -19,37 +26,173 @@ def extract_hostname(hostname_field):
     return hostname_field
 
 
-def verify_ntp_server(hostname):
-    print(f"Verifying {hostname} ...", end="", flush=True)
-    command = f"chronyd -Q -t 5 'server {hostname} iburst maxsamples 1'"
-    try:
-        result = subprocess.run(
-            command, shell=True, check=True, capture_output=True, text=True
-        )
+async def verify_ntp_server(runner, hostname, fast=False):
+    # chronyd exits on its own after -t; the runner timeout is a safety net
+    wait = 2 if fast else 5
+    command = ["chronyd", "-Q", "-t", str(wait), f"server {hostname} iburst maxsamples 1"]
+    result = await runner.run(command, timeout=wait + 5)
+    return hostname, result
+
+
+def report(hostname, result):
+    if result is None:
+        print(f"Verifying {hostname} ... Skipped (circuit open after repeated failures)")
+        print()
+        return
+    output = "\n".join(result.lines).strip()
+    print(f"Verifying {hostname} ...", end="")
+    if result.returncode == 0:
         print(" Good")
-        print(result.stdout.strip())
-    except subprocess.CalledProcessError as e:
+        print(output)
+    else:
         print(" Failed")
-        print(f"Error verifying {hostname}: {e}")
-        print(e.output.strip())
+        if result.timed_out:
+            print(f"Error verifying {hostname}: timed out")
+        else:
+            print(f"Error verifying {hostname}: chronyd returned non-zero exit status {result.returncode}")
+        print(output)
     print()  # Add a newline for better readability
 
 
+def is_usable(response):
+    # Stratum 0 is a Kiss-o'-Death reply and 16 means unsynchronized
+    return response is not None and 1 <= response.stratum <= 15
+
+
+def group_key(server):
+    # Hosts announcing several AS numbers share spacing with their lowest AS
+    asns, _ = parse_as_field(server.get("AS"))
+    if asns:
+        return f"AS{asns[0]}"
+    return server.get("owner") or server["hostname"]
+
+
+async def fast_verify_ntp_server(budget, scheduler, hostname, group, deadline):
+    return hostname, await scheduler.probe(hostname, group, budget=budget, deadline=deadline)
+
+
+def fast_report(hostname, outcome):
+    response = outcome.response
+    if outcome.kiss:
+        print(f"Verifying {hostname} ... Failed (Kiss-o'-Death {outcome.kiss})")
+    elif is_usable(response):
+        print(f"Verifying {hostname} ... Good ({response.address}, stratum {response.stratum}, "
+              f"ref {format_ref_id(response.ref_id, response.stratum)}, "
+              f"rtt {response.rtt * 1000:.1f} ms, offset {response.offset * 1000:+.1f} ms)")
+        for issue in health_issues(response):
+            print(f"  Warning: {issue}")
+    elif response is not None:
+        print(f"Verifying {hostname} ... Failed (replied with stratum {response.stratum})")
+    else:
+        print(f"Verifying {hostname} ... Failed (no valid reply)")
+
+
+async def fast_verify_all(hostnames, groups, max_concurrent, deadline, store=None, history=None):
+    budget = asyncio.Semaphore(max_concurrent)
+    # Probes to the same AS are spread out so a burst never hits one operator
+    scheduler = ProbeScheduler()
+    tasks = []
+    for hostname in hostnames:
+        if history and history.state(hostname, "ntp") == OPEN:
+            tasks.append(asyncio.create_task(skipped(hostname)))
+        else:
+            tasks.append(asyncio.create_task(
+                fast_verify_ntp_server(budget, scheduler, hostname, groups.get(hostname), deadline)))
+    failed = 0
+    samples = []
+    for task in tasks:
+        hostname, outcome = await task
+        if outcome is None:
+            print(f"Verifying {hostname} ... Skipped (circuit open after repeated failures)")
+            failed += 1
+            continue
+        fast_report(hostname, outcome)
+        failed += not is_usable(outcome.response)
+        # A kiss means the server is alive but refusing us, which is not a failure of the host
+        if history and not outcome.kiss:
+            history.record(hostname, "ntp", is_usable(outcome.response))
+        # Skipped and kissed probes say nothing about whether the server answers
+        if store and not outcome.skipped and not outcome.kiss:
+            response = outcome.response if is_usable(outcome.response) else None
+            samples.append(Sample(
+                hostname=hostname,
+                timestamp=outcome.timestamp or time.time(),
+                stratum=response and response.stratum,
+                rtt=response and response.rtt,
+                offset=response and response.offset,
+                leap=response and response.leap,
+                ref_id=response and format_ref_id(response.ref_id, response.stratum),
+                precision=response and response.precision,
+                root_delay=response and response.root_delay,
+                root_dispersion=response and response.root_dispersion,
+            ))
+    if store:
+        store.append(samples)
+    if history:
+        history.save()
+    return failed
+
+
+async def skipped(hostname):
+    return hostname, None
+
+
+async def verify_all(hostnames, max_processes, history=None):
+    runner = ProcessRunner(max_processes)
+    tasks = []
+    for hostname in hostnames:
+        state = history.state(hostname, "chrony") if history else CLOSED
+        if state == OPEN:
+            tasks.append(asyncio.create_task(skipped(hostname)))
+        else:
+            tasks.append(asyncio.create_task(verify_ntp_server(runner, hostname, fast=state == HALF_OPEN)))
+    # Report in list order while later hosts are still being checked
+    for task in tasks:
+        hostname, result = await task
+        report(hostname, result)
+        if history and result is not None:
+            history.record(hostname, "chrony", result.returncode == 0)
+    if history:
+        history.save()
+
+
 def main():
     parser = argparse.ArgumentParser(description="Verify NTP server connectivity")
     parser.add_argument("yaml_file", help="Path to the input YAML file")
     parser.add_argument("--hostname", help="Specific hostname to verify (optional)")
+    parser.add_argument("-j", "--max-processes", type=int, default=8,
+                        help="Maximum concurrent chronyd processes (default: 8)")
+    parser.add_argument("--fast", action="store_true",
+                        help="Liveness check only: native NTP probe that succeeds on the first valid reply")
+    parser.add_argument("--deadline", type=float, default=0.5,
+                        help="Per-host deadline in seconds for --fast, not counting DNS (default: 0.5)")
+    parser.add_argument("--fast-concurrency", type=int, default=64,
+                        help="Maximum probes in flight for --fast (default: 64)")
+    parser.add_argument("--store", metavar="DIR",
+                        help="Append --fast results (stratum, reference ID, leap, root delay/dispersion, rtt, offset) "
+                             "to the probe history store in DIR")
+    parser.add_argument("--history", metavar="FILE",
+                        help="Probe failure history file; hosts that keep failing are backed off and skipped")
 
     args = parser.parse_args()
 
     data = load_yaml(args.yaml_file)
+    history = FailureHistory.load(args.history) if args.history else None
 
     if args.hostname:
-        verify_ntp_server(args.hostname)
+        hostnames = [args.hostname]
     else:
         hostnames = [extract_hostname(server["hostname"]) for server in data["servers"]]
-        for hostname in hostnames:
-            verify_ntp_server(hostname)
+    if args.fast:
+        groups = {extract_hostname(server["hostname"]): group_key(server) for server in data["servers"]}
+        store = None
+        if args.store:
+            store = ProbeStore(args.store)
+        failed = asyncio.run(fast_verify_all(hostnames, groups, args.fast_concurrency, args.deadline, store, history))
+        print(f"\n{len(hostnames) - failed} of {len(hostnames)} servers answered")
+        return
+
+    asyncio.run(verify_all(hostnames, args.max_processes, history))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,22 @@
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# The scripts import their siblings directly, as they do when run from scripts/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+
+@pytest.fixture(scope="session")
+def certificate(tmp_path_factory):
+    """Self-signed certificate and key for localhost, for local TLS servers"""
+    if shutil.which("openssl") is None:
+        pytest.skip("openssl not available")
+    directory = tmp_path_factory.mktemp("tls")
+    cert, key = directory / "cert.pem", directory / "key.pem"
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "30",
+                    "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost",
+                    "-keyout", str(key), "-out", str(cert)], check=True, capture_output=True)
+    return cert, key
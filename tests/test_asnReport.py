@@ -0,0 +1,32 @@
+from asnReport import normalize_all, parse_all_as_fields, parse_as_field
+from ntpUpdateSources import normalize_as_numbers
+
+
+def test_parse_as_field():
+    assert parse_as_field("AS104, as49,AS104") == ((49, 104), [])
+    assert parse_as_field("Unknown") == ((), [])
+    assert parse_as_field("AS12, 7018, ASx") == ((12,), ["7018", "ASx"])
+
+
+def test_normalize_all_updates_every_duplicate():
+    servers = [
+        {"hostname": "time.example.com", "AS": "AS2,AS1"},
+        {"notes": "entry without hostname"},
+        {"hostname": "time.example.com", "AS": "AS3, AS1"},
+    ]
+    changes = normalize_all(servers, parse_all_as_fields(servers))
+    assert [server.get("AS") for server in servers] == ["AS1, AS2", None, "AS1, AS3"]
+    assert changes == [("time.example.com", "AS2,AS1", "AS1, AS2"),
+                       ("time.example.com", "AS3, AS1", "AS1, AS3")]
+
+
+def test_normalize_all_leaves_malformed_entries():
+    servers = [{"hostname": "a.example.com", "AS": "AS2, bogus"}]
+    assert normalize_all(servers, parse_all_as_fields(servers)) == []
+    assert servers[0]["AS"] == "AS2, bogus"
+
+
+def test_ntp_update_sources_uses_same_normalization():
+    assert normalize_as_numbers("AS104, AS49") == "AS49, AS104"
+    assert normalize_as_numbers("Unknown") is None
+    assert normalize_as_numbers(None) is None
@@ -0,0 +1,73 @@
+import asyncio
+import socket
+import ssl
+
+import linkCheck
+from linkCheck import TlsCollector, create_session
+
+RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n"
+
+
+async def serve(cert, key):
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+
+    async def handle(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(RESPONSE)
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0, ssl=context)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def check(hostnames, certificate):
+    cert, key = certificate
+
+    async def run():
+        servers = [await serve(cert, key) for _ in hostnames]
+        tls = TlsCollector()
+        tls.context.load_verify_locations(cert)
+        async with create_session(5.0, 10, tls) as session:
+            await asyncio.gather(*(linkCheck.test_https_connectivity(session, hostname.format(port=port), tls=tls)
+                                   for hostname, (_, port) in zip(hostnames, servers)))
+        for server, _ in servers:
+            server.close()
+        return tls.metadata
+
+    return asyncio.run(run())
+
+
+def test_concurrent_requests_to_one_host_keep_their_handshakes(certificate):
+    # Same server_hostname on two ports: each request must get its own handshake
+    metadata = check(["localhost:{port}", "localhost:{port}"], certificate)
+    assert len(metadata) == 2
+    for entry in metadata.values():
+        assert entry["status"] == 200
+        assert entry["subject"] == "localhost"
+        assert entry["days_left"] is not None
+        assert entry["tls_time"] is not None
+
+
+def test_certificate_error_has_no_tls_details(certificate):
+    (entry,) = check(["127.0.0.1:{port}"], certificate).values()
+    assert entry["status"] is None
+    assert entry["error"].startswith("certificate")
+    assert entry["issuer"] is None
+
+
+def test_cached_resolver_answers_from_the_cache():
+    async def run():
+        resolver = linkCheck.cached_resolver({"cached.test": ["192.0.2.1", "2001:db8::1"]})
+        try:
+            return (await resolver.resolve("cached.test", 443, socket.AF_UNSPEC),
+                    await resolver.resolve("cached.test", 443, socket.AF_INET),
+                    await resolver.resolve("127.0.0.1", 443, socket.AF_INET))
+        finally:
+            await resolver.close()
+
+    both, ipv4, uncached = asyncio.run(run())
+    assert [entry["host"] for entry in both] == ["192.0.2.1", "2001:db8::1"]
+    assert [(entry["host"], entry["port"]) for entry in ipv4] == [("192.0.2.1", 443)]
+    assert [entry["host"] for entry in uncached] == ["127.0.0.1"]
@@ -0,0 +1,61 @@
+from pathlib import Path
+
+import pytest
+
+from asnReport import parse_as_field
+from ntpBinary import STRATUM_UNKNOWN, NtpSourcesBinary, generate_binary, write_binary
+from ntpServerConvertor import extract_hostname, load_yaml
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def normalized(server):
+    """What the binary export keeps of an entry"""
+    return {
+        "hostname": extract_hostname(server["hostname"]),
+        "AS": parse_as_field(server["AS"])[0],
+        "stratum": server["stratum"],
+        "location": server["location"],
+        "owner": server["owner"],
+        "notes": server.get("notes", ""),
+        "vm": server.get("vm", False),
+    }
+
+
+def test_round_trip_through_mmap(tmp_path):
+    data = load_yaml(ROOT / "ntp-sources.yml")
+    write_binary(data, tmp_path / "ntp-sources.bin")
+    view = NtpSourcesBinary.open(tmp_path / "ntp-sources.bin")
+    assert view.server_count == len(data["servers"])
+    read = [view.server(i) for i in range(view.server_count)]
+    assert [dict(server, AS=parse_as_field(server["AS"])[0]) for server in read] == \
+        [normalized(server) for server in data["servers"]]
+
+
+def test_select_matches_a_linear_scan(tmp_path):
+    data = load_yaml(ROOT / "ntp-sources.yml")
+    view = NtpSourcesBinary(generate_binary(data))
+    servers = [normalized(server) for server in data["servers"]]
+    assert [view.server(i)["hostname"] for i in view.select(location="Germany", stratum=1, vm=False)] == [
+        server["hostname"] for server in servers
+        if server["location"] == "Germany" and server["stratum"] == 1 and not server["vm"]]
+
+
+def test_unknown_and_out_of_range_stratum_read_back_as_unknown():
+    data = {"servers": [{"hostname": "a.example.com", "stratum": "Unknown"},
+                        {"hostname": "b.example.com", "stratum": STRATUM_UNKNOWN + 1}]}
+    view = NtpSourcesBinary(generate_binary(data))
+    assert [view.server(i)["stratum"] for i in range(2)] == ["Unknown", "Unknown"]
+
+
+def test_fields_that_do_not_fit_are_a_clear_error():
+    too_many = ", ".join(f"AS{asn}" for asn in range(1, 0x10001 + 1))
+    with pytest.raises(ValueError, match="a.example.com: AS count 65537 does not fit"):
+        generate_binary({"servers": [{"hostname": "a.example.com", "AS": too_many}]})
+    with pytest.raises(ValueError, match="location count 65536 does not fit"):
+        generate_binary({"servers": [{"hostname": f"{i}.example.com", "location": str(i)} for i in range(0x10001)]})
+
+
+def test_rejects_other_files():
+    with pytest.raises(ValueError, match="Not an NTP sources binary file"):
+        NtpSourcesBinary(b"\0" * 64)
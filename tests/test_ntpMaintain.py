@@ -0,0 +1,65 @@
+import asyncio
+import copy
+import json
+
+import linkCheck
+from ntpMaintain import StageTimer, merge_lookups
+from ntpUpdateSources import get_as_numbers_batch, get_strata
+from probeReplay import ProbeArchive
+
+DATA = {"servers": [
+    {"hostname": "a.example.com", "AS": "Unknown", "stratum": "Unknown", "location": "US", "owner": "A"},
+    {"hostname": "[b.example.com](https://b.example.com)", "AS": "AS64501", "stratum": 1,
+     "location": "US", "owner": "B"},
+]}
+
+
+def recording():
+    archive = ProbeArchive(replaying=True)
+    archive.record("asnmap", "a.example.com", [json.dumps({"input": "a.example.com", "as_number": "AS64500"})])
+    archive.record("process", "ntpdate -q a.example.com", {
+        "returncode": 0, "timed_out": False,
+        "lines": ["2025-05-23 02:57:29.980318 (+0000) +0.000214 +/- 0.003723 a.example.com 192.0.2.1 s2 no-leap"]})
+    archive.record("https", "a.example.com", {"status": 200, "metadata": None})
+    archive.record("https", "b.example.com", {"error": "timeout", "metadata": None})
+    return archive
+
+
+def lookups(data, archive):
+    hostnames = ["a.example.com", "b.example.com"]
+
+    async def run():
+        strata = await get_strata(hostnames, archive=archive)
+        links = await linkCheck.process_all_hostnames(linkCheck.extract_hostname_info(data), 5.0, archive=archive)
+        return strata, links
+
+    return (get_as_numbers_batch(hostnames, archive), *asyncio.run(run()))
+
+
+def test_merge_applies_every_stage():
+    data = copy.deepcopy(DATA)
+    updated, changes = merge_lookups(data, *lookups(data, recording()))
+    assert updated
+    assert {(change.field, change.hostname) for change in changes} == {("AS", "a.example.com"),
+                                                                       ("stratum", "a.example.com")}
+    assert data["servers"][0] == {"hostname": "[a.example.com](https://a.example.com)", "AS": "AS64500",
+                                  "stratum": 2, "location": "US", "owner": "A"}
+    assert data["servers"][1]["hostname"] == "b.example.com"
+    assert data["servers"][1]["AS"] == "AS64501"
+
+
+def test_merge_dry_run_changes_nothing():
+    data = copy.deepcopy(DATA)
+    updated, changes = merge_lookups(data, *lookups(data, recording()), dry_run=True)
+    assert updated and len(changes) == 2
+    assert data == DATA
+
+
+def test_stage_timer_records_failed_stages():
+    timer = StageTimer()
+    try:
+        with timer("asn"):
+            raise RuntimeError("asnmap failed")
+    except RuntimeError:
+        pass
+    assert set(timer.timings) == {"asn"}
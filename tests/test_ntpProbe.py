@@ -0,0 +1,99 @@
+import asyncio
+import struct
+import time
+
+import ntpProbe
+from ntpProbe import NTP_PACKET, build_request, parse_response, probe, to_ntp_time
+from probeHistory import FAILURE_THRESHOLD, FailureHistory
+from verifyNTPServers import fast_verify_all
+
+
+def reply(request, stratum=2, ref_id=b"\x0a\x00\x00\x01", leap=0):
+    now = to_ntp_time(time.time())
+    origin = struct.unpack("!Q", request[40:48])[0]
+    return NTP_PACKET.pack((leap << 6) | (4 << 3) | 4, stratum, 6, -20, 0x8000, 0x4000, ref_id,
+                           now, origin, now, now)
+
+
+class FakeServer(asyncio.DatagramProtocol):
+    def __init__(self, **fields):
+        self.fields = fields
+        self.requests = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.requests += 1
+        self.transport.sendto(reply(data, **self.fields), addr)
+
+
+async def serve(**fields):
+    loop = asyncio.get_running_loop()
+    transport, server = await loop.create_datagram_endpoint(lambda: FakeServer(**fields), local_addr=("127.0.0.1", 0))
+    return transport, server, transport.get_extra_info("sockname")[1]
+
+
+def test_parse_response_checks_origin():
+    transmit = to_ntp_time(time.time())
+    data = reply(build_request(transmit))
+    assert parse_response(data, "192.0.2.1", {}, time.time()) is None
+    response = parse_response(data, "192.0.2.1", {transmit: time.time()}, time.time())
+    assert (response.stratum, response.root_delay, response.root_dispersion) == (2, 0.5, 0.25)
+    assert ntpProbe.format_ref_id(response.ref_id, response.stratum) == "10.0.0.1"
+
+
+def test_probe_answers():
+    async def run():
+        transport, server, port = await serve()
+        try:
+            return await probe("127.0.0.1", deadline=1.0, port=port), server.requests
+        finally:
+            transport.close()
+
+    response, requests = asyncio.run(run())
+    assert response is not None and response.stratum == 2
+    assert requests >= 1
+
+
+def test_slow_resolution_does_not_use_up_the_deadline(monkeypatch):
+    async def run():
+        transport, _, port = await serve()
+        loop = asyncio.get_running_loop()
+        resolve = loop.getaddrinfo
+
+        async def slow_getaddrinfo(*args, **kwargs):
+            # Stands in for a lookup queued behind others in the thread pool
+            await asyncio.sleep(0.3)
+            return await resolve(*args, **kwargs)
+
+        monkeypatch.setattr(loop, "getaddrinfo", slow_getaddrinfo)
+        try:
+            return await probe("127.0.0.1", deadline=0.2, port=port)
+        finally:
+            transport.close()
+
+    assert asyncio.run(run()) is not None
+
+
+def test_resolution_has_its_own_timeout(monkeypatch):
+    async def run():
+        loop = asyncio.get_running_loop()
+
+        async def hanging_getaddrinfo(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        monkeypatch.setattr(loop, "getaddrinfo", hanging_getaddrinfo)
+        return await probe("ntp.example.com", deadline=0.1, resolve_timeout=0.1)
+
+    assert asyncio.run(run()) is None
+
+
+def test_fast_mode_skips_open_circuits(capsys):
+    history = FailureHistory()
+    for _ in range(FAILURE_THRESHOLD):
+        history.record("dead.example.com", "ntp", False)
+    failed = asyncio.run(fast_verify_all(["dead.example.com"], {}, 4, 0.1, history=history))
+    assert failed == 1
+    assert "Skipped (circuit open" in capsys.readouterr().out
+    assert history.entries["dead.example.com"]["ntp"]["failures"] == FAILURE_THRESHOLD
@@ -0,0 +1,83 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from asnReport import parse_as_field
+from ntpQuery import ServerIndex
+from ntpServerConvertor import load_yaml
+
+ROOT = Path(__file__).resolve().parent.parent
+QUERY = ROOT / "scripts" / "ntpQuery.py"
+
+
+@pytest.fixture(scope="module")
+def servers():
+    servers = load_yaml(ROOT / "ntp-sources.yml")["servers"]
+    # The list has no NTS entries yet; flag a few so both sides of the filter are exercised
+    return [dict(server, nts=True) if i % 3 == 0 else server for i, server in enumerate(servers)]
+
+
+def scan(servers, locations=None, owners=None, strata=None, asns=None, exclude_asns=None, vm=None, nts=None):
+    """The linear scan the index must agree with"""
+    matches = []
+    for i, server in enumerate(servers):
+        server_asns = parse_as_field(server.get("AS"))[0]
+        if locations and str(server.get("location", "")).lower() not in {l.lower() for l in locations}:
+            continue
+        if owners and str(server.get("owner", "")).lower() not in {o.lower() for o in owners}:
+            continue
+        if strata and server.get("stratum") not in strata:
+            continue
+        if asns and not set(asns) & set(server_asns):
+            continue
+        if exclude_asns and set(exclude_asns) & set(server_asns):
+            continue
+        if vm is not None and bool(server.get("vm", False)) != vm:
+            continue
+        if nts is not None and bool(server.get("nts", False)) != nts:
+            continue
+        matches.append(i)
+    return matches
+
+
+def test_every_single_value_filter_matches_a_scan(servers):
+    index = ServerIndex(servers)
+    queries = [{"locations": [server["location"].upper()]} for server in servers]
+    queries += [{"owners": [server["owner"]]} for server in servers]
+    queries += [{"strata": [server["stratum"]]} for server in servers]
+    queries += [{"vm": flag} for flag in (True, False)] + [{"nts": flag} for flag in (True, False)]
+    for query in queries:
+        assert index.query(**query) == scan(servers, **query), query
+
+
+def test_combined_filters_match_a_scan(servers):
+    index = ServerIndex(servers)
+    location, owner = servers[0]["location"], servers[0]["owner"]
+    asn = parse_as_field(servers[0]["AS"])[0][0]
+    queries = [
+        {"locations": [location, "nowhere"], "strata": [1, 2, "Unknown"], "nts": True},
+        {"locations": [location], "vm": False, "nts": False},
+        {"owners": [owner.lower()], "strata": [1]},
+        {"asns": [asn], "nts": True},
+        {"exclude_asns": [asn], "locations": [location]},
+        {"locations": ["nowhere"]},
+        {},
+    ]
+    for query in queries:
+        assert index.query(**query) == scan(servers, **query), query
+    assert index.query() == list(range(len(servers)))
+
+
+def test_cli_nts_filter(tmp_path):
+    (tmp_path / "sources.yml").write_text(
+        "servers:\n"
+        "  - {hostname: a.example.com, AS: AS1, stratum: 1, location: Germany, owner: A, nts: true}\n"
+        "  - {hostname: b.example.com, AS: AS1, stratum: 1, location: Germany, owner: B}\n")
+
+    def run(*options):
+        return subprocess.run([sys.executable, QUERY, "sources.yml", *options],
+                              cwd=tmp_path, capture_output=True, text=True, check=True).stdout
+    assert run("--nts") == "a.example.com\n"
+    assert run("--no-nts", "--location", "germany") == "b.example.com\n"
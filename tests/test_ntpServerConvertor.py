@@ -0,0 +1,53 @@
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from ntpServerConvertor import load_yaml, select_servers, shard_slugs, write_shards
+
+ROOT = Path(__file__).resolve().parent.parent
+CONVERTOR = ROOT / "scripts" / "ntpServerConvertor.py"
+
+
+def server(hostname, location, vm=False):
+    return {"hostname": hostname, "AS": "AS1", "stratum": 1, "location": location,
+            "owner": "Example", "notes": "", "vm": vm}
+
+
+def test_shard_slug_collision_is_an_error():
+    with pytest.raises(ValueError, match="both map to 'new-york'"):
+        shard_slugs({"New York": [], "new-york": []})
+
+
+def test_write_shards(tmp_path):
+    data = {"servers": [server("a.example.com", "Germany"), server("b.example.com", "Apple NTP")]}
+    assert write_shards(data, tmp_path) == 4
+    assert sorted(p.name for p in (tmp_path / "location").iterdir()) == [
+        "apple-ntp.conf", "apple-ntp.toml", "germany.conf", "germany.toml"]
+    assert "server a.example.com iburst" in (tmp_path / "continent" / "europe.conf").read_text()
+
+
+def test_select_servers_prefers_non_vm():
+    data = {"servers": [server("vm.example.com", "US", vm=True), server("hw.example.com", "US")]}
+    assert [s["hostname"] for s in select_servers(data, max_per_group=1)["servers"]] == ["hw.example.com"]
+
+
+def test_shard_options_require_shard_dir(tmp_path):
+    result = subprocess.run([sys.executable, CONVERTOR, "--location", "US", "ntp-sources.yml"],
+                            cwd=tmp_path, capture_output=True, text=True)
+    assert result.returncode == 2
+    assert "only apply to --shard-dir" in result.stderr
+
+
+def test_output_matches_committed_files(tmp_path):
+    for name in ("ntp-sources.yml", "README.md", "chrony.conf", "ntp.toml"):
+        shutil.copy(ROOT / name, tmp_path / name)
+    subprocess.run([sys.executable, CONVERTOR], cwd=tmp_path, check=True, capture_output=True)
+    for name in ("README.md", "chrony.conf", "ntp.toml"):
+        assert (tmp_path / name).read_bytes() == (ROOT / name).read_bytes(), name
+
+
+def test_load_yaml_reads_the_list():
+    assert len(load_yaml(ROOT / "ntp-sources.yml")["servers"]) > 100
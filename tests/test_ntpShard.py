@@ -0,0 +1,91 @@
+import asyncio
+import json
+import os
+import struct
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from ntpProbe import NTP_PACKET, to_ntp_time
+from ntpShard import merge_results, shard_hostnames, shard_of
+
+SHARD = Path(__file__).resolve().parent.parent / "scripts" / "ntpShard.py"
+HOSTNAMES = [f"127.0.0.{i}" for i in range(1, 25)] + ["192.0.2.1"]
+
+
+class StratumTwoServer(asyncio.DatagramProtocol):
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        now = to_ntp_time(time.time())
+        origin = struct.unpack("!Q", data[40:48])[0]
+        self.transport.sendto(NTP_PACKET.pack(0x24, 2, 6, -20, 0, 0, b"\x0a\x00\x00\x01", now, origin, now, now), addr)
+
+
+def sources(hostnames):
+    return {"servers": [{"hostname": hostname} for hostname in hostnames]}
+
+
+def test_shard_of_is_stable_across_processes_and_case():
+    code = "import sys; from ntpShard import shard_of; print([shard_of(h, 7) for h in sys.argv[1:]])"
+    expected = [shard_of(hostname, 7) for hostname in HOSTNAMES]
+    for seed in ("0", "1", "random"):
+        result = subprocess.run([sys.executable, "-c", code, *HOSTNAMES], capture_output=True, text=True, check=True,
+                                cwd=SHARD.parent, env={**os.environ, "PYTHONHASHSEED": seed})
+        assert json.loads(result.stdout) == expected
+    assert shard_of("NTP.Example.com", 7) == shard_of("ntp.example.com", 7)
+
+
+def test_shards_partition_the_list_in_any_order():
+    for shards in (1, 3, 8):
+        split = [shard_hostnames(sources(HOSTNAMES), shard, shards) for shard in range(shards)]
+        assert sorted(sum(split, [])) == sorted(HOSTNAMES)
+        reversed_split = [shard_hostnames(sources(HOSTNAMES[::-1]), shard, shards) for shard in range(shards)]
+        assert [sorted(hosts) for hosts in reversed_split] == [sorted(hosts) for hosts in split]
+
+
+def test_merge_keeps_the_latest_record_per_vantage():
+    def record(vantage, timestamp, stratum, rtt):
+        return {"hostname": "a.example.com", "vantage": vantage, "timestamp": timestamp, "stratum": stratum,
+                "rtt": rtt, "offset": 0.0, "address": "192.0.2.1", "kiss": None}
+
+    report = merge_results([record("fra1", 2, 2, 0.02), record("fra1", 1, 1, 0.01), record("sfo1", 1, None, None)])
+    server = report["servers"]["a.example.com"]
+    assert report["vantages"] == ["fra1", "sfo1"]
+    assert (server["reachable_from"], server["vantages_probed"], server["best_rtt"], server["strata"]) == (1, 2, 0.02, [2])
+
+
+def without_timings(report):
+    """The merged report minus the fields that vary from one probe to the next"""
+    for server in report["servers"].values():
+        del server["best_rtt"], server["median_rtt"]
+        for result in server["vantages"].values():
+            del result["rtt"], result["offset"]
+    return report
+
+
+def test_local_shards_merge_like_a_single_shard(tmp_path):
+    (tmp_path / "ntp-sources.yml").write_text(
+        "servers:\n" + "".join(f"  - hostname: {hostname}\n" for hostname in HOSTNAMES))
+
+    async def run(workers):
+        loop = asyncio.get_running_loop()
+        # Every 127.0.0.x address reaches the one wildcard-bound fake server
+        transport, _ = await loop.create_datagram_endpoint(StratumTwoServer, local_addr=("0.0.0.0", 0))
+        try:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, SHARD, "local", "ntp-sources.yml", "--workers", str(workers), "--vantage", "test",
+                "--deadline", "0.5", "--port", str(transport.get_extra_info("sockname")[1]),
+                "-o", f"report-{workers}.json", cwd=tmp_path)
+            assert await process.wait() == 0
+        finally:
+            transport.close()
+        return json.loads((tmp_path / f"report-{workers}.json").read_text())
+
+    single = asyncio.run(run(1))
+    assert sorted(single["servers"]) == sorted(HOSTNAMES)
+    assert single["servers"]["127.0.0.1"]["strata"] == [2]
+    assert single["servers"]["192.0.2.1"]["reachable_from"] == 0
+    assert without_timings(asyncio.run(run(4))) == without_timings(single)
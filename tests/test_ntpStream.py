@@ -0,0 +1,60 @@
+import asyncio
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+import yaml
+
+from ntpStream import iter_servers, run_bounded
+
+LINK_CHECK = Path(__file__).resolve().parent.parent / "scripts" / "linkCheck.py"
+
+
+async def echo(item):
+    return item
+
+
+def run(items, concurrency=2):
+    results = []
+    processed = asyncio.run(run_bounded(items, echo, concurrency, lambda item, result: results.append(result)))
+    return processed, results
+
+
+def test_iter_servers_yields_entries(tmp_path):
+    path = tmp_path / "servers.yml"
+    path.write_text("title: x\nservers:\n  - hostname: a.example.com\n  - hostname: b.example.com\n")
+    assert [server["hostname"] for server in iter_servers(path)] == ["a.example.com", "b.example.com"]
+    assert sorted(run(iter_servers(path))[1], key=str) == [{"hostname": "a.example.com"}, {"hostname": "b.example.com"}]
+
+
+def test_top_level_list_is_a_plain_value_error(tmp_path):
+    path = tmp_path / "servers.yml"
+    path.write_text("- hostname: a.example.com\n")
+    with pytest.raises(ValueError, match="expected a mapping"):
+        run(iter_servers(path))
+
+
+def test_broken_yaml_is_a_plain_yaml_error(tmp_path):
+    path = tmp_path / "servers.yml"
+    path.write_text("servers:\n  - hostname: a.example.com\n  - hostname: [unclosed\n")
+    with pytest.raises(yaml.YAMLError):
+        run(iter_servers(path))
+
+
+def test_worker_error_without_on_error_is_re_raised():
+    async def fail(item):
+        raise RuntimeError(item)
+
+    with pytest.raises(RuntimeError, match="boom"):
+        asyncio.run(run_bounded(["boom"], fail, 2, lambda item, result: None))
+
+
+def test_link_check_stream_reports_load_errors(tmp_path):
+    path = tmp_path / "servers.yml"
+    path.write_text("- hostname: a.example.com\n")
+    result = subprocess.run([sys.executable, LINK_CHECK, str(path), "--stream", str(tmp_path / "out.ndjson")],
+                            capture_output=True, text=True)
+    assert result.returncode == 1
+    assert "✗ Error:" in result.stdout
+    assert "Traceback" not in result.stderr
@@ -0,0 +1,117 @@
+import json
+import subprocess
+
+import ntpUpdateSources
+from ntpUpdateSources import (Change, format_change_report_markdown, get_as_numbers_batch, parse_asnmap_output,
+                              summarize_changes, write_change_report_json)
+from probeReplay import ProbeArchive
+
+
+def asnmap_line(hostname, as_number, **fields):
+    return json.dumps({"input": hostname, "as_number": as_number, **fields})
+
+
+def test_parse_collects_every_as_of_an_input():
+    output = "\n".join([asnmap_line("A.example.com", "AS64500"), asnmap_line("a.example.com", "as64501"),
+                        asnmap_line("a.example.com", "AS64500"), asnmap_line("b.example.com", "64502")])
+    assert parse_asnmap_output(output) == {"a.example.com": {64500, 64501}, "b.example.com": {64502}}
+
+
+def test_parse_skips_missing_and_malformed_as():
+    output = "\n".join([
+        json.dumps({"input": "a.example.com"}),
+        asnmap_line("b.example.com", None),
+        asnmap_line("c.example.com", ""),
+        asnmap_line("d.example.com", "ASx"),
+        asnmap_line("", "AS64500"),
+        "",
+        "[INF] not json",
+        "{truncated",
+        json.dumps(["e.example.com", "AS64500"]),
+        json.dumps("AS64500"),
+        asnmap_line("f.example.com", "AS64503"),
+    ])
+    assert parse_asnmap_output(output) == {"f.example.com": {64503}}
+
+
+def test_batch_from_replay_formats_and_reports_missing():
+    archive = ProbeArchive(replaying=True)
+    archive.record("asnmap", "a.example.com", [asnmap_line("a.example.com", "AS64501"),
+                                               asnmap_line("a.example.com", "AS64500")])
+    archive.record("asnmap", "b.example.com", ["{truncated", asnmap_line("b.example.com", None)])
+    lookup = get_as_numbers_batch(["a.example.com", "A.example.com", "b.example.com", "c.example.com",
+                                   "a.example.com"], archive=archive)
+    assert lookup == {"a.example.com": "AS64500, AS64501", "A.example.com": "AS64500, AS64501",
+                      "b.example.com": None, "c.example.com": None}
+
+
+def test_batch_records_raw_lines_per_hostname(monkeypatch):
+    output = "\n".join([asnmap_line("a.example.com", "AS64500"), "[INF] banner",
+                        asnmap_line("a.example.com", "AS64501"), asnmap_line("other.example.com", "AS1")])
+
+    def fake_asnmap(cmd, **kwargs):
+        assert cmd[0] == "asnmap"
+        return subprocess.CompletedProcess(cmd, 0, stdout=output, stderr="")
+
+    monkeypatch.setattr(ntpUpdateSources.subprocess, "run", fake_asnmap)
+    archive = ProbeArchive()
+    assert get_as_numbers_batch(["a.example.com", "b.example.com"], archive=archive) == {
+        "a.example.com": "AS64500, AS64501", "b.example.com": None}
+    assert archive.lookup("asnmap", "a.example.com") == [asnmap_line("a.example.com", "AS64500"),
+                                                          asnmap_line("a.example.com", "AS64501")]
+    assert archive.lookup("asnmap", "b.example.com") == []
+    assert archive.lookup("asnmap", "other.example.com") is None
+
+    archive.replaying = True
+    monkeypatch.setattr(ntpUpdateSources.subprocess, "run", None)
+    assert get_as_numbers_batch(["a.example.com", "b.example.com"], archive=archive) == {
+        "a.example.com": "AS64500, AS64501", "b.example.com": None}
+
+
+CHANGES = [
+    Change("REPLACE", "AS", "a.example.com", "Germany", "Unknown", "AS64500"),
+    Change("UPDATE", "stratum", "b.example.com", "US", 2, 1),
+    Change("ADD", "stratum", "a.example.com", "Germany", None, 2),
+    Change("UPDATE", "AS", "c.example.com", "Germany", "AS1", "AS1, AS2"),
+]
+
+
+def test_summary_counts_in_first_seen_order():
+    by_action, by_location = summarize_changes(CHANGES)
+    assert list(by_action.items()) == [("REPLACE", 1), ("UPDATE", 2), ("ADD", 1)]
+    assert list(by_location.items()) == [("Germany", 3), ("US", 1)]
+    assert summarize_changes([]) == ({}, {})
+
+
+def test_json_report(tmp_path):
+    path = tmp_path / "changes.json"
+    write_change_report_json(CHANGES, path, dry_run=True)
+    report = json.loads(path.read_text())
+    assert report["dry_run"] is True and report["total"] == 4
+    assert report["by_action"] == {"REPLACE": 1, "UPDATE": 2, "ADD": 1}
+    assert report["by_location"] == {"Germany": 3, "US": 1}
+    assert report["changes"][2] == {"action": "ADD", "field": "stratum", "hostname": "a.example.com",
+                                    "location": "Germany", "old": None, "new": 2}
+
+    write_change_report_json([], path)
+    assert json.loads(path.read_text()) == {"dry_run": False, "total": 0, "by_action": {}, "by_location": {},
+                                            "changes": []}
+
+
+def test_markdown_report():
+    lines = format_change_report_markdown(CHANGES).splitlines()
+    assert lines[:7] == ["4 changes made to `ntp-sources.yml`.", "", "|Change|Count|", "|---|:---:|",
+                         "|REPLACE|1|", "|UPDATE|2|", "|ADD|1|"]
+    germany = lines.index("### Germany (3)")
+    us = lines.index("### US (1)")
+    assert germany < us
+    assert lines[germany + 4:us - 1] == ["|a.example.com|AS|REPLACE|Unknown|AS64500|",
+                                         "|a.example.com|stratum|ADD||2|",
+                                         "|c.example.com|AS|UPDATE|AS1|AS1, AS2|"]
+    assert lines[us + 4:] == ["|b.example.com|stratum|UPDATE|2|1|"]
+    assert format_change_report_markdown(CHANGES, dry_run=True).startswith("4 changes would be made")
+
+
+def test_markdown_report_without_changes():
+    assert format_change_report_markdown([]) == "No changes to NTP sources.\n"
+    assert format_change_report_markdown([], dry_run=True) == "No changes to NTP sources.\n"
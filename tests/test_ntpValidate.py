@@ -0,0 +1,68 @@
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+from ntpValidate import ERROR, WARNING, validate
+
+ROOT = Path(__file__).resolve().parent.parent
+CONVERTOR = ROOT / "scripts" / "ntpServerConvertor.py"
+
+
+def entry(hostname, **fields):
+    return {"hostname": hostname, "AS": "AS1", "stratum": 1, "location": "Germany", "owner": "Example", **fields}
+
+
+def test_notes_and_vm_are_optional():
+    assert validate({"servers": [entry("a.example.com"), entry("b.example.com", notes="", vm=True)]}) == []
+
+
+def test_optional_fields_are_still_type_checked():
+    problems = validate({"servers": [entry("a.example.com", vm="yes")]})
+    assert [(problem.severity, problem.field) for problem in problems] == [(ERROR, "vm")]
+
+
+def test_unsynchronized_stratum_and_ip_literals_are_valid():
+    servers = [entry("192.0.2.1"), entry("[2001:db8::1](https://ntp.example.com)"), entry("a.example.com", stratum=16)]
+    assert validate({"servers": servers}) == []
+    assert [problem.field for problem in validate({"servers": [entry("a.example.com", stratum=17)]})] == ["stratum"]
+
+
+def test_unknown_field_is_a_warning():
+    problems = validate({"servers": [entry("a.example.com", comment="x")]})
+    assert [(problem.severity, problem.field) for problem in problems] == [(WARNING, "comment")]
+
+
+def test_missing_required_field():
+    server = entry("a.example.com")
+    del server["owner"]
+    assert [problem.message for problem in validate({"servers": [server]})] == ["missing field 'owner'"]
+
+
+def write_sources(directory, servers):
+    shutil.copy(ROOT / "README.md", directory / "README.md")
+    lines = ["servers:"]
+    for server in servers:
+        lines.append(f"  - hostname: {server.pop('hostname')}")
+        lines += [f"    {field}: {value!r}" if isinstance(value, str) else f"    {field}: {value}"
+                  for field, value in server.items()]
+    (directory / "ntp-sources.yml").write_text("\n".join(lines) + "\n")
+
+
+def test_convertor_ignores_bad_values(tmp_path):
+    # Unsynchronized servers report stratum 16; one such probe must not block regeneration
+    write_sources(tmp_path, [entry("a.example.com", AS="not a number", stratum=16, comment="x"),
+                             entry("192.0.2.1", stratum=99)])
+    result = subprocess.run([sys.executable, CONVERTOR], cwd=tmp_path, capture_output=True, text=True)
+    chrony = (tmp_path / "chrony.conf").read_text()
+    assert "server a.example.com iburst" in chrony and "server 192.0.2.1 iburst" in chrony
+    assert "validation error" not in result.stdout
+
+
+def test_convertor_stops_on_missing_fields_and_wrong_types(tmp_path):
+    server = entry("a.example.com", stratum=[1])
+    del server["owner"]
+    write_sources(tmp_path, [server])
+    result = subprocess.run([sys.executable, CONVERTOR], cwd=tmp_path, capture_output=True, text=True)
+    assert "2 validation error(s), nothing written" in result.stdout
+    assert not (tmp_path / "chrony.conf").exists()
@@ -0,0 +1,103 @@
+import asyncio
+import ssl
+import struct
+
+import pytest
+
+from ntsProbe import (AEAD_AES_SIV_CMAC_256, AEAD_ALGORITHM, ALPN, CRITICAL, END_OF_MESSAGE, ERROR, NEW_COOKIE,
+                      NEXT_PROTOCOL, NTPV4, PORT, RECORD_HEADER, SERVER, build_request, create_context, interpret,
+                      probe, read_records)
+
+
+def record(record_type, body=b"", critical=False):
+    return RECORD_HEADER.pack(record_type | (CRITICAL if critical else 0), len(body)) + body
+
+
+def u16(*values):
+    return struct.pack(f"!{len(values)}H", *values)
+
+
+GOOD_REPLY = [(NEXT_PROTOCOL, u16(NTPV4)), (AEAD_ALGORITHM, u16(AEAD_AES_SIV_CMAC_256)),
+              (NEW_COOKIE, b"c1"), (NEW_COOKIE, b"c2")]
+
+
+def parse(data):
+    async def main():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_records(reader)
+
+    return asyncio.run(main())
+
+
+def test_request_is_ntpv4_aes_siv_and_end_of_message():
+    assert parse(build_request()) == [(NEXT_PROTOCOL, u16(NTPV4)), (AEAD_ALGORITHM, u16(AEAD_AES_SIV_CMAC_256))]
+
+
+def test_read_records_strips_the_critical_bit_and_stops_at_end_of_message():
+    data = record(NEXT_PROTOCOL, u16(NTPV4), critical=True) + record(END_OF_MESSAGE, critical=True) + b"trailing"
+    assert parse(data) == [(NEXT_PROTOCOL, u16(NTPV4))]
+
+
+def test_read_records_rejects_a_truncated_reply():
+    with pytest.raises(asyncio.IncompleteReadError):
+        parse(record(NEW_COOKIE, b"cookie")[:-2])
+
+
+def test_supported_with_server_and_port():
+    result = interpret("a.example.com", GOOD_REPLY + [(SERVER, b"ntp.example.com"), (PORT, u16(1123))], 0.05)
+    assert result.supported and result.cookies == 2
+    assert (result.server, result.port, result.ke_time) == ("ntp.example.com", 1123, 0.05)
+
+
+@pytest.mark.parametrize("records, error", [
+    ([(ERROR, u16(1))], "NTS-KE error: bad request"),
+    ([(ERROR, u16(9))], "NTS-KE error: 9"),
+    ([(NEXT_PROTOCOL, u16(1))] + GOOD_REPLY[1:], "NTPv4 not offered"),
+    ([(NEXT_PROTOCOL, u16(NTPV4)), (AEAD_ALGORITHM, u16(30))] + GOOD_REPLY[2:], "no supported AEAD algorithm"),
+    (GOOD_REPLY[:2], "no cookies"),
+])
+def test_unsupported(records, error):
+    result = interpret("a.example.com", records, 0.05)
+    assert result.supported is False and result.error == error
+
+
+async def serve_nts(cert, key, reply):
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    context.set_alpn_protocols([ALPN])
+
+    async def handle(reader, writer):
+        await read_records(reader)
+        writer.write(reply)
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0, ssl=context)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def test_probe_against_local_server(certificate):
+    cert, key = certificate
+    reply = b"".join(record(record_type, body) for record_type, body in GOOD_REPLY) + record(END_OF_MESSAGE)
+
+    async def main():
+        server, port = await serve_nts(cert, key, reply)
+        async with server:
+            return await probe("localhost", 5.0, port, create_context(str(cert)))
+
+    result = asyncio.run(main())
+    assert result.supported and result.cookies == 2 and result.ke_time > 0
+
+
+def test_probe_reports_a_closed_connection(certificate):
+    cert, key = certificate
+
+    async def main():
+        server, port = await serve_nts(cert, key, record(NEW_COOKIE, b"c1"))
+        async with server:
+            return await probe("localhost", 5.0, port, create_context(str(cert)))
+
+    result = asyncio.run(main())
+    assert result.supported is False and result.error == "connection closed before End of Message"
@@ -0,0 +1,52 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from operatorReport import build_report, iter_summary_markdown, probe_summary
+from probeStore import ProbeStore, Sample
+
+CONVERTOR = Path(__file__).resolve().parent.parent / "scripts" / "ntpServerConvertor.py"
+T0 = 1_700_000_000.0
+
+SERVERS = [
+    {"hostname": "[a.example.com](https://a.example.com)", "AS": "AS2, AS1", "stratum": 1,
+     "location": "Germany", "owner": "Example"},
+    {"hostname": "b.example.com", "AS": "AS1", "stratum": 2, "location": "Germany", "owner": "Example"},
+    {"hostname": "c.example.com", "AS": "Unknown", "stratum": 1, "location": "US", "owner": "Other"},
+]
+
+
+def test_probe_summary_uses_the_latest_answer(tmp_path):
+    store = ProbeStore(tmp_path)
+    store.append([Sample("a.example.com", T0, stratum=1, rtt=0.010),
+                  Sample("b.example.com", T0, stratum=2, rtt=0.030)])
+    store.append([Sample("a.example.com", T0 + 60, stratum=1, rtt=0.020),
+                  Sample("b.example.com", T0 + 60)])
+    assert probe_summary(store) == {"a.example.com": (True, pytest.approx(0.015)),
+                                    "b.example.com": (False, pytest.approx(0.030))}
+
+
+def test_rollup_counts_every_as_and_probed_hosts_only():
+    report = build_report(SERVERS, {"a.example.com": (True, 0.010), "b.example.com": (False, None)})
+    assert report["servers"] == 3 and report["probed"] == 2
+    by_as = {row["name"]: row for row in report["by_as"]}
+    assert by_as["AS1"]["servers"] == 2 and by_as["AS1"]["reachable_share"] == 0.5
+    assert by_as["AS2"]["median_rtt_ms"] == 10.0
+    assert by_as["Unknown"]["probed"] == 0 and by_as["Unknown"]["reachable_share"] is None
+    assert [row["name"] for row in report["by_owner"]] == ["Example", "Other"]
+    assert report["by_location"][0]["strata"] == {"1": 1, "2": 1}
+
+
+def test_markdown_limits_rows():
+    markdown = "".join(iter_summary_markdown(build_report(SERVERS), top=1))
+    assert "|Owner|Servers|Strata|" in markdown
+    assert markdown.count("more not shown") == 3
+
+
+def test_summary_options_require_summary(tmp_path):
+    result = subprocess.run([sys.executable, CONVERTOR, "--summary-top", "5"], cwd=tmp_path,
+                            capture_output=True, text=True)
+    assert result.returncode == 2
+    assert "only apply to --summary" in result.stderr
@@ -0,0 +1,82 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import yaml
+
+from probeHistory import (BASE_BACKOFF, CLOSED, FAILURE_THRESHOLD, HALF_OPEN, MAX_BACKOFF, OPEN,
+                          FailureHistory)
+from probeReplay import ProbeArchive
+from ntpUpdateSources import update_ntp_sources
+
+NOW = 1_700_000_000.0
+LINK_CHECK = Path(__file__).resolve().parent.parent / "scripts" / "linkCheck.py"
+
+
+def fail(history, times, now=NOW):
+    for _ in range(times):
+        history.record("dead.example.com", "ntp", False, now)
+
+
+def test_circuit_opens_at_threshold():
+    history = FailureHistory()
+    fail(history, FAILURE_THRESHOLD - 1)
+    assert history.state("dead.example.com", "ntp", NOW) == CLOSED
+    fail(history, 1)
+    assert history.state("dead.example.com", "ntp", NOW) == OPEN
+    assert history.state("dead.example.com", "https", NOW) == CLOSED
+
+
+def test_backoff_doubles_and_is_capped():
+    history = FailureHistory()
+    fail(history, FAILURE_THRESHOLD + 2)
+    entry = history.entries["dead.example.com"]["ntp"]
+    assert entry["open_until"] == NOW + BASE_BACKOFF * 4
+    fail(history, 20)
+    assert entry["open_until"] == NOW + MAX_BACKOFF
+
+
+def test_half_open_then_success_closes():
+    history = FailureHistory()
+    fail(history, FAILURE_THRESHOLD)
+    later = NOW + BASE_BACKOFF + 1
+    assert history.state("dead.example.com", "ntp", later) == HALF_OPEN
+    assert history.partition(["dead.example.com", "ok.example.com"], "ntp", later) == (
+        ["ok.example.com"], ["dead.example.com"], [])
+    history.record("dead.example.com", "ntp", True, later)
+    assert history.state("dead.example.com", "ntp", later) == CLOSED
+    assert history.entries["dead.example.com"]["ntp"]["total_failures"] == FAILURE_THRESHOLD
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = tmp_path / "history.json"
+    history = FailureHistory(path)
+    fail(history, FAILURE_THRESHOLD)
+    history.save()
+    assert FailureHistory.load(path).entries == history.entries
+    assert FailureHistory.load(tmp_path / "missing.json").entries == {}
+
+
+def test_dry_run_leaves_history_untouched(tmp_path):
+    sources = tmp_path / "ntp-sources.yml"
+    sources.write_text(yaml.safe_dump({"servers": [
+        {"hostname": "dead.example.com", "AS": "AS1", "stratum": 1, "location": "US", "owner": "X"}]}))
+    history = FailureHistory(tmp_path / "history.json")
+    # An empty recording makes every lookup fail without touching the network
+    archive = ProbeArchive(replaying=True)
+    assert update_ntp_sources(sources, dry_run=True, history=history, archive=archive)
+    assert history.entries == {}
+    assert not (tmp_path / "history.json").exists()
+
+
+def test_stream_dry_run_leaves_history_untouched(tmp_path):
+    sources = tmp_path / "ntp-sources.yml"
+    # Nothing listens on the discard port, so the probe fails without leaving the host
+    sources.write_text("servers:\n  - hostname: 127.0.0.1:9\n")
+    history = tmp_path / "history.json"
+    result = subprocess.run([sys.executable, LINK_CHECK, str(sources), "--stream", str(tmp_path / "out.ndjson"),
+                             "--history", str(history), "--dry-run", "--timeout", "2"],
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout
+    assert (tmp_path / "out.ndjson").read_text().count("\n") == 1
+    assert not history.exists()
@@ -0,0 +1,71 @@
+import asyncio
+
+import ntpUpdateSources
+from linkCheck import HostnameInfo, process_hostname
+from probeReplay import ProbeArchive, RecordingRunner, ReplayRunner
+from processRunner import RunResult
+
+LINK = HostnameInfo(index=0, original_value="[a.example.com](https://a.example.com)",
+                    hostname="a.example.com", is_markdown=True, original_url="https://a.example.com",
+                    link_text="a.example.com")
+
+
+class FakeRunner:
+    async def run(self, argv, timeout, on_line=None):
+        return RunResult(returncode=0, lines=["one", "two", "three"])
+
+
+def test_save_and_load_round_trip(tmp_path):
+    archive = ProbeArchive(str(tmp_path / "run.json.gz"))
+    archive.record("asnmap", "a.example.com", ["line"])
+    archive.save()
+    loaded = ProbeArchive.load(archive.path)
+    assert loaded.replaying
+    assert loaded.created == archive.created
+    assert loaded.lookup("asnmap", "a.example.com") == ["line"]
+    assert loaded.lookup("asnmap", "b.example.com") is None
+
+
+def test_replayed_output_matches_recording():
+    archive = ProbeArchive()
+    recorded = asyncio.run(RecordingRunner(FakeRunner(), archive).run(["ntpdate", "-q", "a"], 5))
+    archive.replaying = True
+    assert asyncio.run(ReplayRunner(archive).run(["ntpdate", "-q", "a"], 5)) == recorded
+
+
+def test_replay_stops_where_on_line_does():
+    archive = ProbeArchive(replaying=True)
+    archive.record("process", "ntpq -p a", {"returncode": 0, "lines": ["one", "two", "three"], "timed_out": False})
+    result = asyncio.run(ReplayRunner(archive).run(["ntpq", "-p", "a"], 5, on_line=lambda line: line == "two"))
+    assert result == RunResult(returncode=None, lines=["one", "two"], stopped=True)
+
+
+def test_replay_of_unrecorded_command_fails():
+    result = asyncio.run(ReplayRunner(ProbeArchive(replaying=True)).run(["ntpq", "-p", "a"], 5))
+    assert result.returncode is None
+    assert result.lines == ["ntpq: not in recording"]
+
+
+def test_unrecorded_link_is_left_alone():
+    assert asyncio.run(process_hostname(None, LINK, 5.0, archive=ProbeArchive(replaying=True))) is None
+
+
+def test_recorded_failure_reverts_link():
+    archive = ProbeArchive(replaying=True)
+    archive.record("https", "a.example.com", {"error": "timeout", "metadata": None})
+    result = asyncio.run(process_hostname(None, LINK, 5.0, archive=archive))
+    assert result["action"] == "revert_to_plaintext"
+
+
+def test_recording_is_saved_when_the_run_fails(tmp_path, monkeypatch):
+    sources = tmp_path / "ntp-sources.yml"
+    sources.write_text("servers:\n  - hostname: a.example.com\n")
+
+    def interrupted(hostnames, archive=None):
+        archive.record("asnmap", "a.example.com", ["line"])
+        raise RuntimeError("interrupted")
+
+    monkeypatch.setattr(ntpUpdateSources, "get_as_numbers_batch", interrupted)
+    archive = ProbeArchive(str(tmp_path / "run.json.gz"))
+    assert ntpUpdateSources.update_ntp_sources(str(sources), archive=archive) is False
+    assert ProbeArchive.load(archive.path).lookup("asnmap", "a.example.com") == ["line"]
@@ -0,0 +1,63 @@
+import asyncio
+
+import ntpProbe
+from ntpProbe import NtpResponse, ProbeScheduler
+from verifyNTPServers import group_key
+
+
+def response(stratum=2, ref_id=b"GPS\0"):
+    return NtpResponse("192.0.2.1", 0, 4, stratum, 6, -20, 0.0, 0.0, ref_id, 0.0, 0.01, 0.0)
+
+
+def test_group_key_uses_lowest_as():
+    assert group_key({"hostname": "a", "AS": "AS104, AS49"}) == "AS49"
+    assert group_key({"hostname": "b", "AS": "AS49"}) == "AS49"
+    assert group_key({"hostname": "c", "AS": "Unknown", "owner": "NIST"}) == "NIST"
+
+
+def test_budget_is_not_held_while_waiting_for_a_group(monkeypatch):
+    started = {}
+
+    async def fake_probe(hostname, **kwargs):
+        started[hostname] = asyncio.get_running_loop().time()
+        return response()
+
+    monkeypatch.setattr(ntpProbe, "probe", fake_probe)
+
+    async def run():
+        scheduler = ProbeScheduler(group_gap=0.5)
+        budget = asyncio.Semaphore(1)
+        begin = asyncio.get_running_loop().time()
+        await asyncio.gather(
+            scheduler.probe("a1", "AS1", budget=budget),
+            scheduler.probe("a2", "AS1", budget=budget),
+            scheduler.probe("b1", "AS2", budget=budget),
+        )
+        return {hostname: at - begin for hostname, at in started.items()}
+
+    started_at = asyncio.run(run())
+    # a2 waits out AS1's gap without holding the only budget slot, so AS2 is not delayed
+    assert started_at["b1"] < 0.1
+    assert started_at["a2"] >= 0.45
+
+
+def test_kiss_codes(monkeypatch):
+    replies = iter([response(0, b"RATE"), response(0, b"DENY")])
+
+    async def fake_probe(hostname, **kwargs):
+        return next(replies)
+
+    monkeypatch.setattr(ntpProbe, "probe", fake_probe)
+
+    async def run():
+        scheduler = ProbeScheduler(min_interval=0.01, max_interval=0.05)
+        rate = await scheduler.probe("kissy.example.com")
+        interval = scheduler.intervals["kissy.example.com"]
+        deny = await scheduler.probe("kissy.example.com")
+        again = await scheduler.probe("kissy.example.com")
+        return rate, interval, deny, again
+
+    rate, interval, deny, again = asyncio.run(run())
+    assert rate.kiss == "RATE" and rate.response is None and interval == 0.02
+    assert deny.kiss == "DENY"
+    assert again.skipped and again.kiss == "DENY"
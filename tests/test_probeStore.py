@@ -0,0 +1,126 @@
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+import yaml
+
+from probeHistory import FAILURE_THRESHOLD, FailureHistory
+from probeReplay import ProbeArchive
+from probeStore import HEADER, MAGIC, ProbeStore, Sample, _column, encode_varint, parse_date
+from ntpUpdateSources import update_ntp_sources
+
+T0 = 1_700_000_000.0
+
+
+def test_round_trip_keeps_every_field(tmp_path):
+    store = ProbeStore(tmp_path)
+    samples = [
+        Sample("time.example.com", T0, stratum=1, asn=64500, rtt=0.0125, offset=-0.001, leap=0,
+               ref_id="GPS", precision=-20, root_delay=0.0, root_dispersion=0.00025),
+        Sample("time2.example.com", T0 + 1.5, stratum=2, ref_id="192.0.2.7", leap=3, root_delay=0.5),
+        Sample("dead.example.com", T0 + 2),
+    ]
+    assert store.append(samples) == 3
+
+    read = list(ProbeStore(tmp_path).scan())
+    assert [s.hostname for s in read] == ["time.example.com", "time2.example.com", "dead.example.com"]
+    assert read[0].ref_id == "GPS" and read[0].precision == -20 and read[0].asn == 64500
+    assert read[0].rtt == pytest.approx(0.0125) and read[0].root_dispersion == pytest.approx(0.00025)
+    assert read[1].ref_id == "192.0.2.7" and read[1].leap == 3
+    assert read[2] == Sample("dead.example.com", T0 + 2)
+
+
+def test_scan_filters_by_time_and_host(tmp_path):
+    store = ProbeStore(tmp_path)
+    store.append([Sample("a", T0, stratum=1)])
+    store.append([Sample("a", T0 + 100, stratum=1), Sample("b", T0 + 100, stratum=2)])
+    assert [s.timestamp for s in store.scan(start=T0 + 50)] == [T0 + 100, T0 + 100]
+    assert [s.hostname for s in store.scan(hostnames=["b"])] == ["b"]
+
+
+def test_reads_version_1_blocks(tmp_path):
+    (tmp_path / "hosts.txt").write_text("old.example.com\n")
+    stamp = int(T0 * 1000)
+    deltas = bytearray()
+    encode_varint(0, deltas)
+    payload = b"".join((_column("I", [0]), bytes(deltas), bytes([3]), _column("I", [64501]),
+                        _column("f", [0.02]), _column("f", [0.0])))
+    (tmp_path / "samples.bin").write_bytes(HEADER.pack(MAGIC, 1, 1, stamp, stamp, len(payload)) + payload)
+
+    store = ProbeStore(tmp_path)
+    store.append([Sample("new.example.com", T0 + 1, stratum=1, leap=0)])
+    old, new = store.scan()
+    assert (old.hostname, old.stratum, old.asn, old.leap, old.ref_id) == ("old.example.com", 3, 64501, None, None)
+    assert (new.hostname, new.leap) == ("new.example.com", 0)
+
+
+def test_stale_stores_do_not_reuse_host_ids(tmp_path):
+    # Both opened before either wrote, as two overlapping cron runs would be
+    first, second = ProbeStore(tmp_path), ProbeStore(tmp_path)
+    first.append([Sample("a.example.com", T0, stratum=1)])
+    second.append([Sample("b.example.com", T0 + 1, stratum=2), Sample("a.example.com", T0 + 1, stratum=3)])
+    assert (tmp_path / "hosts.txt").read_text() == "a.example.com\nb.example.com\n"
+    assert [(s.hostname, s.stratum) for s in ProbeStore(tmp_path).scan()] == [
+        ("a.example.com", 1), ("b.example.com", 2), ("a.example.com", 3)]
+
+
+def test_concurrent_writers_keep_hosts_and_blocks_consistent(tmp_path):
+    # Each writer tags its samples with its number as the AS, so every sample shows whose host it belongs to
+    code = ("import sys\n"
+            "from probeStore import ProbeStore, Sample\n"
+            "writer = int(sys.argv[2])\n"
+            "store = ProbeStore(sys.argv[1])\n"
+            "for i in range(40):\n"
+            "    store.append([Sample(f'w{writer}-{i % 7}.example.com', 1e9 + i, stratum=1, asn=writer),\n"
+            "                  Sample('shared.example.com', 1e9 + i, stratum=1, asn=writer)])\n")
+    scripts = Path(__file__).resolve().parent.parent / "scripts"
+    writers = [subprocess.Popen([sys.executable, "-c", code, str(tmp_path), str(writer)], cwd=scripts)
+               for writer in range(1, 5)]
+    assert [writer.wait() for writer in writers] == [0] * 4
+
+    hosts = (tmp_path / "hosts.txt").read_text().splitlines()
+    assert len(hosts) == len(set(hosts)) == 4 * 7 + 1
+    samples = list(ProbeStore(tmp_path).scan())
+    assert len(samples) == 4 * 40 * 2
+    assert all(s.hostname == "shared.example.com" or s.hostname.startswith(f"w{s.asn}-") for s in samples)
+
+
+def test_degraded(tmp_path):
+    store = ProbeStore(tmp_path)
+    store.append([Sample("a", T0, stratum=1), Sample("b", T0, stratum=1), Sample("c", T0, stratum=1)])
+    store.append([Sample("a", T0 + 60), Sample("b", T0 + 60, stratum=3),
+                  Sample("c", T0 + 60, stratum=1, leap=3, root_dispersion=2.0)])
+    assert store.degraded() == [("a", "stopped answering"), ("b", "stratum 1 -> 3"),
+                                ("c", "leap alarm (unsynchronized)"), ("c", "root distance 2.000s")]
+
+
+def test_parse_date_keeps_explicit_offsets():
+    assert parse_date("2024-01-01") == 1704067200
+    assert parse_date("2024-01-01T02:00:00+02:00") == 1704067200
+    assert parse_date("2024-01-01T00:00:00Z") == 1704067200
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_date("yesterday")
+
+
+def test_update_sources_stores_only_ntp_probed_hosts(tmp_path):
+    sources = tmp_path / "ntp-sources.yml"
+    sources.write_text(yaml.safe_dump({"servers": [
+        {"hostname": host, "AS": "AS1", "stratum": 1, "location": "US", "owner": "X"}
+        for host in ("up.example.com", "skipped.example.com")]}))
+    archive = ProbeArchive(replaying=True)
+    for host in ("up.example.com", "skipped.example.com"):
+        archive.record("asnmap", host, [f'{{"input": "{host}", "as_number": "AS1"}}'])
+    archive.record("process", "ntpdate -q up.example.com", {
+        "returncode": 0, "timed_out": False, "stopped": False,
+        "lines": ["2025-05-23 02:57:29.980318 (+0000) +0.000214 +/- 0.003723 up.example.com 192.0.2.1 s2 no-leap"]})
+    history = FailureHistory()
+    for _ in range(FAILURE_THRESHOLD):
+        history.record("skipped.example.com", "ntp", False)
+
+    store = ProbeStore(tmp_path / "store")
+    assert update_ntp_sources(sources, dry_run=True, history=history, store=store, archive=archive)
+    samples = list(store.scan())
+    assert [(s.hostname, s.stratum, s.asn) for s in samples] == [("up.example.com", 2, 1)]
+    assert samples[0].offset == pytest.approx(0.000214)
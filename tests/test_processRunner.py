@@ -0,0 +1,81 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from processRunner import ProcessRunner, RunResult
+
+
+def python(code):
+    return [sys.executable, "-c", code]
+
+
+def run(argv, timeout=5.0, on_line=None):
+    return asyncio.run(ProcessRunner().run(argv, timeout, on_line))
+
+
+def alive(pid):
+    # A killed orphan may linger as a zombie until init reaps it
+    try:
+        return Path(f"/proc/{pid}/stat").read_text().split(") ")[1][0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def test_collects_combined_output_and_exit_status():
+    result = run(python("import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)"))
+    assert result == RunResult(returncode=3, lines=["out", "err"])
+
+
+def test_missing_executable_is_a_failed_run():
+    result = run(["/nonexistent/ntpdate", "-q", "a.example.com"])
+    assert result.returncode is None and "nonexistent" in result.lines[0]
+
+
+def test_on_line_stops_the_process_early():
+    started = time.monotonic()
+    result = run(python("import itertools\nfor i in itertools.count(): print(i, flush=True)"),
+                 on_line=lambda line: line == "3")
+    assert result == RunResult(returncode=None, lines=["0", "1", "2", "3"], stopped=True)
+    assert time.monotonic() - started < 5
+
+
+@pytest.mark.skipif(not Path("/proc").is_dir(), reason="needs /proc")
+def test_timeout_kills_the_whole_process_group():
+    # The child starts a grandchild that inherits its stdout and outlives it unless the group is killed
+    code = ("import subprocess, sys, time\n"
+            "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+            "print(child.pid, flush=True)\n"
+            "time.sleep(60)")
+    started = time.monotonic()
+    result = run(python(code), timeout=1.0)
+    assert result.timed_out and result.returncode is None
+    assert time.monotonic() - started < 10
+    grandchild = int(result.lines[0])
+    deadline = time.monotonic() + 5
+    while alive(grandchild) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not alive(grandchild)
+
+
+def test_timeout_covers_reading_and_exit_together():
+    # Output ends after 0.6s but the process stays alive; the run must still end at the 1s timeout
+    code = ("import os, time\n"
+            "for i in range(3): print(i, flush=True); time.sleep(0.2)\n"
+            "os.close(1); os.close(2); time.sleep(60)")
+    started = time.monotonic()
+    result = run(python(code), timeout=1.0)
+    assert result == RunResult(returncode=None, lines=["0", "1", "2"], timed_out=True)
+    assert time.monotonic() - started < 1.4
+
+
+def test_budget_limits_live_processes():
+    async def main():
+        runner = ProcessRunner(max_processes=1)
+        started = time.monotonic()
+        await asyncio.gather(*(runner.run(python("import time; time.sleep(0.3)"), 5.0) for _ in range(2)))
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) >= 0.6
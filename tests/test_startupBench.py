@@ -0,0 +1,23 @@
+from startupBench import parse_importtime
+
+# Trimmed python -X importtime output: nested imports are indented further
+SAMPLE = """\
+import time: self [us] | cumulative | imported package
+import time:       136 |        136 |   _io
+import time:       309 |        778 | _frozen_importlib_external
+import time:       412 |        412 |     yaml.error
+import time:      1500 |       9800 |   yaml.reader
+import time:      2100 |      12400 | yaml
+import time:       250 |        250 | argparse
+usage: ntpValidate.py [-h] [--strict]
+"""
+
+
+def test_parse_importtime_keeps_top_level_cumulative_times():
+    total, heaviest = parse_importtime(SAMPLE)
+    assert total == 778 + 12400 + 250
+    assert heaviest == [("yaml", 12400), ("_frozen_importlib_external", 778), ("argparse", 250)]
+
+
+def test_parse_importtime_without_timings():
+    assert parse_importtime("usage: x.py [-h]\n") == (0, [])